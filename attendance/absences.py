@@ -0,0 +1,162 @@
+"""
+Absence detection.
+
+For a set of employees and a date range, the days each employee was
+expected to work are their department schedule's working weekdays, minus
+mandatory holidays for everyone or for their department, minus approved
+leave (half-day leave only takes half of its first day), limited to days
+since they were hired and up to today. Days they
+clocked in are subtracted from that set to find the missing ones. Entries,
+leave, holidays and schedules are each loaded with one query for the whole
+group, and the per-employee work is set arithmetic over dates.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from employees.models import Employee
+from leaves.models import Holiday, LeaveRequest
+from .models import TimeEntry, WorkSchedule
+
+# Weekdays worked when no schedule applies (Monday to Friday)
+DEFAULT_WORKING_WEEKDAYS = {0, 1, 2, 3, 4}
+
+# Longest range one report may cover
+MAX_ABSENCE_RANGE_DAYS = 366
+
+# Leave durations that cover half of their first day
+HALF_DAY_DURATIONS = ['half_day_morning', 'half_day_afternoon']
+HALF_DAY = Decimal('0.5')
+
+
+def _days(start, end):
+    """Every date from start to end inclusive"""
+    return {start + timedelta(days=offset) for offset in range((end - start).days + 1)}
+
+
+def working_weekdays_by_department(department_ids):
+    """
+    Map department ids (and None for the company default) to working weekdays.
+
+    Each department uses its first active schedule by name, falling back to
+    the first active schedule without a department, then to Monday-Friday.
+    """
+    weekdays = {}
+    for schedule in WorkSchedule.objects.filter(is_active=True).order_by('name'):
+        if schedule.department_id is None or schedule.department_id in department_ids:
+            weekdays.setdefault(schedule.department_id, schedule.working_weekdays)
+    default = weekdays.get(None, DEFAULT_WORKING_WEEKDAYS)
+    return {department_id: weekdays.get(department_id, default) for department_id in department_ids}
+
+
+def holidays_by_department(start, end):
+    """
+    Return ``(company_wide, by_department)`` sets of mandatory holiday dates.
+
+    ``by_department`` maps a department id to the holidays limited to it.
+    """
+    company_wide = set()
+    by_department = {}
+    for day, department_id in Holiday.objects.filter(
+        date__range=(start, end), is_mandatory=True
+    ).values_list('date', 'departments'):
+        if department_id is None:
+            company_wide.add(day)
+        else:
+            by_department.setdefault(department_id, set()).add(day)
+    return company_wide, by_department
+
+
+def find_absences(employees, start, end, until=None):
+    """
+    Compare expected and actual working days of employees between two dates.
+
+    ``employees`` is a list or queryset of ``Employee``; days after ``until``
+    (default today) are never expected. Returns a dict keyed by employee id
+    with sets of ``expected_days``, ``worked_days``, ``leave_days`` and
+    ``half_leave_days`` (expected days half covered by leave), a sorted list
+    of ``missing_days`` and ``expected_count``/``leave_count`` totals that
+    count half-day leave as half a day.
+    """
+    employees = list(employees)
+    employee_ids = [employee.pk for employee in employees]
+    until = min(end, until or timezone.localdate())
+    period = _days(start, end)
+
+    worked = {employee_id: set() for employee_id in employee_ids}
+    for employee_id, day in TimeEntry.objects.filter(
+        employee_id__in=employee_ids,
+        clock_in__date__range=(start, end),
+    ).exclude(status='rejected').annotate(
+        day=TruncDate('clock_in')
+    ).values_list('employee_id', 'day').distinct():
+        worked[employee_id].add(day)
+
+    leave = {employee_id: set() for employee_id in employee_ids}
+    half_leave = {employee_id: set() for employee_id in employee_ids}
+    for employee_id, leave_start, leave_end, duration_type in LeaveRequest.objects.filter(
+        employee_id__in=employee_ids,
+        status='approved',
+        start_date__lte=end,
+        end_date__gte=start,
+    ).values_list('employee_id', 'start_date', 'end_date', 'duration_type'):
+        days = _days(max(leave_start, start), min(leave_end, end))
+        # Like LeaveRequest._calculate_total_days, a half-day request only
+        # takes half of its first day; the rest of that day is still expected
+        if duration_type in HALF_DAY_DURATIONS and start <= leave_start <= end:
+            days.discard(leave_start)
+            half_leave[employee_id].add(leave_start)
+        leave[employee_id] |= days
+
+    company_holidays, department_holidays = holidays_by_department(start, end)
+    weekdays = working_weekdays_by_department({employee.department_id for employee in employees})
+
+    # Scheduled days of each department, computed once and shared by its employees
+    scheduled = {}
+    for department_id, working in weekdays.items():
+        days_off = company_holidays | department_holidays.get(department_id, set())
+        scheduled[department_id] = {
+            day for day in period if day.weekday() in working and day <= until
+        } - days_off
+
+    absences = {}
+    for employee in employees:
+        employed = {day for day in scheduled[employee.department_id] if day >= employee.hire_date}
+        expected = employed - leave[employee.pk]
+        leave_days = employed & leave[employee.pk]
+        half_leave_days = expected & half_leave[employee.pk]
+        absences[employee.pk] = {
+            'expected_days': expected,
+            'worked_days': worked[employee.pk],
+            'leave_days': leave_days,
+            'half_leave_days': half_leave_days,
+            'missing_days': sorted(expected - worked[employee.pk]),
+            'expected_count': Decimal(len(expected)) - HALF_DAY * len(half_leave_days),
+            'leave_count': Decimal(len(leave_days)) + HALF_DAY * len(half_leave_days),
+        }
+    return absences
+
+
+def prefetch_missing_days(timesheets):
+    """
+    Compute ``missing_days`` of many timesheets with one ``find_absences`` call.
+
+    The result is cached on each timesheet, so serializing a page of them
+    does not run the absence queries once per row.
+    """
+    timesheets = list(timesheets)
+    if not timesheets:
+        return
+    employees = Employee.objects.in_bulk({timesheet.employee_id for timesheet in timesheets})
+    absences = find_absences(
+        list(employees.values()),
+        min(timesheet.week_start for timesheet in timesheets),
+        max(timesheet.week_end for timesheet in timesheets),
+    )
+    for timesheet in timesheets:
+        timesheet._missing_days = [
+            day for day in absences[timesheet.employee_id]['missing_days']
+            if timesheet.week_start <= day <= timesheet.week_end
+        ]
@@ -7,7 +7,7 @@ from django.urls import reverse
 from simple_history.admin import SimpleHistoryAdmin
 from .models import (
     WorkSchedule, TimeEntry, Timesheet,
-    AttendanceReport, OvertimeRequest
+    AttendanceReport, OvertimeRequest, PunchEvent, PresenceStatus
 )
 
 
@@ -78,7 +78,10 @@ class TimeEntryAdmin(SimpleHistoryAdmin):
         'employee__user__first_name', 'employee__user__last_name',
         'employee__employee_id', 'notes'
     ]
-    readonly_fields = ['hours_worked', 'created_at', 'updated_at']
+    readonly_fields = [
+        'hours_worked', 'worked_seconds', 'regular_hours', 'overtime_hours',
+        'created_at', 'updated_at'
+    ]
     date_hierarchy = 'clock_in'
     
     fieldsets = (
@@ -88,7 +91,7 @@ class TimeEntryAdmin(SimpleHistoryAdmin):
         ('Time Information', {
             'fields': (
                 'clock_in', 'clock_out', 'hours_worked',
-                'break_duration'
+                'break_duration', 'worked_seconds', 'regular_hours', 'overtime_hours'
             )
         }),
         ('Location & Notes', {
@@ -143,6 +146,31 @@ class TimeEntryAdmin(SimpleHistoryAdmin):
         )
 
 
+@admin.register(PunchEvent)
+class PunchEventAdmin(admin.ModelAdmin):
+    """Admin interface for PunchEvent model."""
+    
+    list_display = [
+        'event_id', 'employee', 'timestamp', 'direction', 'location', 'time_entry', 'received_at'
+    ]
+    list_filter = ['direction', 'timestamp']
+    search_fields = ['event_id', 'employee__employee_id', 'location']
+    readonly_fields = ['received_at']
+    raw_id_fields = ['employee', 'time_entry']
+    date_hierarchy = 'timestamp'
+
+
+@admin.register(PresenceStatus)
+class PresenceStatusAdmin(admin.ModelAdmin):
+    """Admin interface for PresenceStatus model."""
+    
+    list_display = ['employee', 'is_clocked_in', 'since', 'location', 'sequence']
+    list_filter = ['is_clocked_in', 'employee__department']
+    search_fields = ['employee__employee_id', 'employee__first_name', 'employee__last_name']
+    readonly_fields = ['sequence', 'updated_at']
+    raw_id_fields = ['employee', 'time_entry']
+
+
 @admin.register(Timesheet)
 class TimesheetAdmin(SimpleHistoryAdmin):
     """Admin interface for Timesheet model."""
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+
+from attendance.models import TimeEntry
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalculate the stored worked seconds, regular hours and overtime hours of time '
+        'entries, e.g. after importing entries with raw SQL or fixtures'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--employee',
+            type=int,
+            help='Only backfill entries of this employee (primary key)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Entries read and updated per query (default 500)',
+        )
+
+    def handle(self, *args, **options):
+        entries = TimeEntry.objects.order_by('pk').only(
+            'clock_in', 'clock_out', 'break_duration', 'adjusted_hours', *TimeEntry.DURATION_FIELDS
+        )
+        if options['employee']:
+            entries = entries.filter(employee_id=options['employee'])
+
+        batch_size = options['batch_size']
+        checked = updated = 0
+        changed = []
+        for entry in entries.iterator(chunk_size=batch_size):
+            checked += 1
+            stored = [getattr(entry, field) for field in TimeEntry.DURATION_FIELDS]
+            entry.calculate_durations()
+            if stored != [getattr(entry, field) for field in TimeEntry.DURATION_FIELDS]:
+                changed.append(entry)
+            if len(changed) >= batch_size:
+                updated += TimeEntry.objects.bulk_update(changed, TimeEntry.DURATION_FIELDS)
+                changed = []
+        if changed:
+            updated += TimeEntry.objects.bulk_update(changed, TimeEntry.DURATION_FIELDS)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Checked {checked} time entries, updated {updated}'
+        ))
+        if updated:
+            self.stdout.write('Run reconcile_timesheets to bring the affected timesheets up to date')
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from attendance.presence import refresh_presence
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the presence index (who is clocked in) from time entries'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'employee_ids',
+            nargs='*',
+            type=int,
+            help='Employees to rebuild (all employees when omitted)',
+        )
+
+    def handle(self, *args, **options):
+        changed = refresh_presence(options['employee_ids'] or None)
+        self.stdout.write(self.style.SUCCESS(f'Updated presence of {changed} employees'))
@@ -0,0 +1,45 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from attendance.models import Timesheet
+from attendance.totals import reconcile_timesheets
+
+
+class Command(BaseCommand):
+    help = 'Recompute timesheet totals from time entries and correct any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--weeks',
+            type=int,
+            default=4,
+            help='Reconcile timesheets of the last N weeks (default 4)',
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Reconcile every timesheet',
+        )
+        parser.add_argument(
+            '--employee',
+            type=int,
+            help='Only reconcile timesheets of this employee (primary key)',
+        )
+
+    def handle(self, *args, **options):
+        timesheets = Timesheet.objects.order_by('week_start', 'employee_id')
+        if not options['all']:
+            today = timezone.localdate()
+            current_week = today - timedelta(days=today.weekday())
+            timesheets = timesheets.filter(
+                week_start__gte=current_week - timedelta(weeks=options['weeks'] - 1)
+            )
+        if options['employee']:
+            timesheets = timesheets.filter(employee_id=options['employee'])
+
+        checked, corrected = reconcile_timesheets(timesheets)
+        self.stdout.write(self.style.SUCCESS(
+            f'Checked {checked} timesheets, corrected {corrected}'
+        ))
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.1 on 2026-10-17 00:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0001_initial'),
+        ('employees', '0003_identifier_sequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PunchEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.CharField(help_text='Terminal-supplied id used to skip punches that were already uploaded', max_length=100, unique=True)),
+                ('timestamp', models.DateTimeField()),
+                ('direction', models.CharField(choices=[('in', 'Clock In'), ('out', 'Clock Out')], max_length=3)),
+                ('location', models.CharField(blank=True, max_length=200)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='punch_events', to='employees.employee')),
+                ('time_entry', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='punch_events', to='attendance.timeentry')),
+            ],
+            options={
+                'ordering': ['-timestamp'],
+                'indexes': [models.Index(fields=['employee', 'timestamp'], name='attendance__employe_574fd0_idx')],
+            },
+        ),
+    ]
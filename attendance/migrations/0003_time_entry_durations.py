@@ -0,0 +1,68 @@
+# Generated by Django 5.2.1 on 2026-10-17 01:01
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+DAILY_REGULAR_HOURS = Decimal('8.00')
+
+
+def populate_durations(apps, schema_editor):
+    TimeEntry = apps.get_model('attendance', 'TimeEntry')
+    batch = []
+    for entry in TimeEntry.objects.filter(clock_out__isnull=False).only(
+        'clock_in', 'clock_out', 'break_duration', 'adjusted_hours'
+    ).iterator(chunk_size=BATCH_SIZE):
+        work_seconds = max((entry.clock_out - entry.clock_in - entry.break_duration).total_seconds(), 0)
+        total_hours = entry.adjusted_hours or Decimal(str(round(work_seconds / 3600, 2)))
+        entry.worked_seconds = int(work_seconds)
+        entry.regular_hours = min(total_hours, DAILY_REGULAR_HOURS)
+        entry.overtime_hours = max(total_hours - DAILY_REGULAR_HOURS, Decimal('0.00'))
+        batch.append(entry)
+        if len(batch) >= BATCH_SIZE:
+            TimeEntry.objects.bulk_update(batch, ['worked_seconds', 'regular_hours', 'overtime_hours'])
+            batch = []
+    if batch:
+        TimeEntry.objects.bulk_update(batch, ['worked_seconds', 'regular_hours', 'overtime_hours'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0002_punchevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historicaltimeentry',
+            name='overtime_hours',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Worked (or adjusted) hours above the daily overtime threshold', max_digits=6),
+        ),
+        migrations.AddField(
+            model_name='historicaltimeentry',
+            name='regular_hours',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Worked (or adjusted) hours up to the daily overtime threshold', max_digits=6),
+        ),
+        migrations.AddField(
+            model_name='historicaltimeentry',
+            name='worked_seconds',
+            field=models.PositiveIntegerField(default=0, help_text='Seconds between clock in and clock out, less breaks'),
+        ),
+        migrations.AddField(
+            model_name='timeentry',
+            name='overtime_hours',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Worked (or adjusted) hours above the daily overtime threshold', max_digits=6),
+        ),
+        migrations.AddField(
+            model_name='timeentry',
+            name='regular_hours',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Worked (or adjusted) hours up to the daily overtime threshold', max_digits=6),
+        ),
+        migrations.AddField(
+            model_name='timeentry',
+            name='worked_seconds',
+            field=models.PositiveIntegerField(default=0, help_text='Seconds between clock in and clock out, less breaks'),
+        ),
+        migrations.RunPython(populate_durations, migrations.RunPython.noop),
+    ]
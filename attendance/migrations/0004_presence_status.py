@@ -0,0 +1,31 @@
+# Generated by Django 5.2.1 on 2026-10-17 01:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0003_time_entry_durations'),
+        ('employees', '0003_identifier_sequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PresenceStatus',
+            fields=[
+                ('employee', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='presence', serialize=False, to='employees.employee')),
+                ('is_clocked_in', models.BooleanField(default=False)),
+                ('since', models.DateTimeField(blank=True, help_text='Time of the last clock in or out', null=True)),
+                ('location', models.CharField(blank=True, max_length=200)),
+                ('sequence', models.PositiveBigIntegerField(db_index=True, default=0, help_text='Change cursor; every update takes a higher number than all before it')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('time_entry', models.ForeignKey(blank=True, help_text='Open entry while clocked in, otherwise the last completed one', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='attendance.timeentry')),
+            ],
+            options={
+                'verbose_name_plural': 'presence statuses',
+                'ordering': ['employee_id'],
+            },
+        ),
+    ]
@@ -5,7 +5,7 @@ from django.utils import timezone
 from decimal import Decimal
 from datetime import datetime, date, timedelta
 from employees.models import Employee, Department
-from simple_history.models import HistoricalRecords
+from employees.history import BatchedHistoricalRecords
 
 User = get_user_model()
 
@@ -20,6 +20,8 @@ class WorkSchedule(models.Model):
         ('custom', 'Custom Schedule'),
     ]
     
+    WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+    
     name = models.CharField(max_length=100)
     schedule_type = models.CharField(max_length=20, choices=SCHEDULE_TYPE_CHOICES, default='standard')
     department = models.ForeignKey(Department, on_delete=models.CASCADE, null=True, blank=True)
@@ -59,7 +61,7 @@ class WorkSchedule(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     # History tracking
-    history = HistoricalRecords()
+    history = BatchedHistoricalRecords()
     
     class Meta:
         ordering = ['name']
@@ -67,6 +69,14 @@ class WorkSchedule(models.Model):
     def __str__(self):
         return f"{self.name} ({self.get_schedule_type_display()})"
     
+    @property
+    def working_weekdays(self):
+        """Weekday numbers (Monday = 0) that have both a start and an end time"""
+        return {
+            weekday for weekday, day in enumerate(self.WEEKDAYS)
+            if getattr(self, f'{day}_start') and getattr(self, f'{day}_end')
+        }
+    
     @property
     def standard_daily_hours(self):
         """Calculate standard daily hours for Monday-Friday"""
@@ -111,6 +121,21 @@ class TimeEntry(models.Model):
         ('edited', 'Manually Edited'),
     ]
     
+    # Statuses whose hours count towards the weekly timesheet
+    TIMESHEET_STATUSES = ['completed', 'approved']
+    
+    # Fields the timesheet contribution is computed from
+    TIMESHEET_FIELDS = (
+        'employee_id', 'clock_in', 'clock_out', 'break_duration', 'status',
+        'regular_hours', 'overtime_hours'
+    )
+    
+    # Stored durations maintained by calculate_durations()
+    DURATION_FIELDS = ['worked_seconds', 'regular_hours', 'overtime_hours']
+    
+    # Hours per entry before the rest counts as overtime
+    DAILY_REGULAR_HOURS = Decimal('8.00')
+    
     employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='time_entries')
     entry_type = models.CharField(max_length=20, choices=ENTRY_TYPE_CHOICES, default='regular')
     
@@ -135,6 +160,19 @@ class TimeEntry(models.Model):
     adjustment_reason = models.TextField(blank=True)
     adjusted_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='adjusted_time_entries')
     
+    # Stored durations, recalculated on every save so reports can aggregate in SQL
+    worked_seconds = models.PositiveIntegerField(
+        default=0, help_text="Seconds between clock in and clock out, less breaks"
+    )
+    regular_hours = models.DecimalField(
+        max_digits=6, decimal_places=2, default=Decimal('0.00'),
+        help_text="Worked (or adjusted) hours up to the daily overtime threshold"
+    )
+    overtime_hours = models.DecimalField(
+        max_digits=6, decimal_places=2, default=Decimal('0.00'),
+        help_text="Worked (or adjusted) hours above the daily overtime threshold"
+    )
+    
     # Notes and metadata
     notes = models.TextField(blank=True)
     is_remote_work = models.BooleanField(default=False)
@@ -144,7 +182,7 @@ class TimeEntry(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     # History tracking
-    history = HistoricalRecords()
+    history = BatchedHistoricalRecords()
     
     class Meta:
         ordering = ['-clock_in']
@@ -178,25 +216,82 @@ class TimeEntry(models.Model):
         return Decimal(str(round(hours, 2)))
     
     @property
-    def is_overtime(self):
-        """Check if this entry qualifies as overtime"""
-        if self.adjusted_hours:
-            return self.adjusted_hours > Decimal('8.00')
-        return self.hours_worked > Decimal('8.00')
+    def break_hours(self):
+        """Break duration in hours"""
+        return Decimal(str(round(self.break_duration.total_seconds() / 3600, 2)))
     
     @property
-    def overtime_hours(self):
-        """Calculate overtime hours"""
+    def week_start(self):
+        """Monday of the week this entry was clocked in, in local time"""
+        clock_in = self.clock_in
+        if timezone.is_aware(clock_in):
+            clock_in = timezone.localtime(clock_in)
+        day = clock_in.date()
+        return day - timedelta(days=day.weekday())
+    
+    def timesheet_contribution(self):
+        """
+        Get ``(employee_id, week_start, (regular, overtime, break))`` for this entry.
+        
+        Open or uncounted entries contribute zero hours to their week.
+        """
+        if not self.clock_in:
+            return None
+        if self.clock_out is None or self.status not in self.TIMESHEET_STATUSES:
+            hours = (Decimal('0.00'), Decimal('0.00'), Decimal('0.00'))
+        else:
+            hours = (self.regular_hours, self.overtime_hours, self.break_hours)
+        return self.employee_id, self.week_start, hours
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what the entry added to its timesheet so saves apply only the difference
+        if set(cls.TIMESHEET_FIELDS).issubset(field_names):
+            instance._timesheet_contribution = instance.timesheet_contribution()
+        return instance
+    
+    def calculate_durations(self):
+        """Store worked seconds and the regular/overtime split of the worked hours"""
+        if not (self.clock_in and self.clock_out):
+            self.worked_seconds = 0
+            self.regular_hours = Decimal('0.00')
+            self.overtime_hours = Decimal('0.00')
+            return
+        
+        work_seconds = (self.clock_out - self.clock_in - self.break_duration).total_seconds()
+        self.worked_seconds = max(int(work_seconds), 0)
+        
         total_hours = self.adjusted_hours or self.hours_worked
-        if total_hours > Decimal('8.00'):
-            return total_hours - Decimal('8.00')
-        return Decimal('0.00')
+        self.regular_hours = min(total_hours, self.DAILY_REGULAR_HOURS)
+        self.overtime_hours = max(total_hours - self.DAILY_REGULAR_HOURS, Decimal('0.00'))
+    
+    def calculate_hours(self):
+        """Record the originally worked hours and flag long entries as overtime"""
+        self.calculate_durations()
+        if not (self.clock_in and self.clock_out):
+            return
+        
+        # Calculate total time worked
+        time_diff = self.clock_out - self.clock_in
+        total_hours = time_diff.total_seconds() / 3600
+        
+        # Subtract break duration if specified
+        if self.break_duration:
+            total_hours -= self.break_duration.total_seconds() / 3600
+        
+        # Store original hours if this is the first calculation
+        if not self.original_hours:
+            self.original_hours = Decimal(str(round(max(0, total_hours), 2)))
+        
+        # Check if this is overtime based on daily threshold
+        if total_hours > 8:
+            self.entry_type = 'overtime'
     
     @property
-    def regular_hours(self):
-        """Calculate regular hours (non-overtime)"""
-        total_hours = self.adjusted_hours or self.hours_worked
-        return min(total_hours, Decimal('8.00'))
+    def is_overtime(self):
+        """Check if this entry qualifies as overtime"""
+        return self.overtime_hours > 0
     
     def clean(self):
         """Validate time entry data"""
@@ -218,6 +313,67 @@ class TimeEntry(models.Model):
                 raise ValidationError("This time entry overlaps with existing entries")
 
 
+class PunchEvent(models.Model):
+    """Raw clock punch uploaded by a badge terminal"""
+    
+    DIRECTION_CHOICES = [
+        ('in', 'Clock In'),
+        ('out', 'Clock Out'),
+    ]
+    
+    event_id = models.CharField(
+        max_length=100, unique=True,
+        help_text="Terminal-supplied id used to skip punches that were already uploaded"
+    )
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='punch_events')
+    timestamp = models.DateTimeField()
+    direction = models.CharField(max_length=3, choices=DIRECTION_CHOICES)
+    location = models.CharField(max_length=200, blank=True)
+    
+    # Time entry the punch was paired into, if any
+    time_entry = models.ForeignKey(
+        TimeEntry, on_delete=models.SET_NULL, null=True, blank=True, related_name='punch_events'
+    )
+    received_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['employee', 'timestamp']),
+        ]
+    
+    def __str__(self):
+        return f"{self.employee_id} {self.direction} at {self.timestamp} ({self.event_id})"
+
+
+class PresenceStatus(models.Model):
+    """Whether an employee is clocked in right now, maintained on clock in and out"""
+    
+    employee = models.OneToOneField(
+        Employee, on_delete=models.CASCADE, primary_key=True, related_name='presence'
+    )
+    is_clocked_in = models.BooleanField(default=False)
+    time_entry = models.ForeignKey(
+        TimeEntry, on_delete=models.SET_NULL, null=True, blank=True, related_name='+',
+        help_text="Open entry while clocked in, otherwise the last completed one"
+    )
+    since = models.DateTimeField(null=True, blank=True, help_text="Time of the last clock in or out")
+    location = models.CharField(max_length=200, blank=True)
+    sequence = models.PositiveBigIntegerField(
+        default=0, db_index=True,
+        help_text="Change cursor; every update takes a higher number than all before it"
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['employee_id']
+        verbose_name_plural = 'presence statuses'
+    
+    def __str__(self):
+        state = 'in' if self.is_clocked_in else 'out'
+        return f"{self.employee_id} clocked {state} since {self.since}"
+
+
 class Timesheet(models.Model):
     """Weekly timesheet aggregating time entries"""
     
@@ -254,7 +410,7 @@ class Timesheet(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     # History tracking
-    history = HistoricalRecords()
+    history = BatchedHistoricalRecords()
     
     class Meta:
         ordering = ['-week_start']
@@ -283,7 +439,7 @@ class Timesheet(models.Model):
             employee=self.employee,
             clock_in__date__gte=self.week_start,
             clock_in__date__lte=self.week_end,
-            status__in=['completed', 'approved'],
+            status__in=TimeEntry.TIMESHEET_STATUSES,
             clock_out__isnull=False
         )
         
@@ -294,7 +450,7 @@ class Timesheet(models.Model):
         for entry in time_entries:
             total_regular += entry.regular_hours
             total_overtime += entry.overtime_hours
-            total_break += Decimal(str(entry.break_duration.total_seconds() / 3600))
+            total_break += entry.break_hours
         
         self.regular_hours = total_regular
         self.overtime_hours = total_overtime
@@ -325,23 +481,15 @@ class Timesheet(models.Model):
     
     @property
     def missing_days(self):
-        """Get list of days with no time entries"""
-        current_date = self.week_start
-        missing = []
+        """Get list of scheduled working days with no time entries"""
+        from .absences import find_absences
         
-        while current_date <= self.week_end:
-            # Skip weekends for standard schedules
-            if current_date.weekday() < 5:  # Monday = 0, Sunday = 6
-                has_entry = self.time_entries.filter(
-                    clock_in__date=current_date
-                ).exists()
-                
-                if not has_entry:
-                    missing.append(current_date)
-            
-            current_date += timedelta(days=1)
+        # Set for a whole page of timesheets by prefetch_missing_days()
+        if hasattr(self, '_missing_days'):
+            return self._missing_days
         
-        return missing
+        absences = find_absences([self.employee], self.week_start, self.week_end)
+        return absences[self.employee_id]['missing_days']
 
 
 class AttendanceReport(models.Model):
@@ -375,7 +523,7 @@ class AttendanceReport(models.Model):
     generated_at = models.DateTimeField(auto_now_add=True)
     
     # History tracking
-    history = HistoricalRecords()
+    history = BatchedHistoricalRecords()
     
     class Meta:
         ordering = ['-generated_at']
@@ -413,7 +561,7 @@ class OvertimeRequest(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     # History tracking
-    history = HistoricalRecords()
+    history = BatchedHistoricalRecords()
     
     class Meta:
         ordering = ['-requested_date']
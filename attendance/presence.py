@@ -0,0 +1,200 @@
+"""
+Presence index: who is clocked in right now.
+
+Each employee has at most one ``PresenceStatus`` row reflecting their open
+time entry, or their last completed one. Rows are updated by the time entry
+signals and after bulk punch ingestion, so dashboards read one row per
+employee instead of scanning ``TimeEntry`` for open entries.
+
+Every change takes the next number of the ``PRESENCE`` sequence while the
+sequence row stays locked until commit, so ``sequence`` grows in commit
+order and a dashboard can ask for just the rows changed since the highest
+number it has seen. A punch numbers its change in a short transaction of
+its own once it has committed, so punches do not queue on the sequence row
+for the length of their transactions.
+"""
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from employees.models import Employee
+from employees.sequences import allocate
+from .models import PresenceStatus, TimeEntry
+
+PRESENCE_SEQUENCE = 'PRESENCE'
+
+PRESENCE_FIELDS = ['is_clocked_in', 'time_entry_id', 'since', 'location']
+
+# Rows read and written per query when rebuilding
+PRESENCE_BATCH_SIZE = 500
+
+
+def is_open(entry):
+    """Whether a time entry keeps its employee clocked in"""
+    return entry.clock_out is None and entry.status == 'active'
+
+
+def presence_values(entry):
+    """Presence implied by an employee's current or last time entry"""
+    if entry is None:
+        return {'is_clocked_in': False, 'time_entry_id': None, 'since': None, 'location': ''}
+    if is_open(entry):
+        return {
+            'is_clocked_in': True, 'time_entry_id': entry.pk,
+            'since': entry.clock_in, 'location': entry.clock_in_location,
+        }
+    return {
+        'is_clocked_in': False, 'time_entry_id': entry.pk,
+        'since': entry.clock_out, 'location': entry.clock_out_location,
+    }
+
+
+def _unchanged(presence, values):
+    return presence is not None and all(
+        getattr(presence, field) == value for field, value in values.items()
+    )
+
+
+def _write(employee_id, presence, values):
+    if _unchanged(presence, values):
+        return
+    PresenceStatus.objects.update_or_create(employee_id=employee_id, defaults=values)
+    transaction.on_commit(lambda: _publish(employee_id))
+
+
+def _publish(employee_id):
+    """Give an employee's committed presence change the next cursor number"""
+    with transaction.atomic():
+        sequence = allocate(PRESENCE_SEQUENCE)
+        PresenceStatus.objects.filter(employee_id=employee_id).update(sequence=sequence)
+
+
+def record_time_entry_presence(entry):
+    """Update the employee's presence after one of their time entries was saved"""
+    presence = PresenceStatus.objects.filter(employee_id=entry.employee_id).first()
+    # A closed entry only matters if it is the one the presence points at
+    if is_open(entry) or (presence is not None and presence.time_entry_id == entry.pk):
+        _write(entry.employee_id, presence, presence_values(entry))
+
+
+def record_time_entry_presence_deleted(entry):
+    """Clock the employee out if their open time entry was deleted"""
+    # Deleting the entry has already cleared the presence's reference to it
+    presence = PresenceStatus.objects.filter(
+        employee_id=entry.employee_id, is_clocked_in=True, time_entry__isnull=True
+    ).first()
+    if presence is not None:
+        _write(entry.employee_id, presence, {
+            'is_clocked_in': False, 'time_entry_id': None,
+            'since': timezone.now(), 'location': '',
+        })
+
+
+def current_entry(employee):
+    """Return the employee's open time entry, or None"""
+    presence = PresenceStatus.objects.filter(employee=employee).select_related('time_entry').first()
+    if presence is None:
+        # Not indexed yet, e.g. before rebuild_presence has run
+        return TimeEntry.objects.filter(
+            employee=employee, clock_out__isnull=True, status='active'
+        ).order_by('-clock_in').first()
+    return presence.time_entry if presence.is_clocked_in else None
+
+
+def refresh_presence(employee_ids=None, batch_size=PRESENCE_BATCH_SIZE):
+    """
+    Rebuild presence rows from time entries.
+
+    ``employee_ids`` defaults to every employee. Returns the number of rows
+    created or changed.
+    """
+    if employee_ids is None:
+        employee_ids = Employee.objects.values_list('pk', flat=True)
+    employee_ids = sorted(set(employee_ids))
+
+    open_entries = TimeEntry.objects.filter(
+        employee=OuterRef('pk'), clock_out__isnull=True, status='active'
+    ).order_by('-clock_in')
+    last_entries = TimeEntry.objects.filter(
+        employee=OuterRef('pk'), clock_out__isnull=False
+    ).order_by('-clock_out')
+
+    changed = 0
+    for offset in range(0, len(employee_ids), batch_size):
+        chunk = employee_ids[offset:offset + batch_size]
+        latest = {
+            employee_id: open_id or last_id
+            for employee_id, open_id, last_id in Employee.objects.filter(pk__in=chunk).annotate(
+                open_id=Subquery(open_entries.values('pk')[:1]),
+                last_id=Subquery(last_entries.values('pk')[:1]),
+            ).values_list('pk', 'open_id', 'last_id')
+        }
+        entries = TimeEntry.objects.in_bulk([pk for pk in latest.values() if pk])
+        existing = PresenceStatus.objects.in_bulk(list(latest))
+
+        updates = []
+        for employee_id, entry_id in latest.items():
+            values = presence_values(entries.get(entry_id))
+            presence = existing.get(employee_id)
+            if _unchanged(presence, values):
+                continue
+            if presence is None:
+                presence = PresenceStatus(employee_id=employee_id)
+            for field, value in values.items():
+                setattr(presence, field, value)
+            updates.append(presence)
+        if not updates:
+            continue
+
+        with transaction.atomic():
+            first = allocate(PRESENCE_SEQUENCE, count=len(updates))
+            now = timezone.now()
+            for sequence, presence in enumerate(updates, start=first):
+                presence.sequence = sequence
+                presence.updated_at = now
+            PresenceStatus.objects.bulk_create(
+                [presence for presence in updates if presence.employee_id not in existing]
+            )
+            PresenceStatus.objects.bulk_update(
+                [presence for presence in updates if presence.employee_id in existing],
+                PRESENCE_FIELDS + ['sequence', 'updated_at']
+            )
+        changed += len(updates)
+    return changed
+
+
+def presence_board(department_id=None, since=None):
+    """
+    Presence of a department's employees as ``(cursor, rows)``.
+
+    Without ``since`` every employee is listed, including those never
+    clocked in; with it only rows changed after that cursor are. Pass the
+    returned cursor as ``since`` on the next call. One query either way.
+    """
+    if since is None:
+        employees = Employee.objects.select_related('presence').order_by('pk')
+        if department_id:
+            employees = employees.filter(department_id=department_id)
+        pairs = [(employee, getattr(employee, 'presence', None)) for employee in employees]
+    else:
+        statuses = PresenceStatus.objects.filter(sequence__gt=since).select_related(
+            'employee'
+        ).order_by('sequence')
+        if department_id:
+            statuses = statuses.filter(employee__department_id=department_id)
+        pairs = [(presence.employee, presence) for presence in statuses]
+
+    cursor = max([since or 0] + [presence.sequence for _, presence in pairs if presence])
+    return cursor, [
+        {
+            'employee': employee.pk,
+            'employee_id': employee.employee_id,
+            'employee_name': employee.full_name,
+            'department': employee.department_id,
+            'is_clocked_in': bool(presence and presence.is_clocked_in),
+            'since': presence.since if presence else None,
+            'location': presence.location if presence else '',
+            'time_entry': presence.time_entry_id if presence else None,
+        }
+        for employee, presence in pairs
+    ]
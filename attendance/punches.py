@@ -0,0 +1,313 @@
+"""
+Bulk punch ingestion for badge terminals.
+
+Terminals buffer clock punches while offline and upload them in batches of
+``(event_id, employee_id, timestamp, direction, location)``. Punches whose
+``event_id`` was already stored are skipped, so a batch can be uploaded
+again safely. The new punches of each employee are sorted and paired in
+memory (an ``in`` with the next ``out``, or an employee's open time entry
+with the first ``out`` after it). Stored ``out`` punches that never found
+their ``in``, e.g. because the terminal uploaded them first, take part in
+the pairing again when punches near them arrive. The time entries are
+written with ``bulk_create`` and the timesheet of every affected (employee,
+week) and the presence of every affected employee are recomputed once
+instead of once per entry through the model signals.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from employees.models import Employee
+from .models import PunchEvent, TimeEntry, Timesheet
+from .presence import refresh_presence
+from .totals import reconcile_timesheets
+
+# Largest batch accepted in one upload
+MAX_PUNCH_BATCH = 10000
+
+# Rows per INSERT/UPDATE and per IN (...) lookup
+PUNCH_BATCH_SIZE = 500
+
+PUNCH_DIRECTIONS = [choice for choice, _ in PunchEvent.DIRECTION_CHOICES]
+
+# How far around a batch's punches stored unpaired punches are looked up
+PUNCH_PAIRING_WINDOW = timedelta(hours=24)
+
+
+class PunchBatchError(ValueError):
+    """The uploaded punch batch cannot be read"""
+
+
+def parse_punch(row):
+    """
+    Validate one raw punch.
+
+    Returns an unsaved ``PunchEvent`` or raises ``ValueError`` with the reason.
+    """
+    if not isinstance(row, dict):
+        raise ValueError('Punch must be an object')
+
+    event_id = str(row.get('event_id') or '').strip()
+    if not event_id:
+        raise ValueError('Missing event_id')
+    if len(event_id) > 100:
+        raise ValueError('event_id is longer than 100 characters')
+
+    try:
+        employee_id = int(row.get('employee_id'))
+    except (TypeError, ValueError):
+        raise ValueError('Invalid employee_id')
+
+    timestamp = row.get('timestamp')
+    timestamp = parse_datetime(timestamp) if isinstance(timestamp, str) else None
+    if timestamp is None:
+        raise ValueError('Invalid timestamp')
+    if timezone.is_naive(timestamp):
+        timestamp = timezone.make_aware(timestamp)
+
+    direction = str(row.get('direction') or '').strip().lower()
+    if direction not in PUNCH_DIRECTIONS:
+        raise ValueError(f"direction must be one of {', '.join(PUNCH_DIRECTIONS)}")
+
+    location = str(row.get('location') or '').strip()[:200]
+    return PunchEvent(
+        event_id=event_id, employee_id=employee_id, timestamp=timestamp,
+        direction=direction, location=location
+    )
+
+
+def _chunks(values, size):
+    values = list(values)
+    for offset in range(0, len(values), size):
+        yield values[offset:offset + size]
+
+
+def pair_punches(punches, open_entry=None):
+    """
+    Pair one employee's punches into time entries.
+
+    ``punches`` are ``PunchEvent`` objects, new ones and stored ones still
+    waiting for their pair, and ``open_entry`` the employee's currently
+    open time entry, if any; it is paired like an
+    ``in`` punch at its clock in time. Returns ``(pairs, unpaired)`` where
+    each pair is ``(start, out_punch)``, ``start`` being an ``in`` punch or
+    ``open_entry`` and ``out_punch`` None for a trailing clock in, and
+    ``unpaired`` lists ``(punch_or_entry, error)``.
+    """
+    events = [(punch.timestamp, punch.direction, punch) for punch in punches]
+    if open_entry is not None:
+        events.append((open_entry.clock_in, 'in', open_entry))
+    # At the same instant an out closes the previous shift before the next in
+    events.sort(key=lambda event: (event[0], event[1] == 'in'))
+
+    pairs = []
+    unpaired = []
+    current = None
+    for timestamp, direction, event in events:
+        if direction == 'in':
+            if current is not None:
+                unpaired.append((current, 'No clock out before the next clock in'))
+            current = event
+        elif current is not None and timestamp > _start_time(current):
+            pairs.append((current, event))
+            current = None
+        else:
+            unpaired.append((event, 'No clock in before this clock out'))
+
+    if current is not None and current is not open_entry:
+        pairs.append((current, None))
+    return pairs, unpaired
+
+
+def _start_time(start):
+    return start.clock_in if isinstance(start, TimeEntry) else start.timestamp
+
+
+def ingest_punches(rows, user=None, batch_size=PUNCH_BATCH_SIZE):
+    """
+    Store a batch of terminal punches and turn them into time entries.
+
+    ``rows`` is a list of punch dicts. Returns a report with the number of
+    punches received and stored, the entries created and closed, the
+    timesheets recomputed, and the punches that were invalid, duplicated,
+    for unknown employees or could not be paired.
+    """
+    if not isinstance(rows, list):
+        raise PunchBatchError('Expected a list of punches')
+    if len(rows) > MAX_PUNCH_BATCH:
+        raise PunchBatchError(f'At most {MAX_PUNCH_BATCH} punches can be uploaded at once')
+
+    report = {
+        'received': len(rows),
+        'stored': 0,
+        'entries_created': 0,
+        'entries_closed': 0,
+        'timesheets_updated': 0,
+        'invalid': [],
+        'duplicates': [],
+        'unknown_employees': [],
+        'unpaired': [],
+    }
+
+    punches = {}
+    for index, row in enumerate(rows):
+        try:
+            punch = parse_punch(row)
+        except ValueError as e:
+            report['invalid'].append({'index': index, 'error': str(e)})
+            continue
+        if punch.event_id in punches:
+            report['duplicates'].append(punch.event_id)
+            continue
+        punches[punch.event_id] = punch
+
+    with transaction.atomic():
+        for event_ids in _chunks(punches, batch_size):
+            for event_id in PunchEvent.objects.filter(
+                event_id__in=event_ids
+            ).values_list('event_id', flat=True):
+                report['duplicates'].append(event_id)
+                del punches[event_id]
+
+        by_employee = {}
+        for punch in punches.values():
+            by_employee.setdefault(punch.employee_id, []).append(punch)
+
+        known = set()
+        open_entries = {}
+        for employee_ids in _chunks(by_employee, batch_size):
+            known.update(Employee.objects.filter(pk__in=employee_ids).values_list('pk', flat=True))
+            # Only the latest open entry can still be closed by a punch
+            for entry in TimeEntry.objects.filter(
+                employee_id__in=employee_ids, clock_out__isnull=True
+            ).order_by('clock_in'):
+                open_entries[entry.employee_id] = entry
+        for employee_id in sorted(set(by_employee) - known):
+            report['unknown_employees'].append({
+                'employee_id': employee_id,
+                'event_ids': [punch.event_id for punch in by_employee.pop(employee_id)],
+            })
+
+        # Out punches uploaded before their in are still waiting to be paired
+        waiting = {}
+        if by_employee:
+            timestamps = [
+                punch.timestamp for employee_punches in by_employee.values()
+                for punch in employee_punches
+            ]
+            window = (min(timestamps) - PUNCH_PAIRING_WINDOW, max(timestamps) + PUNCH_PAIRING_WINDOW)
+            for employee_ids in _chunks(by_employee, batch_size):
+                for punch in PunchEvent.objects.filter(
+                    employee_id__in=employee_ids, direction='out',
+                    time_entry__isnull=True, timestamp__range=window
+                ):
+                    waiting.setdefault(punch.employee_id, []).append(punch)
+
+        now = timezone.now()
+        created = []
+        closed = []
+        links = []
+        for employee_id, employee_punches in by_employee.items():
+            pairs, unpaired = pair_punches(
+                employee_punches + waiting.get(employee_id, []), open_entries.get(employee_id)
+            )
+            for start, out_punch in pairs:
+                if isinstance(start, TimeEntry):
+                    start.clock_out = out_punch.timestamp
+                    start.clock_out_location = out_punch.location
+                    start.status = 'completed'
+                    start.updated_at = now
+                    start.calculate_hours()
+                    closed.append(start)
+                    links.append((start, [out_punch]))
+                    continue
+                entry = TimeEntry(
+                    employee_id=employee_id,
+                    clock_in=start.timestamp,
+                    clock_in_location=start.location,
+                    clock_out=out_punch.timestamp if out_punch else None,
+                    clock_out_location=out_punch.location if out_punch else '',
+                    status='completed' if out_punch else 'active',
+                )
+                entry.calculate_hours()
+                created.append(entry)
+                links.append((entry, [start, out_punch] if out_punch else [start]))
+            for event, error in unpaired:
+                if event.pk is not None and not isinstance(event, TimeEntry):
+                    # Reported when it was uploaded
+                    continue
+                if isinstance(event, TimeEntry):
+                    report['unpaired'].append({'time_entry': event.pk, 'error': error})
+                else:
+                    report['unpaired'].append({'event_id': event.event_id, 'error': error})
+
+        # Entries are written first so the punches can point at them
+        TimeEntry.objects.bulk_create(created, batch_size=batch_size)
+        TimeEntry.objects.bulk_update(
+            closed,
+            ['clock_out', 'clock_out_location', 'status', 'original_hours', 'entry_type', 'updated_at']
+            + TimeEntry.DURATION_FIELDS,
+            batch_size=batch_size
+        )
+        for entries, update in [(created, False), (closed, True)]:
+            if entries:
+                TimeEntry.history.bulk_history_create(
+                    entries, update=update, default_user=user,
+                    default_change_reason='Punch ingestion', batch_size=batch_size
+                )
+        paired = []
+        for entry, linked in links:
+            for punch in linked:
+                punch.time_entry = entry
+                if punch.pk is not None:
+                    paired.append(punch)
+
+        stored = [punch for employee_punches in by_employee.values() for punch in employee_punches]
+        PunchEvent.objects.bulk_create(stored, batch_size=batch_size)
+        PunchEvent.objects.bulk_update(paired, ['time_entry'], batch_size=batch_size)
+
+        report['stored'] = len(stored)
+        report['entries_created'] = len(created)
+        report['entries_closed'] = len(closed)
+        report['timesheets_updated'] = _rebuild_timesheets(created + closed, user, batch_size)
+        if created or closed:
+            refresh_presence({entry.employee_id for entry in created + closed}, batch_size)
+    return report
+
+
+def _rebuild_timesheets(entries, user, batch_size):
+    """Create missing timesheets and recompute each affected one once"""
+    weeks = {(entry.employee_id, entry.week_start) for entry in entries}
+    if not weeks:
+        return 0
+
+    employee_ids = {employee_id for employee_id, _ in weeks}
+    week_starts = {week_start for _, week_start in weeks}
+    existing = {}
+    for chunk in _chunks(employee_ids, batch_size):
+        for pk, employee_id, week_start in Timesheet.objects.filter(
+            employee_id__in=chunk, week_start__in=week_starts
+        ).values_list('pk', 'employee_id', 'week_start'):
+            existing[(employee_id, week_start)] = pk
+
+    missing = [
+        Timesheet(
+            employee_id=employee_id, week_start=week_start,
+            week_end=week_start + timedelta(days=6), status='draft'
+        )
+        for employee_id, week_start in weeks - set(existing)
+    ]
+    if missing:
+        Timesheet.objects.bulk_create(missing, batch_size=batch_size)
+        Timesheet.history.bulk_history_create(
+            missing, default_user=user, default_change_reason='Punch ingestion',
+            batch_size=batch_size
+        )
+
+    timesheet_ids = [existing[week] for week in weeks if week in existing]
+    timesheet_ids += [timesheet.pk for timesheet in missing]
+    for chunk in _chunks(timesheet_ids, batch_size):
+        reconcile_timesheets(Timesheet.objects.filter(pk__in=chunk))
+    return len(timesheet_ids)
@@ -0,0 +1,77 @@
+"""
+Attendance reports computed in the database.
+
+Time entries store their worked seconds and their regular/overtime hours
+when saved, so a summary over any date range is a single aggregate query,
+optionally grouped by employee or department.
+"""
+from decimal import Decimal
+
+from django.db.models import Count, Q, Sum
+
+# Breakdowns supported by summarize_time_entries and the columns they group on
+SUMMARY_GROUPS = {
+    'employee': {
+        'employee_id': 'employee_id',
+        'employee_number': 'employee__employee_id',
+        'first_name': 'employee__first_name',
+        'last_name': 'employee__last_name',
+        'department_id': 'employee__department_id',
+    },
+    'department': {
+        'department_id': 'employee__department_id',
+        'department_name': 'employee__department__name',
+    },
+}
+
+# Aliases differ from the summed fields, which Django does not allow to shadow
+SUMMARY_AGGREGATES = {
+    'entries': Count('id'),
+    'worked': Sum('worked_seconds'),
+    'regular': Sum('regular_hours'),
+    'overtime': Sum('overtime_hours'),
+    'overtime_entries': Count('id', filter=Q(overtime_hours__gt=0)),
+}
+
+
+def _statistics(row):
+    """Turn one aggregate row into the report's statistics"""
+    entries = row['entries']
+    regular = row['regular'] or Decimal('0.00')
+    overtime = row['overtime'] or Decimal('0.00')
+    total = regular + overtime
+    return {
+        'total_entries': entries,
+        'total_hours': float(total),
+        'regular_hours': float(regular),
+        'overtime_hours': float(overtime),
+        'overtime_entries': row['overtime_entries'],
+        'clocked_hours': round((row['worked'] or 0) / 3600, 2),
+        'average_hours_per_day': float(round(total / entries, 2)) if entries else 0.0,
+    }
+
+
+def summarize_time_entries(entries, group_by=None):
+    """
+    Summarize a queryset of completed time entries.
+
+    Returns ``(statistics, breakdown)``; ``breakdown`` is None unless
+    ``group_by`` is one of ``SUMMARY_GROUPS``, in which case it lists the
+    statistics of each employee or department. Either way one query runs.
+    """
+    if group_by is None:
+        return _statistics(entries.aggregate(**SUMMARY_AGGREGATES)), None
+
+    columns = SUMMARY_GROUPS[group_by]
+    rows = entries.order_by().values(*columns.values()).annotate(**SUMMARY_AGGREGATES)
+
+    breakdown = []
+    totals = dict.fromkeys(SUMMARY_AGGREGATES, 0)
+    for row in rows:
+        for key in SUMMARY_AGGREGATES:
+            totals[key] += row[key] or 0
+        item = {name: row[column] for name, column in columns.items()}
+        item.update(_statistics(row))
+        breakdown.append(item)
+    breakdown.sort(key=lambda item: item['total_hours'], reverse=True)
+    return _statistics(totals), breakdown
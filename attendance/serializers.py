@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 from datetime import datetime, date, timedelta
 from decimal import Decimal
 from .models import (
@@ -67,8 +68,6 @@ class TimeEntrySerializer(SelectableFieldsSerializer):
     
     # Computed fields
     hours_worked = serializers.ReadOnlyField()
-    regular_hours = serializers.ReadOnlyField()
-    overtime_hours = serializers.ReadOnlyField()
     is_overtime = serializers.ReadOnlyField()
     
     # Display fields
@@ -83,10 +82,13 @@ class TimeEntrySerializer(SelectableFieldsSerializer):
             'ip_address', 'status', 'status_display', 'approved_by', 'approved_by_name',
             'approved_at', 'original_hours', 'adjusted_hours', 'adjustment_reason',
             'adjusted_by', 'adjusted_by_name', 'notes', 'is_remote_work', 'project_code',
-            'hours_worked', 'regular_hours', 'overtime_hours', 'is_overtime',
+            'hours_worked', 'worked_seconds', 'regular_hours', 'overtime_hours', 'is_overtime',
             'created_at', 'updated_at'
         ]
-        read_only_fields = ['created_at', 'updated_at', 'approved_at']
+        read_only_fields = [
+            'created_at', 'updated_at', 'approved_at',
+            'worked_seconds', 'regular_hours', 'overtime_hours'
+        ]
     
     def validate(self, data):
         """Validate time entry data"""
@@ -123,7 +125,7 @@ class TimeEntryCreateSerializer(serializers.ModelSerializer):
     
     def create(self, validated_data):
         """Create time entry with automatic clock_in timestamp"""
-        validated_data['clock_in'] = datetime.now()
+        validated_data['clock_in'] = timezone.now()
         if 'request' in self.context:
             request = self.context['request']
             validated_data['ip_address'] = self.get_client_ip(request)
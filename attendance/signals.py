@@ -1,12 +1,15 @@
 """
 Signal handlers for attendance app.
 """
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
-from datetime import timedelta
-from decimal import Decimal
+from employees.history import update_with_history
 from .models import TimeEntry, Timesheet
+from .presence import record_time_entry_presence, record_time_entry_presence_deleted
+from .totals import (
+    record_time_entry_saved, record_time_entry_deleted, remember_stored_contribution
+)
 
 
 @receiver(pre_save, sender=TimeEntry)
@@ -14,47 +17,46 @@ def calculate_time_entry_hours(sender, instance, **kwargs):
     """
     Calculate hours worked and overtime status when saving TimeEntry.
     """
-    if instance.clock_in and instance.clock_out:
-        # Calculate total time worked
-        time_diff = instance.clock_out - instance.clock_in
-        total_hours = time_diff.total_seconds() / 3600
-        
-        # Subtract break duration if specified
-        if instance.break_duration:
-            break_hours = instance.break_duration.total_seconds() / 3600
-            total_hours -= break_hours
-        
-        # Store original hours if this is the first calculation
-        if not instance.original_hours:
-            instance.original_hours = Decimal(str(round(max(0, total_hours), 2)))
-        
-        # Check if this is overtime based on daily threshold
-        if total_hours > 8:
-            instance.entry_type = 'overtime'
+    instance.calculate_hours()
+
+
+@receiver(pre_save, sender=TimeEntry)
+def remember_time_entry_contribution(sender, instance, raw=False, **kwargs):
+    """
+    Read the stored hours of a time entry saved without loading them.
+    """
+    if raw:
+        return
+    remember_stored_contribution(instance)
 
 
 @receiver(post_save, sender=TimeEntry)
-def update_timesheet_on_time_entry_save(sender, instance, created, **kwargs):
+def update_timesheet_on_time_entry_save(sender, instance, created, raw=False, **kwargs):
     """
-    Update related timesheet when a time entry is saved.
+    Add the change in a time entry's hours to its weekly timesheet.
     """
-    if instance.clock_in:
-        # Get the Monday of the week for this time entry
-        date = instance.clock_in.date()
-        week_start = date - timedelta(days=date.weekday())
-        
-        # Find or create timesheet for this week
-        timesheet, created = Timesheet.objects.get_or_create(
-            employee=instance.employee,
-            week_start=week_start,
-            defaults={
-                'week_end': week_start + timedelta(days=6),
-                'status': 'draft'
-            }
-        )
-        
-        # Recalculate timesheet totals
-        timesheet.calculate_totals()
+    if raw:
+        return
+    record_time_entry_saved(instance, created)
+
+
+@receiver(post_save, sender=TimeEntry)
+def update_presence_on_time_entry_save(sender, instance, raw=False, **kwargs):
+    """
+    Keep the employee's presence in step with clocking in and out.
+    """
+    if raw:
+        return
+    record_time_entry_presence(instance)
+
+
+@receiver(post_delete, sender=TimeEntry)
+def update_timesheet_on_time_entry_delete(sender, instance, **kwargs):
+    """
+    Remove a deleted time entry's hours from its weekly timesheet.
+    """
+    record_time_entry_deleted(instance)
+    record_time_entry_presence_deleted(instance)
 
 
 @receiver(post_save, sender=Timesheet)
@@ -65,9 +67,12 @@ def timesheet_status_change(sender, instance, created, **kwargs):
     if not created and instance.status == 'approved':
         # When timesheet is approved, approve all related time entries
         time_entries = instance.time_entries.filter(status='completed')
-        time_entries.update(status='approved')
+        update_with_history(time_entries, user=instance.approved_by, status='approved')
         
         # Set approval timestamp
         if not instance.approved_at:
             instance.approved_at = timezone.now()
-            Timesheet.objects.filter(pk=instance.pk).update(approved_at=instance.approved_at)
+            update_with_history(
+                Timesheet.objects.filter(pk=instance.pk),
+                user=instance.approved_by, approved_at=instance.approved_at
+            )
@@ -2,10 +2,21 @@
 Tests for attendance app.
 """
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
 from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.utils import timezone
 from datetime import datetime, date, time, timedelta
-from employees.models import Employee, Department
-from .models import WorkSchedule, TimeEntry, Timesheet, OvertimeRequest, AttendanceReport
+from decimal import Decimal
+from io import StringIO
+from employees.models import Employee, Department, IdentifierSequence
+from leaves.models import Holiday, LeaveRequest, LeaveType
+from .models import (
+    WorkSchedule, TimeEntry, Timesheet, OvertimeRequest, AttendanceReport, PresenceStatus
+)
+from .presence import PRESENCE_SEQUENCE
 
 
 class AttendanceModelsTest(TestCase):
@@ -133,3 +144,530 @@ class AttendanceModelsTest(TestCase):
         self.assertEqual(report.report_type, 'MONTHLY')
         self.assertEqual(report.department, self.department)
         self.assertEqual(report.generated_by, self.user)
+
+
+class TimesheetTotalsTest(TestCase):
+    """Test incrementally maintained timesheet totals."""
+    
+    def setUp(self):
+        """Set up an employee with one completed entry this week."""
+        user = get_user_model().objects.create_user(
+            username='shiftworker',
+            email='shift@example.com',
+            password='testpass123',
+            first_name='Shift',
+            last_name='Worker'
+        )
+        self.employee = user.employee_profile
+        self.monday = timezone.make_aware(datetime(2025, 3, 3, 9, 0))
+        self.entry = self.create_entry(self.monday, hours=9)
+    
+    def create_entry(self, clock_in, hours):
+        return TimeEntry.objects.create(
+            employee=self.employee,
+            clock_in=clock_in,
+            clock_out=clock_in + timedelta(hours=hours),
+            status='completed'
+        )
+    
+    def timesheet(self):
+        return Timesheet.objects.get(employee=self.employee, week_start=date(2025, 3, 3))
+    
+    def test_totals_follow_entry_changes(self):
+        """Test creating, editing, moving and deleting entries keeps totals exact."""
+        tuesday_entry = self.create_entry(self.monday + timedelta(days=1), hours=6)
+        timesheet = self.timesheet()
+        self.assertEqual(timesheet.regular_hours, Decimal('14.00'))
+        self.assertEqual(timesheet.overtime_hours, Decimal('1.00'))
+        self.assertEqual(timesheet.total_hours, Decimal('15.00'))
+        
+        tuesday_entry = TimeEntry.objects.get(pk=tuesday_entry.pk)
+        tuesday_entry.break_duration = timedelta(minutes=30)
+        tuesday_entry.save()
+        self.assertEqual(self.timesheet().regular_hours, Decimal('13.50'))
+        self.assertEqual(self.timesheet().break_hours, Decimal('0.50'))
+        
+        # Moving the entry to the next week moves its hours too
+        tuesday_entry.clock_in += timedelta(days=7)
+        tuesday_entry.clock_out += timedelta(days=7)
+        tuesday_entry.save()
+        self.assertEqual(self.timesheet().total_hours, Decimal('9.00'))
+        next_week = Timesheet.objects.get(employee=self.employee, week_start=date(2025, 3, 10))
+        self.assertEqual(next_week.total_hours, Decimal('5.50'))
+        
+        self.entry.delete()
+        self.assertEqual(self.timesheet().total_hours, Decimal('0.00'))
+    
+    def test_unchanged_entry_does_not_touch_timesheet(self):
+        """Test saving an entry without changing its hours skips the timesheet."""
+        entry = TimeEntry.objects.get(pk=self.entry.pk)
+        entry.notes = 'Reviewed'
+        
+        with CaptureQueriesContext(connection) as queries:
+            entry.save()
+        
+        self.assertFalse([
+            query for query in queries if 'attendance_timesheet' in query['sql']
+        ])
+    
+    def test_entry_saved_without_loaded_hours(self):
+        """Test updating an entry loaded without its hours does not add them twice."""
+        entry = TimeEntry.objects.only('pk', 'notes').get(pk=self.entry.pk)
+        entry.clock_out = self.monday + timedelta(hours=5)
+        entry.save()
+        self.assertEqual(self.timesheet().total_hours, Decimal('5.00'))
+    
+    def test_reconcile_command_corrects_drift(self):
+        """Test the reconciliation command recomputes drifted totals."""
+        Timesheet.objects.filter(pk=self.timesheet().pk).update(total_hours=Decimal('99.00'))
+        out = StringIO()
+        
+        call_command('reconcile_timesheets', '--all', stdout=out)
+        
+        self.assertIn('corrected 1', out.getvalue())
+        self.assertEqual(self.timesheet().total_hours, Decimal('9.00'))
+
+
+class PunchIngestionTest(TestCase):
+    """Test bulk ingestion of badge terminal punches."""
+    
+    def setUp(self):
+        """Set up a staff client and two employees."""
+        User = get_user_model()
+        self.admin = User.objects.create_user(
+            username='terminal', email='terminal@example.com', password='testpass123', is_staff=True
+        )
+        self.client.force_login(self.admin)
+        self.alice = User.objects.create_user(
+            username='alice', email='alice@example.com', password='testpass123'
+        ).employee_profile
+        self.bob = User.objects.create_user(
+            username='bob', email='bob@example.com', password='testpass123'
+        ).employee_profile
+        self.url = '/api/attendance/time-entries/bulk_ingest/'
+    
+    def punch(self, event_id, employee, timestamp, direction):
+        return {
+            'event_id': event_id, 'employee_id': employee.pk,
+            'timestamp': timestamp, 'direction': direction, 'location': 'Gate 1'
+        }
+    
+    def ingest(self, punches):
+        return self.client.post(self.url, {'punches': punches}, content_type='application/json')
+    
+    def test_pairs_punches_and_updates_timesheets(self):
+        """Test punches are paired per employee and timesheets are recomputed."""
+        punches = [
+            self.punch('a-2', self.alice, '2025-03-03T17:00:00', 'out'),
+            self.punch('a-1', self.alice, '2025-03-03T08:00:00', 'in'),
+            self.punch('b-1', self.bob, '2025-03-04T09:00:00', 'in'),
+            self.punch('a-3', self.alice, '2025-03-04T09:00:00', 'in'),
+            self.punch('a-4', self.alice, '2025-03-04T13:00:00', 'out'),
+            self.punch('a-4', self.alice, '2025-03-04T13:00:00', 'out'),
+            self.punch('x-1', self.alice, 'yesterday', 'in'),
+            {'event_id': 'z-1', 'employee_id': 999999,
+             'timestamp': '2025-03-04T09:00:00', 'direction': 'in'},
+        ]
+        
+        response = self.ingest(punches)
+        
+        self.assertEqual(response.status_code, 200)
+        report = response.json()
+        self.assertEqual(report['stored'], 5)
+        self.assertEqual(report['entries_created'], 3)
+        self.assertEqual(report['duplicates'], ['a-4'])
+        self.assertEqual(report['invalid'], [{'index': 6, 'error': 'Invalid timestamp'}])
+        self.assertEqual(report['unknown_employees'][0]['event_ids'], ['z-1'])
+        
+        timesheet = Timesheet.objects.get(employee=self.alice, week_start=date(2025, 3, 3))
+        self.assertEqual(timesheet.regular_hours, Decimal('12.00'))
+        self.assertEqual(timesheet.overtime_hours, Decimal('1.00'))
+        self.assertEqual(
+            TimeEntry.objects.get(employee=self.bob).status, 'active'
+        )
+        self.assertTrue(PresenceStatus.objects.get(employee=self.bob).is_clocked_in)
+        self.assertFalse(PresenceStatus.objects.get(employee=self.alice).is_clocked_in)
+        entry = TimeEntry.objects.get(employee=self.alice, clock_in__day=3)
+        self.assertEqual(entry.entry_type, 'overtime')
+        self.assertEqual(entry.original_hours, Decimal('9.00'))
+        self.assertEqual(entry.punch_events.count(), 2)
+    
+    def test_retried_batch_is_idempotent(self):
+        """Test uploading the same batch twice stores nothing new."""
+        punches = [
+            self.punch('a-1', self.alice, '2025-03-03T08:00:00', 'in'),
+            self.punch('a-2', self.alice, '2025-03-03T12:00:00', 'out'),
+        ]
+        self.ingest(punches)
+        
+        report = self.ingest(punches).json()
+        
+        self.assertEqual(report['stored'], 0)
+        self.assertEqual(sorted(report['duplicates']), ['a-1', 'a-2'])
+        self.assertEqual(TimeEntry.objects.filter(employee=self.alice).count(), 1)
+        self.assertEqual(
+            Timesheet.objects.get(employee=self.alice).total_hours, Decimal('4.00')
+        )
+    
+    def test_out_punch_closes_open_entry(self):
+        """Test a later out punch closes an entry clocked in earlier."""
+        self.ingest([self.punch('b-1', self.bob, '2025-03-04T09:00:00', 'in')])
+        
+        report = self.ingest([
+            self.punch('b-2', self.bob, '2025-03-04T15:30:00', 'out'),
+            self.punch('b-3', self.bob, '2025-03-04T16:00:00', 'out'),
+        ]).json()
+        
+        self.assertEqual(report['entries_closed'], 1)
+        self.assertEqual(report['unpaired'], [
+            {'event_id': 'b-3', 'error': 'No clock in before this clock out'}
+        ])
+        entry = TimeEntry.objects.get(employee=self.bob)
+        self.assertEqual(entry.status, 'completed')
+        self.assertEqual(entry.hours_worked, Decimal('6.50'))
+        self.assertEqual(
+            Timesheet.objects.get(employee=self.bob).total_hours, Decimal('6.50')
+        )
+    
+    def test_out_punch_uploaded_before_its_in(self):
+        """Test an out punch stored without its in is paired when the in arrives."""
+        report = self.ingest([self.punch('a-2', self.alice, '2025-03-03T16:00:00', 'out')]).json()
+        self.assertEqual(report['unpaired'][0]['event_id'], 'a-2')
+        
+        report = self.ingest([self.punch('a-1', self.alice, '2025-03-03T08:00:00', 'in')]).json()
+        
+        self.assertEqual(report['entries_created'], 1)
+        self.assertEqual(report['unpaired'], [])
+        entry = TimeEntry.objects.get(employee=self.alice)
+        self.assertEqual(entry.status, 'completed')
+        self.assertEqual(entry.hours_worked, Decimal('8.00'))
+        self.assertEqual(
+            sorted(entry.punch_events.values_list('event_id', flat=True)), ['a-1', 'a-2']
+        )
+        self.assertFalse(PresenceStatus.objects.get(employee=self.alice).is_clocked_in)
+        self.assertEqual(
+            Timesheet.objects.get(employee=self.alice).total_hours, Decimal('8.00')
+        )
+    
+    def test_requires_staff(self):
+        """Test non-staff users cannot upload punches."""
+        self.client.force_login(self.alice.user)
+        
+        response = self.ingest([self.punch('a-1', self.alice, '2025-03-03T08:00:00', 'in')])
+        
+        self.assertEqual(response.status_code, 403)
+
+
+class AttendanceSummaryTest(TestCase):
+    """Test the database-side attendance summary."""
+    
+    def setUp(self):
+        """Set up two departments with one employee each."""
+        User = get_user_model()
+        self.admin = User.objects.create_user(
+            username='manager', email='manager@example.com', password='testpass123', is_staff=True
+        )
+        self.client.force_login(self.admin)
+        self.engineering = Department.objects.create(name='Engineering')
+        self.support = Department.objects.create(name='Support')
+        self.alice = User.objects.create_user(
+            username='alice', email='alice@example.com', password='testpass123'
+        ).employee_profile
+        self.bob = User.objects.create_user(
+            username='bob', email='bob@example.com', password='testpass123'
+        ).employee_profile
+        Employee.objects.filter(pk=self.alice.pk).update(department=self.engineering)
+        Employee.objects.filter(pk=self.bob.pk).update(department=self.support)
+        
+        monday = timezone.make_aware(datetime(2025, 3, 3, 8, 0))
+        for employee, day, hours in [
+            (self.alice, 0, 10), (self.alice, 1, 8), (self.bob, 0, 6), (self.bob, 14, 8)
+        ]:
+            TimeEntry.objects.create(
+                employee=employee,
+                clock_in=monday + timedelta(days=day),
+                clock_out=monday + timedelta(days=day, hours=hours),
+                status='completed'
+            )
+        self.url = '/api/attendance/reports/generate_summary/'
+    
+    def summarize(self, **data):
+        data = {'start_date': '2025-03-01', 'end_date': '2025-03-09', **data}
+        return self.client.post(self.url, data, content_type='application/json')
+    
+    def test_time_entries_store_durations(self):
+        """Test worked seconds and the overtime split are stored on save."""
+        entry = TimeEntry.objects.get(employee=self.alice, clock_in__day=3)
+        self.assertEqual(entry.worked_seconds, 36000)
+        self.assertEqual(entry.regular_hours, Decimal('8.00'))
+        self.assertEqual(entry.overtime_hours, Decimal('2.00'))
+        self.assertTrue(entry.is_overtime)
+    
+    def test_summary_totals(self):
+        """Test the summary totals entries within the date range."""
+        response = self.summarize()
+        
+        self.assertEqual(response.status_code, 200)
+        statistics = response.json()['statistics']
+        self.assertEqual(statistics['total_entries'], 3)
+        self.assertEqual(statistics['total_hours'], 24.0)
+        self.assertEqual(statistics['overtime_entries'], 1)
+        self.assertEqual(statistics['overtime_hours'], 2.0)
+    
+    def test_grouped_summary_runs_one_query(self):
+        """Test per-department and per-employee breakdowns."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.summarize(group_by='department')
+        
+        self.assertEqual(
+            len([query for query in queries if 'attendance_timeentry' in query['sql']]), 1
+        )
+        by_department = {row['department_name']: row for row in response.json()['by_department']}
+        self.assertEqual(by_department['Engineering']['total_hours'], 18.0)
+        self.assertEqual(by_department['Support']['total_hours'], 6.0)
+        
+        response = self.summarize(group_by='employee', department_id=self.support.pk)
+        rows = response.json()['by_employee']
+        self.assertEqual([row['employee_id'] for row in rows], [self.bob.pk])
+        self.assertEqual(response.json()['statistics']['total_entries'], 1)
+    
+    def test_invalid_parameters(self):
+        """Test missing dates and unknown breakdowns are rejected."""
+        self.assertEqual(self.summarize(start_date='').status_code, 400)
+        self.assertEqual(self.summarize(start_date='2025-02-30').status_code, 400)
+        self.assertEqual(self.summarize(group_by='project').status_code, 400)
+        self.assertEqual(self.summarize(department_id='support').status_code, 400)
+        self.assertEqual(self.summarize(employee_id=[self.bob.pk]).status_code, 400)
+    
+    def test_backfill_command(self):
+        """Test the backfill command restores cleared durations."""
+        TimeEntry.objects.update(worked_seconds=0, regular_hours=0, overtime_hours=0)
+        out = StringIO()
+        
+        call_command('backfill_time_entry_durations', stdout=out)
+        
+        self.assertIn('updated 4', out.getvalue())
+        self.assertEqual(self.summarize().json()['statistics']['total_hours'], 24.0)
+
+
+class PresenceTest(TestCase):
+    """Test the presence index behind the clocked-in board."""
+    
+    def setUp(self):
+        """Set up two employees in one department and a staff viewer."""
+        User = get_user_model()
+        self.department = Department.objects.create(name='Warehouse')
+        self.users = []
+        for username in ['alice', 'bob']:
+            user = User.objects.create_user(
+                username=username, email=f'{username}@example.com', password='testpass123'
+            )
+            Employee.objects.filter(pk=user.employee_profile.pk).update(department=self.department)
+            self.users.append(User.objects.get(pk=user.pk))
+        self.manager = User.objects.create_user(
+            username='floor', email='floor@example.com', password='testpass123', is_staff=True
+        )
+    
+    def board(self, user, **params):
+        self.client.force_login(user)
+        return self.client.get(
+            '/api/attendance/time-entries/presence/',
+            {'department_id': self.department.pk, **params}
+        ).json()
+    
+    def test_clock_in_and_out_update_presence(self):
+        """Test clocking in and out moves the employee on the board."""
+        alice = self.users[0]
+        self.client.force_login(alice)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/attendance/time-entries/clock_in/', {'clock_in_location': 'Dock'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            self.client.post('/api/attendance/time-entries/clock_in/').status_code, 400
+        )
+        
+        board = self.board(self.manager)
+        self.assertEqual(board['clocked_in'], 1)
+        self.assertEqual(len(board['employees']), 2)
+        cursor = board['cursor']
+        
+        self.client.force_login(alice)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/attendance/time-entries/clock_out/', {'location': 'Gate'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'completed')
+        
+        changes = self.board(self.manager, since=cursor)
+        self.assertEqual(len(changes['employees']), 1)
+        self.assertFalse(changes['employees'][0]['is_clocked_in'])
+        self.assertEqual(changes['employees'][0]['location'], 'Gate')
+        self.assertGreater(changes['cursor'], cursor)
+        self.assertEqual(self.board(self.manager, since=changes['cursor'])['employees'], [])
+        self.assertEqual(
+            self.client.get('/api/attendance/time-entries/presence/', {'department_id': 'x'}).status_code,
+            400
+        )
+    
+    def test_changes_since_cursor_is_one_query(self):
+        """Test polling for changes reads the presence table once."""
+        with self.captureOnCommitCallbacks(execute=True):
+            TimeEntry.objects.create(
+                employee=self.users[1].employee_profile, clock_in=timezone.now(), status='active'
+            )
+        self.client.force_login(self.manager)
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                '/api/attendance/time-entries/presence/',
+                {'department_id': self.department.pk, 'since': 0}
+            )
+        
+        self.assertEqual(response.json()['clocked_in'], 1)
+        self.assertEqual(
+            len([query for query in queries if 'attendance_presencestatus' in query['sql']]), 1
+        )
+    
+    def test_punch_leaves_sequence_unlocked_until_commit(self):
+        """Test a punch only takes a cursor number once its transaction commits."""
+        alice = self.users[0].employee_profile
+        with self.captureOnCommitCallbacks() as callbacks:
+            TimeEntry.objects.create(employee=alice, clock_in=timezone.now(), status='active')
+            self.assertFalse(IdentifierSequence.objects.filter(prefix=PRESENCE_SEQUENCE).exists())
+            self.assertTrue(PresenceStatus.objects.get(employee=alice).is_clocked_in)
+        
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.board(self.manager, since=0)['employees'][0]['employee'], alice.pk)
+    
+    def test_rebuild_command_indexes_existing_entries(self):
+        """Test the rebuild command restores presence from time entries."""
+        entry = TimeEntry.objects.create(
+            employee=self.users[0].employee_profile, clock_in=timezone.now(), status='active'
+        )
+        PresenceStatus.objects.all().delete()
+        out = StringIO()
+        
+        call_command('rebuild_presence', stdout=out)
+        
+        presence = PresenceStatus.objects.get(employee=self.users[0].employee_profile)
+        self.assertTrue(presence.is_clocked_in)
+        self.assertEqual(presence.time_entry, entry)
+        self.assertFalse(PresenceStatus.objects.get(employee=self.users[1].employee_profile).is_clocked_in)
+        
+        entry.delete()
+        self.assertFalse(PresenceStatus.objects.get(employee=self.users[0].employee_profile).is_clocked_in)
+
+
+class AbsenceReportTest(TestCase):
+    """Test absence detection against schedules, holidays and leave."""
+    
+    def setUp(self):
+        """Set up a Monday-Friday department with two employees."""
+        User = get_user_model()
+        self.admin = User.objects.create_user(
+            username='hr', email='hr@example.com', password='testpass123', is_staff=True
+        )
+        self.department = Department.objects.create(name='Operations')
+        other_department = Department.objects.create(name='Sales')
+        WorkSchedule.objects.create(name='Operations week', department=self.department)
+        
+        self.employees = []
+        for username in ['alice', 'bob']:
+            user = User.objects.create_user(
+                username=username, email=f'{username}@example.com', password='testpass123'
+            )
+            Employee.objects.filter(pk=user.employee_profile.pk).update(
+                department=self.department, hire_date=date(2024, 1, 1)
+            )
+            self.employees.append(Employee.objects.get(pk=user.employee_profile.pk))
+        self.alice, self.bob = self.employees
+        
+        # Wednesday is a company holiday; Friday is a holiday for Sales only
+        Holiday.objects.create(name='Founders Day', date=date(2025, 3, 5))
+        Holiday.objects.create(name='Sales Day', date=date(2025, 3, 7)).departments.add(other_department)
+        
+        leave_type = LeaveType.objects.create(name='Vacation')
+        LeaveRequest.objects.create(
+            employee=self.bob, leave_type=leave_type, start_date=date(2025, 3, 6),
+            end_date=date(2025, 3, 10), total_days=Decimal('3'), reason='Trip', status='approved'
+        )
+        
+        for employee, day in [(self.alice, 3), (self.alice, 4), (self.alice, 5), (self.bob, 3)]:
+            clock_in = timezone.make_aware(datetime(2025, 3, day, 9, 0))
+            TimeEntry.objects.create(
+                employee=employee, clock_in=clock_in,
+                clock_out=clock_in + timedelta(hours=8), status='completed'
+            )
+    
+    def test_absence_report(self):
+        """Test missing days skip weekends, holidays and approved leave."""
+        self.client.force_login(self.admin)
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/attendance/reports/absences/', {
+                'start_date': '2025-03-03', 'end_date': '2025-03-09',
+                'department_id': self.department.pk
+            })
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(queries), 10)
+        rows = {row['employee']: row for row in response.json()['employees']}
+        self.assertEqual(rows[self.alice.pk]['missing_days'], ['2025-03-06', '2025-03-07'])
+        self.assertEqual(rows[self.alice.pk]['expected_days'], 4)
+        self.assertEqual(rows[self.bob.pk]['missing_days'], ['2025-03-04'])
+        self.assertEqual(rows[self.bob.pk]['leave_days'], 2)
+        self.assertEqual(rows[self.bob.pk]['attendance_rate'], 50.0)
+        self.assertEqual(response.json()['total_missing_days'], 3)
+    
+    def test_timesheet_missing_days(self):
+        """Test timesheets report missing days with the same rules."""
+        timesheet = Timesheet.objects.get(employee=self.alice, week_start=date(2025, 3, 3))
+        
+        self.assertEqual(timesheet.missing_days, [date(2025, 3, 6), date(2025, 3, 7)])
+    
+    def test_half_day_leave_counts_half(self):
+        """Test half-day leave only covers half of its first day."""
+        LeaveRequest.objects.create(
+            employee=self.alice, leave_type=LeaveType.objects.get(name='Vacation'),
+            start_date=date(2025, 3, 6), end_date=date(2025, 3, 7),
+            duration_type='half_day_morning', total_days=Decimal('1.5'),
+            reason='Appointment', status='approved'
+        )
+        self.client.force_login(self.admin)
+        
+        response = self.client.get('/api/attendance/reports/absences/', {
+            'start_date': '2025-03-03', 'end_date': '2025-03-09', 'employee_id': self.alice.pk
+        })
+        
+        row = response.json()['employees'][0]
+        self.assertEqual(row['leave_days'], 1.5)
+        self.assertEqual(row['expected_days'], 2.5)
+        self.assertEqual(row['missing_days'], ['2025-03-06'])
+    
+    def test_timesheet_list_prefetches_missing_days(self):
+        """Test listing timesheets computes missing days once per page."""
+        self.client.force_login(self.admin)
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/attendance/timesheets/', {'fields': 'id,missing_days'})
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            len([query for query in queries if 'leaves_leaverequest' in query['sql']]), 1
+        )
+    
+    def test_invalid_range(self):
+        """Test reversed, missing and impossible dates and non-integer ids are rejected."""
+        self.client.force_login(self.admin)
+        url = '/api/attendance/reports/absences/'
+        
+        response = self.client.get(url, {'start_date': '2025-03-09', 'end_date': '2025-03-03'})
+        self.assertEqual(response.status_code, 400)
+        
+        response = self.client.get(url, {'start_date': '2025-02-30', 'end_date': '2025-03-03'})
+        self.assertEqual(response.status_code, 400)
+        
+        response = self.client.get(
+            url, {'start_date': '2025-03-03', 'end_date': '2025-03-07', 'department_id': 'ops'}
+        )
+        self.assertEqual(response.status_code, 400)
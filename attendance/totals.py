@@ -0,0 +1,95 @@
+"""
+Incrementally maintained timesheet totals.
+
+A completed or approved ``TimeEntry`` contributes its regular, overtime and
+break hours to the timesheet of its week. Instead of re-reading the whole
+week on every save, the difference between what an entry contributed when
+it was loaded and what it contributes now is added to the timesheet with a
+single ``UPDATE ... SET hours = hours + delta``. An entry saved without
+having been loaded with those fields has its stored contribution read back
+before the save. ``reconcile_timesheets``
+recomputes totals from scratch to correct any drift.
+"""
+from datetime import timedelta
+
+from django.db.models import F
+
+from .models import TimeEntry, Timesheet
+
+TOTAL_FIELDS = ['regular_hours', 'overtime_hours', 'total_hours', 'break_hours']
+
+
+def add_timesheet_hours(employee_id, week_start, hours, sign=1):
+    """
+    Add ``(regular, overtime, break)`` hours to a timesheet.
+
+    Returns False if the employee has no timesheet for that week.
+    """
+    regular, overtime, break_hours = (sign * value for value in hours)
+    return Timesheet.objects.filter(employee_id=employee_id, week_start=week_start).update(
+        regular_hours=F('regular_hours') + regular,
+        overtime_hours=F('overtime_hours') + overtime,
+        total_hours=F('total_hours') + regular + overtime,
+        break_hours=F('break_hours') + break_hours,
+    ) > 0
+
+
+def remember_stored_contribution(entry):
+    """Read what a stored entry contributes if it was not loaded with it"""
+    if entry.pk is None or hasattr(entry, '_timesheet_contribution'):
+        return
+    stored = TimeEntry.objects.filter(pk=entry.pk).only(*TimeEntry.TIMESHEET_FIELDS).first()
+    entry._timesheet_contribution = stored.timesheet_contribution() if stored else None
+
+
+def record_time_entry_saved(entry, created):
+    """Apply the change in a saved entry's hours to its timesheet(s)"""
+    old = None if created else getattr(entry, '_timesheet_contribution', None)
+    new = entry.timesheet_contribution()
+    entry._timesheet_contribution = new
+    if new is None or old == new:
+        return
+
+    employee_id, week_start, hours = new
+    if old is not None and old[:2] == new[:2]:
+        exists = add_timesheet_hours(
+            employee_id, week_start,
+            [after - before for after, before in zip(hours, old[2])]
+        )
+    else:
+        if old is not None:
+            add_timesheet_hours(*old, sign=-1)
+        exists = add_timesheet_hours(employee_id, week_start, hours)
+
+    if not exists:
+        # A new timesheet computes its totals from every entry of the week
+        Timesheet.objects.get_or_create(
+            employee_id=employee_id,
+            week_start=week_start,
+            defaults={'week_end': week_start + timedelta(days=6), 'status': 'draft'}
+        )
+
+
+def record_time_entry_deleted(entry):
+    """Remove a deleted entry's hours from its timesheet"""
+    old = getattr(entry, '_timesheet_contribution', None) or entry.timesheet_contribution()
+    if old is not None:
+        add_timesheet_hours(*old, sign=-1)
+
+
+def reconcile_timesheets(timesheets=None):
+    """
+    Recompute timesheet totals from their time entries.
+
+    ``timesheets`` is a Timesheet queryset and defaults to every timesheet.
+    Returns the number of timesheets checked and the number corrected.
+    """
+    timesheets = Timesheet.objects.all() if timesheets is None else timesheets
+    checked = corrected = 0
+    for timesheet in timesheets.iterator():
+        stored = [getattr(timesheet, field) for field in TOTAL_FIELDS]
+        timesheet.calculate_totals()
+        checked += 1
+        if stored != [getattr(timesheet, field) for field in TOTAL_FIELDS]:
+            corrected += 1
+    return checked, corrected
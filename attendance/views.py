@@ -2,8 +2,11 @@
 Attendance app views for time tracking and management.
 """
 from datetime import datetime, timedelta
+from decimal import Decimal
 from django.utils import timezone
+from django.db import IntegrityError
 from django.db.models import Q, Sum, Avg
+from django.utils.dateparse import parse_date
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
@@ -19,6 +22,10 @@ from .serializers import (
     AttendanceReportSerializer, OvertimeRequestSerializer,
     TimeEntryCreateSerializer
 )
+from .absences import MAX_ABSENCE_RANGE_DAYS, find_absences, prefetch_missing_days
+from .presence import current_entry, presence_board
+from .punches import PunchBatchError, ingest_punches
+from .reports import SUMMARY_GROUPS, summarize_time_entries
 
 
 class WorkScheduleViewSet(DynamicFieldsMixin, viewsets.ModelViewSet):
@@ -86,7 +93,7 @@ class TimeEntryViewSet(DynamicFieldsMixin, viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     filterset_fields = ['employee', 'entry_type', 'status']
     search_fields = ['employee__user__first_name', 'employee__user__last_name', 'notes']
-    ordering_fields = ['clock_in_time', 'clock_out_time', 'created_at']
+    ordering_fields = ['clock_in', 'clock_out', 'created_at']
     ordering = ['-created_at']
 
     def get_serializer_class(self):
@@ -105,32 +112,29 @@ class TimeEntryViewSet(DynamicFieldsMixin, viewsets.ModelViewSet):
         end_date = self.request.query_params.get('end_date')
         
         if start_date:
-            queryset = queryset.filter(clock_in_time__date__gte=start_date)
+            queryset = queryset.filter(clock_in__date__gte=start_date)
         if end_date:
-            queryset = queryset.filter(clock_in_time__date__lte=end_date)
+            queryset = queryset.filter(clock_in__date__lte=end_date)
         
         # If user has employee profile, filter to their entries
-        if hasattr(user, 'employee') and not user.is_staff:
-            queryset = queryset.filter(employee=user.employee)
+        if hasattr(user, 'employee_profile') and not user.is_staff:
+            queryset = queryset.filter(employee=user.employee_profile)
         
         return queryset
 
     @action(detail=False, methods=['post'])
     def clock_in(self, request):
         """Clock in the authenticated user."""
-        if not hasattr(request.user, 'employee'):
+        if not hasattr(request.user, 'employee_profile'):
             return Response(
                 {'error': 'No employee profile found'}, 
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        employee = request.user.employee
+        employee = request.user.employee_profile
         
         # Check if already clocked in
-        active_entry = TimeEntry.objects.filter(
-            employee=employee,
-            clock_out_time__isnull=True
-        ).first()
+        active_entry = current_entry(employee)
         
         if active_entry:
             return Response(
@@ -154,19 +158,16 @@ class TimeEntryViewSet(DynamicFieldsMixin, viewsets.ModelViewSet):
     @action(detail=False, methods=['post'])
     def clock_out(self, request):
         """Clock out the authenticated user."""
-        if not hasattr(request.user, 'employee'):
+        if not hasattr(request.user, 'employee_profile'):
             return Response(
                 {'error': 'No employee profile found'}, 
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        employee = request.user.employee
+        employee = request.user.employee_profile
         
         # Find active time entry
-        active_entry = TimeEntry.objects.filter(
-            employee=employee,
-            clock_out_time__isnull=True
-        ).first()
+        active_entry = current_entry(employee)
         
         if not active_entry:
             return Response(
@@ -175,7 +176,8 @@ class TimeEntryViewSet(DynamicFieldsMixin, viewsets.ModelViewSet):
             )
         
         # Update with clock out time
-        active_entry.clock_out_time = timezone.now()
+        active_entry.clock_out = timezone.now()
+        active_entry.status = 'completed'
         if 'location' in request.data:
             active_entry.clock_out_location = request.data['location']
         if 'notes' in request.data:
@@ -186,20 +188,80 @@ class TimeEntryViewSet(DynamicFieldsMixin, viewsets.ModelViewSet):
         serializer = TimeEntrySerializer(active_entry)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['post'])
+    def bulk_ingest(self, request):
+        """Store a batch of badge terminal punches as time entries."""
+        if not request.user.is_staff:
+            return Response(
+                {'error': 'Only staff accounts can upload punches'}, 
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        rows = request.data.get('punches') if isinstance(request.data, dict) else request.data
+        try:
+            report = ingest_punches(rows, user=request.user)
+        except PunchBatchError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except IntegrityError:
+            # Another upload stored some of these punches first
+            return Response(
+                {'error': 'Punches were uploaded concurrently, retry the batch'}, 
+                status=status.HTTP_409_CONFLICT
+            )
+        
+        return Response(report)
+
+    @action(detail=False, methods=['get'])
+    def presence(self, request):
+        """Who is clocked in, optionally for one department and only changes since a cursor."""
+        department_id = request.query_params.get('department_id')
+        since = request.query_params.get('since')
+        
+        if since is not None:
+            try:
+                since = int(since)
+            except ValueError:
+                return Response(
+                    {'error': 'since must be a cursor returned by this endpoint'}, 
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        try:
+            department_id = int(department_id) if department_id else None
+        except ValueError:
+            return Response(
+                {'error': 'department_id must be an integer'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Employees can follow their own department only
+        if not request.user.is_staff:
+            employee = getattr(request.user, 'employee_profile', None)
+            if employee is None or not employee.department_id:
+                return Response(
+                    {'error': 'Employee has no department assigned'}, 
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            department_id = employee.department_id
+        
+        cursor, rows = presence_board(department_id=department_id, since=since)
+        return Response({
+            'cursor': cursor,
+            'since': since,
+            'clocked_in': sum(row['is_clocked_in'] for row in rows),
+            'employees': rows
+        })
+
     @action(detail=False, methods=['get'])
     def current_status(self, request):
         """Get current clock status for the authenticated user."""
-        if not hasattr(request.user, 'employee'):
+        if not hasattr(request.user, 'employee_profile'):
             return Response(
                 {'error': 'No employee profile found'}, 
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        employee = request.user.employee
-        active_entry = TimeEntry.objects.filter(
-            employee=employee,
-            clock_out_time__isnull=True
-        ).first()
+        employee = request.user.employee_profile
+        active_entry = current_entry(employee)
         
         if active_entry:
             serializer = TimeEntrySerializer(active_entry)
@@ -227,6 +289,20 @@ class TimesheetViewSet(DynamicFieldsMixin, viewsets.ModelViewSet):
         """Return appropriate serializer based on action."""
         return TimesheetSerializer
 
+    def list(self, request, *args, **kwargs):
+        """List timesheets, computing missing days for the whole page at once."""
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        timesheets = list(page if page is not None else queryset)
+        
+        serializer = self.get_serializer(timesheets, many=True)
+        if 'missing_days' in serializer.child.fields:
+            prefetch_missing_days(timesheets)
+        
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)
+
     def get_queryset(self):
         """Filter timesheets based on user permissions."""
         user = self.request.user
@@ -386,55 +462,151 @@ class AttendanceReportViewSet(DynamicFieldsMixin, viewsets.ModelViewSet):
     @action(detail=False, methods=['post'])
     def generate_summary(self, request):
         """Generate attendance summary for specified period."""
-        start_date = request.data.get('start_date')
-        end_date = request.data.get('end_date')
+        try:
+            start_date = parse_date(str(request.data.get('start_date') or ''))
+            end_date = parse_date(str(request.data.get('end_date') or ''))
+        except ValueError:
+            # Well formed but impossible, e.g. 2025-02-30
+            start_date = end_date = None
         employee_id = request.data.get('employee_id')
+        department_id = request.data.get('department_id')
+        group_by = request.data.get('group_by') or None
         
         if not start_date or not end_date:
             return Response(
-                {'error': 'start_date and end_date are required'}, 
+                {'error': 'start_date and end_date are required (YYYY-MM-DD)'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            employee_id = int(employee_id) if employee_id else None
+            department_id = int(department_id) if department_id else None
+        except (TypeError, ValueError):
+            return Response(
+                {'error': 'employee_id and department_id must be integers'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if start_date > end_date:
+            return Response(
+                {'error': 'start_date must be on or before end_date'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if group_by is not None and group_by not in SUMMARY_GROUPS:
+            return Response(
+                {'error': f"group_by must be one of {', '.join(SUMMARY_GROUPS)}"}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
         
         # Build query
         queryset = TimeEntry.objects.filter(
-            clock_in_time__date__gte=start_date,
-            clock_in_time__date__lte=end_date,
-            clock_out_time__isnull=False
-        )
-        
+            clock_in__date__gte=start_date,
+            clock_in__date__lte=end_date,
+            clock_out__isnull=False
+        ).exclude(status='rejected')
+        
+        if not request.user.is_staff:
+            if not hasattr(request.user, 'employee_profile'):
+                return Response(
+                    {'error': 'No employee profile found'}, 
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            queryset = queryset.filter(employee=request.user.employee_profile)
         if employee_id:
             queryset = queryset.filter(employee_id=employee_id)
-        elif hasattr(request.user, 'employee') and not request.user.is_staff:
-            queryset = queryset.filter(employee=request.user.employee)
-        
-        # Calculate summary statistics
-        total_entries = queryset.count()
-        total_hours = queryset.aggregate(
-            total=Sum('hours_worked')
-        )['total'] or 0
-        
-        avg_hours = queryset.aggregate(
-            avg=Avg('hours_worked')
-        )['avg'] or 0
-        
-        overtime_entries = queryset.filter(is_overtime=True)
-        overtime_hours = overtime_entries.aggregate(
-            total=Sum('hours_worked')
-        )['total'] or 0
+        if department_id:
+            queryset = queryset.filter(employee__department_id=department_id)
         
+        statistics, breakdown = summarize_time_entries(queryset, group_by)
         summary = {
             'period': {
                 'start_date': start_date,
                 'end_date': end_date
             },
-            'statistics': {
-                'total_entries': total_entries,
-                'total_hours': float(total_hours),
-                'average_hours_per_day': float(avg_hours),
-                'overtime_entries': overtime_entries.count(),
-                'overtime_hours': float(overtime_hours)
-            }
+            'statistics': statistics
         }
+        if breakdown is not None:
+            summary[f'by_{group_by}'] = breakdown
         
         return Response(summary)
+
+    @action(detail=False, methods=['get'])
+    def absences(self, request):
+        """List the scheduled working days each employee has no time entries for."""
+        try:
+            start_date = parse_date(request.query_params.get('start_date') or '')
+            end_date = parse_date(request.query_params.get('end_date') or '')
+        except ValueError:
+            # Well formed but impossible, e.g. 2025-02-30
+            start_date = end_date = None
+        department_id = request.query_params.get('department_id')
+        employee_id = request.query_params.get('employee_id')
+        
+        if not start_date or not end_date:
+            return Response(
+                {'error': 'start_date and end_date are required (YYYY-MM-DD)'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if start_date > end_date:
+            return Response(
+                {'error': 'start_date must be on or before end_date'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if (end_date - start_date).days >= MAX_ABSENCE_RANGE_DAYS:
+            return Response(
+                {'error': f'The range cannot exceed {MAX_ABSENCE_RANGE_DAYS} days'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            department_id = int(department_id) if department_id else None
+            employee_id = int(employee_id) if employee_id else None
+        except ValueError:
+            return Response(
+                {'error': 'department_id and employee_id must be integers'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        employees = Employee.objects.filter(employment_status='active').order_by('last_name', 'first_name')
+        if not request.user.is_staff:
+            if not hasattr(request.user, 'employee_profile'):
+                return Response(
+                    {'error': 'No employee profile found'}, 
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            employees = employees.filter(pk=request.user.employee_profile.pk)
+        if department_id:
+            employees = employees.filter(department_id=department_id)
+        if employee_id:
+            employees = employees.filter(pk=employee_id)
+        
+        employees = list(employees)
+        absences = find_absences(employees, start_date, end_date)
+        
+        rows = []
+        for employee in employees:
+            days = absences[employee.pk]
+            expected = days['expected_count']
+            # A day half taken as leave only needs the other half attended
+            attended = (
+                len(days['expected_days'] & days['worked_days'])
+                - Decimal('0.5') * len(days['half_leave_days'] & days['worked_days'])
+            )
+            rows.append({
+                'employee': employee.pk,
+                'employee_id': employee.employee_id,
+                'employee_name': employee.full_name,
+                'department': employee.department_id,
+                'expected_days': float(expected),
+                'attended_days': float(attended),
+                'leave_days': float(days['leave_count']),
+                'missing_days': days['missing_days'],
+                'attendance_rate': float(round(attended / expected * 100, 1)) if expected else None
+            })
+        
+        return Response({
+            'period': {
+                'start_date': start_date,
+                'end_date': end_date
+            },
+            'department': department_id,
+            'total_missing_days': sum(len(row['missing_days']) for row in rows),
+            'employees': rows
+        })
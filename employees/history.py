@@ -0,0 +1,141 @@
+"""
+Bulk-aware history tracking.
+
+``BatchedHistoricalRecords`` behaves exactly like simple_history's
+``HistoricalRecords`` except inside a ``batched_history()`` block, where
+historical rows are collected in memory and written with one ``bulk_create``
+per history model when the block exits. ``update_with_history`` gives
+queryset updates, which normally skip history entirely, the same audit trail.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import transaction
+from django.utils import timezone
+from simple_history.models import HistoricalRecords
+from simple_history.signals import (
+    pre_create_historical_record, post_create_historical_record
+)
+
+# Rows per INSERT when flushing history
+HISTORY_BATCH_SIZE = 500
+
+_collector = ContextVar('history_collector', default=None)
+
+
+class BatchedHistoricalRecords(HistoricalRecords):
+    """HistoricalRecords that can defer its inserts to a batched_history() block"""
+
+    def create_historical_record(self, instance, history_type, using=None):
+        collected = _collector.get()
+        if collected is None or self.m2m_fields:
+            return super().create_historical_record(instance, history_type, using=using)
+
+        using = using if self.use_base_model_db else None
+        history_date = getattr(instance, '_history_date', timezone.now())
+        history_user = self.get_history_user(instance)
+        history_change_reason = self.get_change_reason_for_object(
+            instance, history_type, using
+        )
+        manager = getattr(instance, self.manager_name)
+
+        attrs = {
+            field.attname: getattr(instance, field.attname)
+            for field in self.fields_included(instance)
+        }
+        if getattr(manager.model, 'history_relation', None) is not None:
+            attrs['history_relation'] = instance
+        history_instance = manager.model(
+            history_date=history_date,
+            history_type=history_type,
+            history_user=history_user,
+            history_change_reason=history_change_reason,
+            **attrs,
+        )
+        pre_create_historical_record.send(
+            sender=manager.model,
+            instance=instance,
+            history_date=history_date,
+            history_user=history_user,
+            history_change_reason=history_change_reason,
+            history_instance=history_instance,
+            using=using,
+        )
+        collected.add(manager.model, using, instance, history_instance)
+
+
+class HistoryCollector:
+    """Historical rows waiting to be written, grouped by history model"""
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.rows = {}
+
+    def add(self, history_model, using, instance, history_instance):
+        self.rows.setdefault((history_model, using), []).append((instance, history_instance))
+
+    def flush(self):
+        for (history_model, using), rows in self.rows.items():
+            history_model.objects.using(using).bulk_create(
+                [history_instance for _, history_instance in rows],
+                batch_size=self.batch_size
+            )
+            for instance, history_instance in rows:
+                post_create_historical_record.send(
+                    sender=history_model,
+                    instance=instance,
+                    history_instance=history_instance,
+                    history_date=history_instance.history_date,
+                    history_user=history_instance.history_user,
+                    history_change_reason=history_instance.history_change_reason,
+                    using=using,
+                )
+        self.rows = {}
+
+
+@contextmanager
+def batched_history(batch_size=HISTORY_BATCH_SIZE):
+    """
+    Collect historical records created in this block and bulk insert them on exit.
+
+    The block runs in a transaction so the model rows and their history are
+    committed together. Nested blocks share the outermost collector.
+    """
+    if _collector.get() is not None:
+        yield
+        return
+
+    collector = HistoryCollector(batch_size)
+    token = _collector.set(collector)
+    try:
+        with transaction.atomic():
+            yield
+            collector.flush()
+    finally:
+        _collector.reset(token)
+
+
+def update_with_history(queryset, user=None, change_reason='', batch_size=HISTORY_BATCH_SIZE, **values):
+    """
+    Run ``queryset.update(**values)`` and write a history row for every updated object.
+
+    Returns the number of rows updated.
+    """
+    model = queryset.model
+    pks = list(queryset.values_list('pk', flat=True))
+    if not pks:
+        return 0
+
+    updated = 0
+    with transaction.atomic():
+        for offset in range(0, len(pks), batch_size):
+            chunk = pks[offset:offset + batch_size]
+            updated += model._default_manager.filter(pk__in=chunk).update(**values)
+            model.history.bulk_history_create(
+                model._default_manager.filter(pk__in=chunk),
+                update=True,
+                default_user=user,
+                default_change_reason=change_reason,
+                batch_size=batch_size
+            )
+    return updated
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.1 on 2026-10-17 00:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employees', '0002_historicaldepartment_historicalemployee_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdentifierSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prefix', models.CharField(max_length=20)),
+                ('period', models.CharField(blank=True, help_text='Numbering restarts for each period, e.g. a year', max_length=10)),
+                ('last_value', models.BigIntegerField(default=0, help_text='Highest number handed out')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('prefix', 'period')},
+            },
+        ),
+    ]
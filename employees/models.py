@@ -4,7 +4,7 @@ from django.conf import settings
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 from datetime import date
-from simple_history.models import HistoricalRecords
+from .history import BatchedHistoricalRecords
 
 User = get_user_model()
 
@@ -17,7 +17,7 @@ class Department(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     # History tracking
-    history = HistoricalRecords()
+    history = BatchedHistoricalRecords()
 
     def __str__(self):
         return self.name
@@ -93,7 +93,7 @@ class Employee(models.Model):
         ).order_by('-created_at')
     
     # History tracking
-    history = HistoricalRecords()
+    history = BatchedHistoricalRecords()
 
     class Meta:
         ordering = ['employee_id']
@@ -186,7 +186,7 @@ class PerformanceReview(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     # History tracking
-    history = HistoricalRecords()
+    history = BatchedHistoricalRecords()
     
     def __str__(self):
         return f"{self.employee.full_name} - {self.get_review_type_display()} ({self.review_date})"
@@ -313,7 +313,7 @@ class PerformanceGoal(models.Model):
         super().save(*args, **kwargs)
     
     # History tracking
-    history = HistoricalRecords()
+    history = BatchedHistoricalRecords()
     
     class Meta:
         ordering = ['-created_at']
@@ -360,7 +360,7 @@ class PerformanceNote(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     # History tracking
-    history = HistoricalRecords()
+    history = BatchedHistoricalRecords()
     
     def __str__(self):
         return f"{self.employee.full_name} - {self.title} ({self.get_note_type_display()})"
@@ -369,6 +369,24 @@ class PerformanceNote(models.Model):
         ordering = ['-date_observed']
 
 
+class IdentifierSequence(models.Model):
+    """Counter behind human-readable identifiers such as EMP0001 or LR2025000001"""
+    
+    prefix = models.CharField(max_length=20)
+    period = models.CharField(
+        max_length=10, blank=True,
+        help_text="Numbering restarts for each period, e.g. a year"
+    )
+    last_value = models.BigIntegerField(default=0, help_text="Highest number handed out")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.prefix}{self.period}: {self.last_value}"
+
+    class Meta:
+        unique_together = ['prefix', 'period']
+
+
 # Django Signals for auto-creating Employee profiles
 from django.db.models.signals import post_save
 from django.dispatch import receiver
@@ -382,18 +400,10 @@ def create_employee_profile(sender, instance, created, **kwargs):
     """
     if created:
         # Generate next employee ID
-        last_employee = Employee.objects.order_by('employee_id').last()
-        if last_employee and last_employee.employee_id:
-            # Extract number from format EMP0001 and increment
-            try:
-                last_num = int(last_employee.employee_id[3:])
-                next_num = last_num + 1
-            except (ValueError, IndexError):
-                next_num = 1
-        else:
-            next_num = 1
-        
-        new_employee_id = f"EMP{next_num:04d}"
+        from .sequences import next_identifier
+        new_employee_id = next_identifier(
+            'EMP', queryset=Employee.objects.all(), field='employee_id'
+        )
         
         # Get or create a default department
         default_department, _ = Department.objects.get_or_create(
@@ -0,0 +1,109 @@
+"""
+Allocation of human-readable identifiers from a sequence table.
+
+Each (prefix, period) pair, e.g. ('LR', '2025'), has an ``IdentifierSequence``
+row. Numbers are reserved by locking that row and moving ``last_value``
+forward, so concurrent workers never receive the same number. In autocommit
+mode a worker reserves a block of numbers at a time and hands them out from
+memory, which makes most allocations free of queries. Inside a transaction
+only the numbers actually needed are reserved, because a rollback would
+return the reserved range to the table. Numbers left in a cached block when
+a worker exits are skipped, so identifiers may have gaps.
+
+When a sequence row is first created it is seeded from the highest number
+already used by existing records, so switching an identifier over to the
+allocator does not reissue old numbers.
+"""
+import threading
+
+from django.db import IntegrityError, transaction
+
+from .models import IdentifierSequence
+
+# Numbers reserved per round trip when a worker caches a block
+DEFAULT_BLOCK_SIZE = 50
+
+# Cached blocks keyed by (prefix, period): [next number, last reserved number]
+_blocks = {}
+_blocks_lock = threading.Lock()
+
+
+def highest_number(queryset, field, prefix):
+    """Return the largest number following ``prefix`` in a field, or 0"""
+    highest = 0
+    values = queryset.filter(
+        **{f'{field}__startswith': prefix}
+    ).values_list(field, flat=True).iterator()
+    for value in values:
+        suffix = value[len(prefix):]
+        if suffix.isdigit():
+            highest = max(highest, int(suffix))
+    return highest
+
+
+def allocate(prefix, period='', count=1, seed=None):
+    """
+    Reserve ``count`` consecutive numbers and return the first one.
+
+    ``seed`` is called to find the starting value only when the sequence row
+    does not exist yet.
+    """
+    with transaction.atomic():
+        sequence = IdentifierSequence.objects.select_for_update().filter(
+            prefix=prefix, period=period
+        ).first()
+        if sequence is None:
+            try:
+                with transaction.atomic():
+                    sequence = IdentifierSequence.objects.create(
+                        prefix=prefix, period=period,
+                        last_value=seed() if seed else 0
+                    )
+            except IntegrityError:
+                # Another worker created it first
+                sequence = IdentifierSequence.objects.select_for_update().get(
+                    prefix=prefix, period=period
+                )
+
+        first = sequence.last_value + 1
+        sequence.last_value += count
+        sequence.save(update_fields=['last_value', 'updated_at'])
+    return first
+
+
+def next_number(prefix, period='', seed=None, block_size=DEFAULT_BLOCK_SIZE):
+    """Return the next number of a sequence, from this worker's block when possible"""
+    if transaction.get_connection().in_atomic_block:
+        return allocate(prefix, period, seed=seed)
+
+    key = (prefix, period)
+    with _blocks_lock:
+        block = _blocks.get(key)
+        if block is None or block[0] > block[1]:
+            first = allocate(prefix, period, count=block_size, seed=seed)
+            block = _blocks[key] = [first, first + block_size - 1]
+        number = block[0]
+        block[0] += 1
+    return number
+
+
+def next_identifier(prefix, period='', width=4, queryset=None, field=None,
+                    block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Return the next formatted identifier, e.g. ``EMP0042`` or ``LR2025000001``.
+
+    ``queryset`` and ``field`` point at existing identifiers and are used to
+    seed a new sequence.
+    """
+    seed = None
+    if queryset is not None:
+        def seed():
+            return highest_number(queryset, field, f'{prefix}{period}')
+    number = next_number(prefix, period, seed=seed, block_size=block_size)
+    return f'{prefix}{period}{number:0{width}d}'
+
+
+def clear_block_cache():
+    """Forget the blocks cached by this worker"""
+    with _blocks_lock:
+        _blocks.clear()
@@ -1,9 +1,14 @@
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
+from django.contrib.auth import get_user_model
 from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework.test import APITestCase
 from rest_framework import status
-from .models import Department, Employee
+from .models import Department, Employee, IdentifierSequence
+from .history import batched_history, update_with_history
+from .sequences import allocate, clear_block_cache, next_identifier, next_number
 
 
 class DepartmentModelTest(TestCase):
@@ -139,3 +144,118 @@ class DepartmentAPITest(APITestCase):
         response = self.client.post(url, data)
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(Department.objects.count(), 2)
+
+
+class IdentifierSequenceTest(TestCase):
+    """Test cases for the identifier sequence allocator"""
+
+    def setUp(self):
+        clear_block_cache()
+
+    def test_allocate_reserves_consecutive_blocks(self):
+        """Test blocks never overlap"""
+        first = allocate('TST', '2025', count=10)
+        second = allocate('TST', '2025', count=5)
+        other_period = allocate('TST', '2026')
+
+        self.assertEqual(first, 1)
+        self.assertEqual(second, 11)
+        self.assertEqual(other_period, 1)
+        self.assertEqual(
+            IdentifierSequence.objects.get(prefix='TST', period='2025').last_value, 15
+        )
+
+    def test_new_sequence_is_seeded_from_existing_identifiers(self):
+        """Test numbering continues after identifiers created before the sequence"""
+        UserModel = get_user_model()
+        for employee_id in ['EMP0007', 'EMP12000', 'EMPX']:
+            user = UserModel.objects.create_user(
+                username=employee_id, email=f'{employee_id}@example.com'
+            )
+            Employee.objects.filter(user=user).update(employee_id=employee_id)
+        # Pretend these were created before the sequence existed
+        IdentifierSequence.objects.filter(prefix='EMP').delete()
+
+        self.assertEqual(
+            next_identifier('EMP', queryset=Employee.objects.all(), field='employee_id'),
+            'EMP12001'
+        )
+
+    def test_user_signal_uses_sequence(self):
+        """Test employee profiles get consecutive IDs"""
+        UserModel = get_user_model()
+        first = UserModel.objects.create_user(username='seq1', email='seq1@example.com')
+        second = UserModel.objects.create_user(username='seq2', email='seq2@example.com')
+
+        first_number = int(first.employee_profile.employee_id[3:])
+        self.assertEqual(second.employee_profile.employee_id, f'EMP{first_number + 1:04d}')
+
+
+class IdentifierBlockCacheTest(TransactionTestCase):
+    """Test cases for per-worker identifier blocks"""
+
+    def setUp(self):
+        clear_block_cache()
+
+    def tearDown(self):
+        clear_block_cache()
+
+    def test_block_is_served_from_memory(self):
+        """Test only the first number of a block costs queries"""
+        first = next_number('BLK', block_size=3)
+        with self.assertNumQueries(0):
+            numbers = [next_number('BLK', block_size=3) for _ in range(2)]
+        fourth = next_number('BLK', block_size=3)
+
+        self.assertEqual([first] + numbers + [fourth], [1, 2, 3, 4])
+        self.assertEqual(IdentifierSequence.objects.get(prefix='BLK').last_value, 6)
+
+
+class BatchedHistoryTest(TestCase):
+    """Test cases for bulk-aware history writing"""
+
+    def test_batched_history_writes_every_record_in_one_insert(self):
+        """Test history rows are collected and bulk inserted on exit"""
+        with CaptureQueriesContext(connection) as queries:
+            with batched_history():
+                departments = [
+                    Department.objects.create(name=f"Batched {index}") for index in range(5)
+                ]
+                departments[0].description = "Updated"
+                departments[0].save()
+                self.assertEqual(Department.history.count(), 0)
+
+        history_inserts = [
+            query for query in queries
+            if query['sql'].startswith('INSERT INTO "employees_historicaldepartment"')
+        ]
+        self.assertEqual(len(history_inserts), 1)
+        self.assertEqual(Department.history.count(), 6)
+        self.assertEqual(
+            list(departments[0].history.values_list('history_type', flat=True)),
+            ['~', '+']
+        )
+
+    def test_batched_history_discards_records_on_error(self):
+        """Test nothing is written when the block fails"""
+        with self.assertRaises(ValueError):
+            with batched_history():
+                Department.objects.create(name="Rolled back")
+                raise ValueError
+
+        self.assertFalse(Department.objects.filter(name="Rolled back").exists())
+        self.assertEqual(Department.history.count(), 0)
+
+    def test_update_with_history(self):
+        """Test queryset updates record a history row per object"""
+        for index in range(3):
+            Department.objects.create(name=f"Update {index}")
+
+        updated = update_with_history(
+            Department.objects.filter(name__startswith="Update"), description="Bulk"
+        )
+
+        self.assertEqual(updated, 3)
+        changes = Department.history.filter(history_type='~')
+        self.assertEqual(changes.count(), 3)
+        self.assertTrue(all(change.description == "Bulk" for change in changes))
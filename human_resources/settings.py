@@ -100,6 +100,18 @@ DATABASES = {
     }
 }
 
+# Cache shared by every worker process. Cached payroll configuration, tax
+# tables, salary timelines and analytics are invalidated through version
+# stamps kept here, so a per-process cache such as LocMemCache would leave
+# the other workers with stale copies. The database cache table is created
+# by migrate; point CACHE_BACKEND at Redis or Memcached to use those instead.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'django_cache'),
+    }
+}
+
 
 # Custom User Model
 AUTH_USER_MODEL = 'authentication.User'
@@ -3,6 +3,7 @@ from django.utils.html import format_html
 from django.utils import timezone
 from django.db.models import Sum, Count
 from simple_history.admin import SimpleHistoryAdmin
+from employees.history import batched_history
 from .models import (
     LeaveType, 
     Holiday, 
@@ -141,12 +142,14 @@ class LeaveRequestAdmin(SimpleHistoryAdmin):
     def approve_requests(self, request, queryset):
         """Bulk approve leave requests"""
         updated = 0
-        for leave_request in queryset.filter(status='pending'):
-            leave_request.status = 'approved'
-            leave_request.approved_by = request.user.employee_profile
-            leave_request.approved_at = timezone.now()
-            leave_request.save()
-            updated += 1
+        # History rows of every request are written in one insert at the end
+        with batched_history():
+            for leave_request in queryset.filter(status='pending'):
+                leave_request.status = 'approved'
+                leave_request.approved_by = request.user.employee_profile
+                leave_request.approved_at = timezone.now()
+                leave_request.save()
+                updated += 1
         
         self.message_user(request, f'{updated} leave requests approved.')
     approve_requests.short_description = "Approve selected leave requests"
@@ -154,11 +157,12 @@ class LeaveRequestAdmin(SimpleHistoryAdmin):
     def reject_requests(self, request, queryset):
         """Bulk reject leave requests"""
         updated = 0
-        for leave_request in queryset.filter(status='pending'):
-            leave_request.status = 'rejected'
-            leave_request.rejection_reason = 'Bulk rejection from admin'
-            leave_request.save()
-            updated += 1
+        with batched_history():
+            for leave_request in queryset.filter(status='pending'):
+                leave_request.status = 'rejected'
+                leave_request.rejection_reason = 'Bulk rejection from admin'
+                leave_request.save()
+                updated += 1
         
         self.message_user(request, f'{updated} leave requests rejected.')
     reject_requests.short_description = "Reject selected leave requests"
@@ -5,7 +5,8 @@ from django.utils import timezone
 from django.core.exceptions import ValidationError
 from datetime import date, timedelta
 from decimal import Decimal
-from simple_history.models import HistoricalRecords
+from employees.history import BatchedHistoricalRecords
+from employees.sequences import next_identifier
 
 User = get_user_model()
 
@@ -67,7 +68,7 @@ class LeaveType(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     # History tracking
-    history = HistoricalRecords()
+    history = BatchedHistoricalRecords()
 
     def __str__(self):
         return self.name
@@ -115,7 +116,7 @@ class Holiday(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     # History tracking
-    history = HistoricalRecords()
+    history = BatchedHistoricalRecords()
 
     def __str__(self):
         return f"{self.name} ({self.date})"
@@ -171,7 +172,7 @@ class LeaveBalance(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     # History tracking
-    history = HistoricalRecords()
+    history = BatchedHistoricalRecords()
 
     @property
     def available_days(self):
@@ -274,7 +275,7 @@ class LeaveRequest(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     # History tracking
-    history = HistoricalRecords()
+    history = BatchedHistoricalRecords()
 
     def save(self, *args, **kwargs):
         # Generate request ID if not set
@@ -294,10 +295,10 @@ class LeaveRequest(models.Model):
     def _generate_request_id(self):
         """Generate unique request ID"""
         year = timezone.now().year
-        count = LeaveRequest.objects.filter(
-            created_at__year=year
-        ).count() + 1
-        return f"LR{year}{count:06d}"
+        return next_identifier(
+            'LR', str(year), width=6,
+            queryset=LeaveRequest.objects.all(), field='request_id'
+        )
 
     def _calculate_total_days(self):
         """Calculate total leave days based on dates and duration type"""
@@ -404,7 +405,7 @@ class LeaveRequestComment(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     # History tracking
-    history = HistoricalRecords()
+    history = BatchedHistoricalRecords()
 
     def __str__(self):
         return f"Comment on {self.leave_request.request_id} by {self.commented_by}"
@@ -448,7 +449,7 @@ class TeamSchedule(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     # History tracking
-    history = HistoricalRecords()
+    history = BatchedHistoricalRecords()
 
     @property
     def leave_percentage(self):
@@ -517,7 +518,7 @@ class LeavePolicy(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     # History tracking
-    history = HistoricalRecords()
+    history = BatchedHistoricalRecords()
 
     def __str__(self):
         return self.name
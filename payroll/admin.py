@@ -33,17 +33,21 @@ class PayrollConfigurationAdmin(admin.ModelAdmin):
 class PayrollPeriodAdmin(admin.ModelAdmin):
     list_display = ['name', 'start_date', 'end_date', 'status', 'total_employees', 'total_amount', 'created_at']
     list_filter = ['status', 'start_date', 'created_at']
-    search_fields = ['name', 'description']
-    readonly_fields = ['created_at', 'updated_at']
+    search_fields = ['name']
+    readonly_fields = PayrollPeriod.MAINTAINED_TOTAL_FIELDS + ['created_at', 'updated_at']
     date_hierarchy = 'start_date'
     
     fieldsets = (
         ('Period Information', {
-            'fields': ('name', 'description', 'start_date', 'end_date')
+            'fields': ('name', 'start_date', 'end_date', 'pay_date', 'frequency')
         }),
         ('Status', {
             'fields': ('status',)
         }),
+        ('Totals', {
+            'fields': tuple(PayrollPeriod.MAINTAINED_TOTAL_FIELDS),
+            'classes': ('collapse',)
+        }),
         ('Metadata', {
             'fields': ('created_at', 'updated_at'),
             'classes': ('collapse',)
@@ -51,12 +55,11 @@ class PayrollPeriodAdmin(admin.ModelAdmin):
     )
     
     def total_employees(self, obj):
-        return obj.payslips.count()
+        return obj.total_employees
     total_employees.short_description = 'Total Employees'
     
     def total_amount(self, obj):
-        total = obj.payslips.aggregate(total=models.Sum('net_salary'))['total'] or 0
-        return f"${total:,.2f}"
+        return f"${obj.total_net_amount:,.2f}"
     total_amount.short_description = 'Total Net Amount'
 
 
@@ -141,8 +144,8 @@ class PayslipAdmin(admin.ModelAdmin):
         'employee__employee_id'
     ]
     readonly_fields = [
-        'payslip_number', 'total_deductions', 'total_bonuses', 
-        'created_at', 'updated_at'
+        'payslip_number', 'daily_salary', 'overtime_pay', 'leave_deduction',
+        'total_deductions', 'total_bonuses', 'created_at', 'updated_at'
     ]
     date_hierarchy = 'created_at'
     inlines = [PayslipDeductionInline, PayslipBonusInline]
@@ -153,14 +156,14 @@ class PayslipAdmin(admin.ModelAdmin):
         }),
         ('Salary Information', {
             'fields': (
-                'base_salary', 'overtime_hours', 'overtime_amount',
+                'base_salary', 'daily_salary', 'overtime_hours', 'overtime_pay',
                 'gross_salary', 'net_salary'
             )
         }),
         ('Calculations', {
             'fields': (
                 'total_deductions', 'total_bonuses', 'tax_amount', 
-                'unpaid_leave_days'
+                'unpaid_leave_days', 'leave_deduction'
             )
         }),
         ('Payment', {
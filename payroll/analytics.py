@@ -0,0 +1,85 @@
+"""
+Cached payroll analytics responses.
+
+Analytics payloads are built once and stored in Django's cache under a key
+that includes a version stamp for their scope: the dashboard, or one payroll
+period. Writes to payslips, periods and employees bump the affected version
+stamps, so the next request rebuilds the payload instead of serving a stale
+one. Each payload carries an ETag computed from its content, which lets
+clients revalidate with ``If-None-Match`` and get a 304 when nothing changed.
+"""
+import hashlib
+import json
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.utils.encoders import JSONEncoder
+
+DASHBOARD_SCOPE = 'dashboard'
+
+# Seconds a payload is kept; finalized periods no longer change
+ANALYTICS_CACHE_TIMEOUT = 300
+FINALIZED_PERIOD_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def period_scope(period_id):
+    """Cache scope of the analytics of one payroll period"""
+    return f'period:{period_id}'
+
+
+def period_cache_timeout(payroll_period):
+    """Seconds the analytics of a payroll period may be cached"""
+    if payroll_period.status == 'finalized':
+        return FINALIZED_PERIOD_CACHE_TIMEOUT
+    return ANALYTICS_CACHE_TIMEOUT
+
+
+def _version_key(scope):
+    return f'payroll:analytics:{scope}:version'
+
+
+def _scope_version(scope):
+    version = cache.get(_version_key(scope))
+    if version is None:
+        cache.add(_version_key(scope), uuid.uuid4().hex, None)
+        version = cache.get(_version_key(scope))
+    return version
+
+
+def cached_analytics(scope, name, build, timeout=ANALYTICS_CACHE_TIMEOUT):
+    """
+    Return ``(data, etag)`` for an analytics payload, building it on a miss.
+
+    ``name`` identifies the payload within its scope and ``build`` returns
+    the payload. The data is stored in its JSON form so a cached response
+    renders exactly like a freshly built one.
+    """
+    key = f'payroll:analytics:{scope}:{_scope_version(scope)}:{name}'
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    content = json.dumps(build(), cls=JSONEncoder, sort_keys=True)
+    etag = '"%s"' % hashlib.md5(content.encode()).hexdigest()
+    cached = (json.loads(content), etag)
+    cache.set(key, cached, timeout)
+    return cached
+
+
+def _bump_versions(scopes):
+    cache.set_many({_version_key(scope): uuid.uuid4().hex for scope in scopes}, None)
+
+
+def invalidate_analytics(*scopes):
+    """Make cached payloads of the given scopes stale"""
+    _bump_versions(scopes)
+    # Bump again once committed so no request caches data read before it
+    transaction.on_commit(lambda: _bump_versions(scopes))
+
+
+def invalidate_period_analytics(period_ids):
+    """Make the dashboard and the analytics of the given periods stale"""
+    invalidate_analytics(
+        DASHBOARD_SCOPE, *(period_scope(period_id) for period_id in period_ids)
+    )
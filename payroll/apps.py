@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class PayrollConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'payroll'
+
+    def ready(self):
+        """Import signal handlers when app is ready."""
+        import payroll.signals
@@ -0,0 +1,205 @@
+"""
+Payroll performance benchmarks.
+
+``run_benchmarks`` seeds employees, tax brackets and mandatory deductions
+with bulk inserts, then drives the payroll API through the test client and
+records wall time, query count and peak traced memory for each scenario.
+A scenario whose request fails raises ``BenchmarkError``, since its
+numbers would not measure the work. ``compare_results`` checks a run against a stored baseline. The
+``benchmark_payroll`` command runs the suite against a throwaway database.
+"""
+import platform
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import date
+from decimal import Decimal
+
+import django
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from employees.models import Department, Employee
+from .models import DeductionType, PayrollConfiguration, PayrollPeriod, TaxBracket
+
+User = get_user_model()
+
+SEED_BATCH_SIZE = 1000
+DEPARTMENT_COUNT = 10
+
+# Metrics compared against the baseline
+METRICS = ['seconds', 'queries', 'peak_memory_kb']
+
+# Timing differences below this many seconds are treated as noise
+MIN_SECONDS_REGRESSION = 0.05
+
+
+class BenchmarkError(RuntimeError):
+    """A benchmark scenario did not succeed"""
+
+
+def check_response(scenario, response):
+    """Raise ``BenchmarkError`` unless a scenario request succeeded"""
+    if not 200 <= response.status_code < 300:
+        raise BenchmarkError(
+            f'{scenario} returned {response.status_code}: {getattr(response, "data", "")}'
+        )
+
+
+@contextmanager
+def measure(results, name, calls=1):
+    """Record wall time, query count and peak traced memory of a block"""
+    queries = [0]
+
+    def count_queries(execute, sql, params, many, context):
+        queries[0] += 1
+        return execute(sql, params, many, context)
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        with connection.execute_wrapper(count_queries):
+            yield
+    finally:
+        seconds = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    results[name] = {
+        'seconds': round(seconds, 4),
+        'queries': queries[0],
+        'peak_memory_kb': peak // 1024,
+        'calls': calls,
+    }
+
+
+def seed_benchmark_data(employee_count, batch_size=SEED_BATCH_SIZE):
+    """Bulk insert employees, payroll rules and a period to run payroll for"""
+    departments = Department.objects.bulk_create([
+        Department(name=f'Benchmark {index}') for index in range(DEPARTMENT_COUNT)
+    ])
+
+    # bulk_create skips the signal that creates employee profiles
+    password = make_password(None)
+    users = User.objects.bulk_create([
+        User(
+            username=f'bench{index}', email=f'bench{index}@example.com',
+            first_name='Bench', last_name=f'Employee{index}', password=password
+        )
+        for index in range(employee_count)
+    ], batch_size=batch_size)
+    Employee.objects.bulk_create([
+        Employee(
+            user=user, employee_id=f'BENCH{index:07d}', first_name=user.first_name,
+            last_name=user.last_name, email=user.email,
+            department=departments[index % DEPARTMENT_COUNT], position='Analyst',
+            hire_date=date(2020, 1, 1), salary=Decimal(15000 + (index % 50) * 500)
+        )
+        for index, user in enumerate(users)
+    ], batch_size=batch_size)
+
+    year = timezone.now().year
+    PayrollConfiguration.objects.create(tax_year=year)
+    TaxBracket.objects.bulk_create([
+        TaxBracket(name='Benchmark 1', year=year, min_amount=Decimal('0'),
+                   max_amount=Decimal('10000'), tax_rate=Decimal('0.10')),
+        TaxBracket(name='Benchmark 2', year=year, min_amount=Decimal('10000'),
+                   max_amount=Decimal('30000'), tax_rate=Decimal('0.20')),
+        TaxBracket(name='Benchmark 3', year=year, min_amount=Decimal('30000'),
+                   tax_rate=Decimal('0.30')),
+    ])
+    DeductionType.objects.bulk_create([
+        DeductionType(name='Benchmark Social Security', calculation_method='percentage',
+                      default_amount=Decimal('0.0625'), is_mandatory=True),
+        DeductionType(name='Benchmark Union Fee', calculation_method='fixed',
+                      default_amount=Decimal('150'), is_mandatory=True),
+    ])
+    return PayrollPeriod.objects.create(
+        name='Benchmark', start_date=date(year, 1, 1), end_date=date(year, 1, 31),
+        pay_date=date(year, 2, 1)
+    )
+
+
+def run_benchmarks(employee_count, sample=50, batch_size=SEED_BATCH_SIZE):
+    """
+    Seed ``employee_count`` employees and time the payroll scenarios.
+
+    Runs against whatever database is active, so callers should point it at
+    a disposable one. Returns ``{'meta': ..., 'results': {scenario: metrics}}``.
+    """
+    cache.clear()
+    results = {}
+    with measure(results, 'seed'):
+        period = seed_benchmark_data(employee_count, batch_size)
+
+    admin = User.objects.create_user(
+        username='bench_admin', email='bench_admin@example.com', password=None
+    )
+    client = APIClient()
+    client.force_authenticate(user=admin)
+    period_url = f'/api/payroll/payroll-periods/{period.id}'
+
+    with measure(results, 'process_payroll'):
+        response = client.post(f'{period_url}/process_payroll/')
+    check_response('process_payroll', response)
+
+    payslip_ids = list(period.payslips.order_by('id').values_list('id', flat=True)[:sample])
+    with measure(results, 'calculate_payslip', calls=len(payslip_ids)):
+        for payslip_id in payslip_ids:
+            response = client.post(f'/api/payroll/payslips/{payslip_id}/calculate/')
+            check_response('calculate_payslip', response)
+
+    with measure(results, 'calculate_all'):
+        response = client.post(f'{period_url}/calculate_all/')
+    check_response('calculate_all', response)
+
+    with measure(results, 'summary'):
+        response = client.get(f'{period_url}/summary/')
+    check_response('summary', response)
+
+    with measure(results, 'payslip_list'):
+        response = client.get('/api/payroll/payslips/', {'payroll_period_id': period.id})
+    check_response('payslip_list', response)
+
+    return {
+        'meta': {
+            'employees': employee_count,
+            'sample': len(payslip_ids),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'timestamp': timezone.now().isoformat(),
+        },
+        'results': results,
+    }
+
+
+def baseline_key(run):
+    """Key of a run within a baseline file, e.g. ('sqlite', '1000')"""
+    return run['meta']['database'], str(run['meta']['employees'])
+
+
+def compare_results(results, baseline, threshold=0.2):
+    """
+    Compare scenario metrics with a baseline.
+
+    Returns a list of ``(scenario, metric, baseline_value, value)`` for every
+    metric that grew by more than ``threshold`` (a fraction).
+    """
+    regressions = []
+    for scenario, metrics in results.items():
+        expected = baseline.get(scenario)
+        if not expected:
+            continue
+        for metric in METRICS:
+            if metric not in expected:
+                continue
+            limit = expected[metric] * (1 + threshold)
+            if metric == 'seconds':
+                limit = max(limit, expected[metric] + MIN_SECONDS_REGRESSION)
+            if metrics[metric] > limit:
+                regressions.append((scenario, metric, expected[metric], metrics[metric]))
+    return regressions
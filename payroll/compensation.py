@@ -0,0 +1,208 @@
+"""
+Salary-as-of-date lookups over compensation history.
+
+``CompensationHistory`` rows are loaded once, grouped into a sorted timeline
+of effective dates per employee and cached per process, so the salary of an
+employee on any date is a bisect.
+
+The cached timelines carry a version number shared through Django's cache.
+Once a change to a compensation record commits, the next number of the
+``SALARY_TIMELINE`` sequence is taken and the employee is recorded under
+it, so every worker rebuilds only the timelines of the employees changed
+since its version. When those records have expired, or too many changes
+piled up, the whole table is rebuilt.
+
+Employees without any compensation history are paid their current
+``Employee.salary``.
+"""
+from bisect import bisect_right
+
+from django.core.cache import cache
+from django.db import transaction
+
+from employees.models import Employee, IdentifierSequence
+from employees.sequences import allocate
+from .models import CompensationHistory
+
+# One-time bonuses do not change the salary an employee is paid from
+NON_SALARY_CHANGE_TYPES = ['bonus']
+
+SALARY_TIMELINE_SEQUENCE = 'SALARY_TIMELINE'
+SALARY_TIMELINE_VERSION_CACHE_KEY = 'payroll:salary-timelines:version'
+SALARY_TIMELINE_CHANGE_CACHE_KEY = 'payroll:salary-timelines:change:{}'
+
+# Seconds a change record is kept for workers that are behind
+SALARY_TIMELINE_CHANGE_TIMEOUT = 24 * 60 * 60
+
+# Changes replayed one employee at a time before rebuilding everything
+MAX_REPLAYED_SALARY_CHANGES = 100
+
+# Process-local (version, {employee_id: SalaryTimeline}) pair
+_timelines = None
+
+# Employees whose records this worker changed and has not reloaded yet
+_stale_employees = set()
+
+
+class SalaryTimeline:
+    """Salary changes of one employee, sorted by effective date"""
+
+    def __init__(self, initial_salary=None):
+        self.initial_salary = initial_salary
+        self.dates = []
+        self.salaries = []
+
+    def append(self, effective_date, salary):
+        """Add a change; changes must be appended in effective date order"""
+        if self.dates and self.dates[-1] == effective_date:
+            # The latest change on a date replaces the earlier ones
+            self.salaries[-1] = salary
+        else:
+            self.dates.append(effective_date)
+            self.salaries.append(salary)
+
+    def salary_on(self, day):
+        """Return the salary in effect on a date, or None if it is not known"""
+        index = bisect_right(self.dates, day)
+        if index == 0:
+            return self.initial_salary
+        return self.salaries[index - 1]
+
+
+def build_salary_timelines(employee_ids=None):
+    """Build the salary timeline of every employee, or of some, with one query"""
+    timelines = {}
+    records = CompensationHistory.objects.exclude(
+        change_type__in=NON_SALARY_CHANGE_TYPES
+    )
+    if employee_ids is not None:
+        records = records.filter(employee_id__in=employee_ids)
+    records = records.order_by('employee_id', 'effective_date', 'created_at', 'id').values_list(
+        'employee_id', 'effective_date', 'previous_salary', 'new_salary'
+    )
+    for employee_id, effective_date, previous_salary, new_salary in records.iterator():
+        timeline = timelines.get(employee_id)
+        if timeline is None:
+            # The salary before the first recorded change is its previous salary
+            timeline = timelines[employee_id] = SalaryTimeline(previous_salary)
+        timeline.append(effective_date, new_salary)
+    return timelines
+
+
+def _shared_version():
+    version = cache.get(SALARY_TIMELINE_VERSION_CACHE_KEY)
+    if version is None:
+        # Lost from the cache: publish the last number handed out again
+        version = IdentifierSequence.objects.filter(
+            prefix=SALARY_TIMELINE_SEQUENCE, period=''
+        ).values_list('last_value', flat=True).first() or 0
+        cache.add(SALARY_TIMELINE_VERSION_CACHE_KEY, version, None)
+        version = cache.get(SALARY_TIMELINE_VERSION_CACHE_KEY)
+    return version
+
+
+def _changed_employees(since, version):
+    """Employees changed after version ``since``, or None if not all are known"""
+    if since is None or version is None or not 0 <= version - since <= MAX_REPLAYED_SALARY_CHANGES:
+        return None
+    keys = [SALARY_TIMELINE_CHANGE_CACHE_KEY.format(number) for number in range(since + 1, version + 1)]
+    changes = cache.get_many(keys)
+    if len(changes) != len(keys):
+        return None
+    return set(changes.values())
+
+
+def get_salary_timelines():
+    """Return the cached salary timelines, bringing them up to date if needed"""
+    global _timelines
+    version = _shared_version()
+    cached = _timelines
+    if cached is not None and cached[0] == version and not _stale_employees:
+        return cached[1]
+
+    changed = _changed_employees(cached[0], version) if cached is not None else None
+    if changed is None:
+        timelines = build_salary_timelines()
+    else:
+        changed |= _stale_employees
+        timelines = {
+            employee_id: timeline for employee_id, timeline in cached[1].items()
+            if employee_id not in changed
+        }
+        timelines.update(build_salary_timelines(changed))
+    _stale_employees.clear()
+    _timelines = (version, timelines)
+    return timelines
+
+
+def salary_as_of(employee_id, day):
+    """Return an employee's salary on a date, or None if it is not known"""
+    timeline = get_salary_timelines().get(employee_id)
+    if timeline is None:
+        return Employee.objects.filter(pk=employee_id).values_list('salary', flat=True).first()
+    return timeline.salary_on(day)
+
+
+def salaries_as_of(day, employee_ids=None):
+    """
+    Return ``{employee_id: salary}`` for a date.
+
+    Employees whose salary on that date is not known are left out.
+    """
+    timelines = get_salary_timelines()
+    employees = Employee.objects.filter(salary__isnull=False)
+    if employee_ids is not None:
+        employees = employees.filter(pk__in=employee_ids)
+        timelines = {
+            employee_id: timelines[employee_id]
+            for employee_id in employee_ids if employee_id in timelines
+        }
+
+    salaries = {}
+    for employee_id, timeline in timelines.items():
+        salary = timeline.salary_on(day)
+        if salary is not None:
+            salaries[employee_id] = salary
+    # Without compensation history the current salary is the only one known
+    for employee_id, salary in employees.values_list('id', 'salary'):
+        if employee_id not in timelines:
+            salaries[employee_id] = salary
+    return salaries
+
+
+def forget_salary_timeline(employee_id):
+    """Reload one employee's timeline in this worker on its next lookup"""
+    _stale_employees.add(employee_id)
+
+
+def _publish_version(employee_id=None):
+    with transaction.atomic():
+        # The sequence row stays locked until this block ends, so versions
+        # reach the cache in the order they were handed out
+        version = allocate(SALARY_TIMELINE_SEQUENCE)
+        if employee_id is not None:
+            cache.set(
+                SALARY_TIMELINE_CHANGE_CACHE_KEY.format(version), employee_id,
+                SALARY_TIMELINE_CHANGE_TIMEOUT
+            )
+        cache.set(SALARY_TIMELINE_VERSION_CACHE_KEY, version, None)
+
+
+def invalidate_salary_timeline(employee_id):
+    """
+    Rebuild one employee's timeline in this and every other worker.
+
+    Call it once the change has committed: a version taken inside a
+    transaction that rolls back would be handed out again.
+    """
+    forget_salary_timeline(employee_id)
+    _publish_version(employee_id)
+
+
+def clear_salary_timeline_cache():
+    """Drop the cached salary timelines and make every worker rebuild them"""
+    global _timelines
+    _timelines = None
+    _stale_employees.clear()
+    # A version without a change record cannot be replayed
+    _publish_version()
@@ -0,0 +1,142 @@
+"""
+Streaming payroll exports.
+
+Rows are read with ``values()`` and a chunked ``iterator()`` and encoded one
+at a time, so exporting a period uses the same memory for any headcount and
+the first bytes are sent before the whole period has been read.
+"""
+import csv
+from decimal import Decimal
+
+from django.db.models import Max, Min, Sum
+
+# Rows fetched from the database per round trip
+EXPORT_CHUNK_SIZE = 2000
+
+# (header, values() lookup) for every exported column
+EXPORT_COLUMNS = [
+    ('payslip_number', 'payslip_number'),
+    ('status', 'status'),
+    ('employee_id', 'employee__employee_id'),
+    ('first_name', 'employee__first_name'),
+    ('last_name', 'employee__last_name'),
+    ('department', 'employee__department__name'),
+    ('base_salary', 'base_salary'),
+    ('overtime_pay', 'overtime_pay'),
+    ('leave_deduction', 'leave_deduction'),
+    ('gross_salary', 'gross_salary'),
+    ('total_bonuses', 'total_bonuses'),
+    ('total_deductions', 'total_deductions'),
+    ('tax_amount', 'tax_amount'),
+    ('net_salary', 'net_salary'),
+    ('payment_method', 'payment_method'),
+    ('payment_reference', 'payment_reference'),
+    ('payment_date', 'payment_date'),
+]
+
+# Width of a payslip's net amount in a detail record
+BANK_FILE_AMOUNT_WIDTH = 15
+
+# Fixed-width bank transfer detail record: (values() lookup, width, numeric)
+BANK_FILE_FIELDS = [
+    ('payslip_number', 20, False),
+    ('employee__employee_id', 20, False),
+    ('employee__last_name', 30, False),
+    ('employee__first_name', 30, False),
+    ('employee__department__name', 30, False),
+    ('payment_method', 15, False),
+    ('net_salary', BANK_FILE_AMOUNT_WIDTH, True),
+]
+
+# Width of the total net amount in the trailer record
+BANK_FILE_TOTAL_WIDTH = 18
+
+# Payslip statuses that may be sent to the bank, the first being the default
+BANK_FILE_STATUSES = ['approved', 'paid']
+
+
+class BankFileError(ValueError):
+    """The payslips cannot be written to a bank transfer file"""
+
+
+class Echo:
+    """File-like object that hands back what is written, for csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+def export_rows(payslips, lookups):
+    """Yield export rows as tuples without loading the whole queryset"""
+    return payslips.order_by('employee__employee_id', 'id').values_list(
+        *lookups
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def stream_csv(payslips):
+    """Yield the payslips of a period as CSV lines"""
+    writer = csv.writer(Echo())
+    yield writer.writerow([header for header, _ in EXPORT_COLUMNS])
+    for row in export_rows(payslips, [lookup for _, lookup in EXPORT_COLUMNS]):
+        yield writer.writerow(row)
+
+
+def _fixed_width(value, width, numeric=False):
+    if numeric:
+        # Amounts are written in cents, zero padded
+        cents = int((Decimal(value or 0) * 100).to_integral_value())
+        if cents < 0:
+            raise BankFileError(f'Negative amount {value} cannot be written to a bank file')
+        if len(str(cents)) > width:
+            raise BankFileError(f'Amount {value} does not fit in {width} digits')
+        return str(cents).rjust(width, '0')
+    return str(value or '').upper()[:width].ljust(width)
+
+
+def check_bank_file(payslips):
+    """
+    Raise ``BankFileError`` if any net amount, or their total, cannot be written.
+
+    Runs one aggregate query, so a bad amount is reported before any of the
+    file has been streamed.
+    """
+    amounts = payslips.aggregate(
+        lowest=Min('net_salary'), highest=Max('net_salary'), total=Sum('net_salary')
+    )
+    for amount, width in [
+        (amounts['lowest'], BANK_FILE_AMOUNT_WIDTH),
+        (amounts['highest'], BANK_FILE_AMOUNT_WIDTH),
+        (amounts['total'], BANK_FILE_TOTAL_WIDTH),
+    ]:
+        _fixed_width(amount, width, numeric=True)
+
+
+def stream_bank_file(payroll_period, payslips):
+    """
+    Yield a fixed-width bank transfer file for the payslips of a period.
+
+    The file has a header record (``H``), one detail record (``D``) per
+    payslip and a trailer record (``T``) with the record count and the total
+    net amount in cents.
+    """
+    yield (
+        'H'
+        + _fixed_width(payroll_period.name, 40)
+        + payroll_period.pay_date.strftime('%Y%m%d')
+        + '\r\n'
+    )
+
+    count = 0
+    total = Decimal('0')
+    for row in export_rows(payslips, [lookup for lookup, _, _ in BANK_FILE_FIELDS]):
+        count += 1
+        total += row[-1] or Decimal('0')
+        yield 'D' + ''.join(
+            _fixed_width(value, width, numeric)
+            for value, (_, width, numeric) in zip(row, BANK_FILE_FIELDS)
+        ) + '\r\n'
+
+    yield (
+        'T' + str(count).rjust(10, '0')
+        + _fixed_width(total, BANK_FILE_TOTAL_WIDTH, numeric=True) + '\r\n'
+    )
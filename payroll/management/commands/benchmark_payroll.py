@@ -0,0 +1,120 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from payroll.benchmarks import BenchmarkError, baseline_key, compare_results, run_benchmarks
+
+DEFAULT_BASELINE = Path(__file__).resolve().parents[2] / 'benchmark_baseline.json'
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark payroll processing, calculation, summaries and listings against a '
+        'throwaway test database and compare the results with a stored baseline'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--employees',
+            type=int,
+            action='append',
+            help='Number of employees to seed; repeat for several sizes (default 1000)',
+        )
+        parser.add_argument(
+            '--sample',
+            type=int,
+            default=50,
+            help='Payslips calculated one at a time through the API (default 50)',
+        )
+        parser.add_argument(
+            '--output',
+            help='Write the results as JSON to this file',
+        )
+        parser.add_argument(
+            '--baseline',
+            default=str(DEFAULT_BASELINE),
+            help='Baseline JSON file (default payroll/benchmark_baseline.json)',
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=0.2,
+            help='Allowed growth over the baseline as a fraction (default 0.2)',
+        )
+        parser.add_argument(
+            '--update-baseline',
+            action='store_true',
+            help='Store these results as the new baseline instead of comparing',
+        )
+
+    def handle(self, *args, **options):
+        sizes = options['employees'] or [1000]
+        if any(size < 1 for size in sizes) or options['sample'] < 0:
+            raise CommandError('--employees must be positive and --sample cannot be negative')
+
+        runs = []
+        for size in sizes:
+            self.stdout.write(f'Benchmarking {size} employees on {connection.vendor}...')
+            runs.append(self._run_isolated(size, options['sample']))
+
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(runs, indent=2))
+
+        baseline_path = Path(options['baseline'])
+        baseline = {}
+        if baseline_path.exists():
+            try:
+                baseline = json.loads(baseline_path.read_text())
+            except ValueError as e:
+                raise CommandError(f'Could not read baseline: {e}')
+
+        if options['update_baseline']:
+            for run in runs:
+                database, size = baseline_key(run)
+                baseline.setdefault(database, {})[size] = run['results']
+            baseline_path.write_text(json.dumps(baseline, indent=2, sort_keys=True) + '\n')
+            self.stdout.write(self.style.SUCCESS(f'Baseline written to {baseline_path}'))
+            return
+
+        regressions = []
+        for run in runs:
+            database, size = baseline_key(run)
+            self._report(run)
+            expected = baseline.get(database, {}).get(size)
+            if expected is None:
+                self.stdout.write(self.style.WARNING(f'No baseline for {size} employees on {database}'))
+                continue
+            for scenario, metric, before, after in compare_results(
+                run['results'], expected, options['threshold']
+            ):
+                regressions.append(f'{size} employees: {scenario} {metric} {before} -> {after}')
+
+        if regressions:
+            for regression in regressions:
+                self.stdout.write(self.style.ERROR(regression))
+            raise CommandError(f'{len(regressions)} benchmark regressions')
+        self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
+
+    def _run_isolated(self, size, sample):
+        """Run the suite in a freshly migrated test database that is dropped afterwards"""
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            return run_benchmarks(size, sample=sample)
+        except BenchmarkError as e:
+            raise CommandError(f'Benchmark failed: {e}')
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def _report(self, run):
+        self.stdout.write(f"{'Scenario':<20}{'Seconds':>10}{'Queries':>10}{'Peak KB':>12}")
+        for scenario, metrics in run['results'].items():
+            self.stdout.write(
+                f"{scenario:<20}{metrics['seconds']:>10.3f}{metrics['queries']:>10}"
+                f"{metrics['peak_memory_kb']:>12}"
+            )
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from payroll.models import PayrollPeriod
+from payroll.rollups import refresh_department_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute the department payroll rollups of payroll periods from payslips'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'period_ids',
+            nargs='*',
+            type=int,
+            help='Payroll periods to rebuild (all periods when omitted)',
+        )
+        parser.add_argument(
+            '--stale',
+            action='store_true',
+            help='Only rebuild periods whose payslips changed since their last refresh',
+        )
+
+    def handle(self, *args, **options):
+        periods = PayrollPeriod.objects.all()
+        if options['period_ids']:
+            periods = periods.filter(pk__in=options['period_ids'])
+        if options['stale']:
+            periods = periods.filter(rollup_stale=True)
+
+        rebuilt = refresh_department_rollups(periods)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt department rollups for {rebuilt} payroll periods'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from payroll.models import PayrollPeriod
+from payroll.totals import rebuild_period_totals
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored payroll period totals and payslip status counts from payslips'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'period_ids',
+            nargs='*',
+            type=int,
+            help='Payroll periods to rebuild (all periods when omitted)',
+        )
+
+    def handle(self, *args, **options):
+        periods = PayrollPeriod.objects.all()
+        if options['period_ids']:
+            periods = periods.filter(pk__in=options['period_ids'])
+
+        rebuilt = rebuild_period_totals(periods)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt totals for {rebuilt} payroll periods'))
@@ -0,0 +1,161 @@
+import multiprocessing
+import time
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+
+from employees.history import batched_history
+from payroll.models import PayrollPeriod, PayrollConfiguration
+from payroll.processing import (
+    BULK_BATCH_SIZE, CALCULATION_BATCH_SIZE, PayslipCalculator, calculate_payslips, generate_payslips,
+    shard_period_payslips
+)
+
+# Calculators built by this worker process, keyed by payroll period id
+_worker_calculators = {}
+
+
+def _init_worker():
+    """Set up Django in a pool worker and drop connections inherited from the parent"""
+    django.setup()
+    connections.close_all()
+
+
+def _calculate_shard(period_id, payslip_ids, batch_size):
+    """Calculate one shard of payslips inside a worker process"""
+    payroll_period = PayrollPeriod.objects.get(pk=period_id)
+    calculator = _worker_calculators.get(period_id)
+    if calculator is None:
+        calculator = PayslipCalculator(payroll_period)
+        _worker_calculators[period_id] = calculator
+    return calculate_payslips(
+        payroll_period, payslip_ids, batch_size=batch_size, calculator=calculator
+    )
+
+
+def _run_shard(args):
+    """Pool entry point returning ``(shard_size, calculated_count, error)``"""
+    period_id, payslip_ids, batch_size = args
+    try:
+        return len(payslip_ids), _calculate_shard(period_id, payslip_ids, batch_size), None
+    except Exception as e:
+        return len(payslip_ids), 0, str(e)
+
+
+class Command(BaseCommand):
+    help = 'Generate and calculate all payslips of a payroll period using a pool of worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('period_id', type=int, help='Payroll period to run')
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=multiprocessing.cpu_count(),
+            help='Number of worker processes (1 calculates in this process)',
+        )
+        parser.add_argument(
+            '--shard-by',
+            choices=['department', 'id'],
+            default='department',
+            help='Split payslips into shards by department or by id range',
+        )
+        parser.add_argument(
+            '--shard-size',
+            type=int,
+            default=BULK_BATCH_SIZE * 10,
+            help='Maximum number of payslips per shard',
+        )
+        parser.add_argument(
+            '--only-stale',
+            action='store_true',
+            help='Skip calculated payslips whose inputs have not changed',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=CALCULATION_BATCH_SIZE,
+            help='Payslips per committed chunk inside a shard',
+        )
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        if workers < 1 or options['shard_size'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--workers, --shard-size and --batch-size must be positive')
+
+        try:
+            payroll_period = PayrollPeriod.objects.get(pk=options['period_id'])
+        except PayrollPeriod.DoesNotExist:
+            raise CommandError(f"Payroll period {options['period_id']} does not exist")
+
+        if payroll_period.status not in ('draft', 'processing', 'processed'):
+            raise CommandError(
+                f'Payroll period is {payroll_period.status} and cannot be run'
+            )
+
+        started = time.monotonic()
+
+        # Generating payslips is idempotent, so a rerun after a crash only
+        # creates the payslips that are still missing
+        with batched_history(), PayrollConfiguration.objects.snapshot():
+            payroll_period.status = 'processing'
+            payroll_period.processed_date = timezone.now()
+            payroll_period.save()
+            created_count, skipped_count = generate_payslips(payroll_period)
+        self.stdout.write(
+            f'Generated {created_count} payslips ({skipped_count} already existed)'
+        )
+
+        shards = shard_period_payslips(
+            payroll_period, shard_by=options['shard_by'], shard_size=options['shard_size'],
+            only_stale=options['only_stale']
+        )
+        total = sum(len(shard) for shard in shards)
+        self.stdout.write(
+            f'Calculating {total} payslips in {len(shards)} shards with {workers} workers'
+        )
+
+        tasks = [(payroll_period.pk, shard, options['batch_size']) for shard in shards]
+        failures = []
+        done = 0
+        calculated_total = 0
+
+        if workers == 1 or len(tasks) <= 1:
+            _worker_calculators.clear()
+            results = map(_run_shard, tasks)
+            pool = None
+        else:
+            # Forked workers must not share the parent's database connections
+            connections.close_all()
+            pool = multiprocessing.Pool(
+                processes=min(workers, len(tasks)), initializer=_init_worker
+            )
+            results = pool.imap_unordered(_run_shard, tasks)
+
+        try:
+            for shard_size, calculated_count, error in results:
+                done += shard_size
+                calculated_total += calculated_count
+                if error:
+                    failures.append(error)
+                    self.stderr.write(f'Shard of {shard_size} payslips failed: {error}')
+                self.stdout.write(f'  {done}/{total} payslips')
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        if failures:
+            raise CommandError(
+                f'{len(failures)} of {len(shards)} shards failed; the period was left in '
+                f'processing and can be rerun to finish the remaining payslips'
+            )
+
+        payroll_period.status = 'processed'
+        payroll_period.save()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Calculated {calculated_total} payslips for {payroll_period.name} '
+            f'in {time.monotonic() - started:.1f}s'
+        ))
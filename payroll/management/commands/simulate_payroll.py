@@ -0,0 +1,109 @@
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+
+from payroll.serializers import SimulatedTaxBracketSerializer
+from payroll.simulation import PayrollSimulation
+
+
+class Command(BaseCommand):
+    help = 'Simulate monthly payroll costs under hypothetical changes without writing anything'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--raise',
+            dest='raises',
+            action='append',
+            default=[],
+            metavar='DEPARTMENT_ID:RATE',
+            help="Salary change, e.g. '3:0.04' for a 4%% raise in department 3 or 'all:0.02'",
+        )
+        parser.add_argument(
+            '--deduction',
+            dest='deductions',
+            action='append',
+            default=[],
+            metavar='DEDUCTION_TYPE_ID:AMOUNT',
+            help="Override a mandatory deduction amount or rate, e.g. '2:0.07'",
+        )
+        parser.add_argument(
+            '--brackets',
+            help='JSON file with a replacement list of tax brackets '
+                 '(min_amount, max_amount, tax_rate, fixed_amount)',
+        )
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Print the full result as JSON',
+        )
+
+    def handle(self, *args, **options):
+        salary_adjustments = []
+        for value in options['raises']:
+            department, rate = self._split(value, '--raise')
+            salary_adjustments.append({
+                'department_id': None if department == 'all' else self._int(department, '--raise'),
+                'rate': rate,
+            })
+
+        deduction_rates = []
+        for value in options['deductions']:
+            deduction_type, amount = self._split(value, '--deduction')
+            deduction_rates.append({
+                'deduction_type_id': self._int(deduction_type, '--deduction'),
+                'default_amount': amount,
+            })
+
+        tax_brackets = None
+        if options['brackets']:
+            try:
+                with open(options['brackets']) as brackets_file:
+                    tax_brackets = json.load(brackets_file)
+            except (OSError, ValueError) as e:
+                raise CommandError(f'Could not read tax brackets: {e}')
+            # Same checks as the simulate endpoint
+            serializer = SimulatedTaxBracketSerializer(data=tax_brackets, many=True)
+            if not serializer.is_valid():
+                raise CommandError(f'Invalid tax brackets: {json.dumps(serializer.errors)}')
+            tax_brackets = serializer.validated_data
+
+        result = PayrollSimulation().run(
+            salary_adjustments=salary_adjustments,
+            tax_brackets=tax_brackets,
+            deduction_rates=deduction_rates
+        )
+
+        if options['json']:
+            self.stdout.write(json.dumps(result, indent=2))
+            return
+
+        self.stdout.write(f"Employees: {result['employee_count']}")
+        for label in ('baseline', 'scenario'):
+            totals = result[label]['totals']
+            self.stdout.write(
+                f"{label.title():<10} gross ${totals['gross']:,.2f}  tax ${totals['tax']:,.2f}  "
+                f"deductions ${totals['deductions']:,.2f}  net ${totals['net']:,.2f}"
+            )
+        for department in result['scenario']['departments']:
+            self.stdout.write(
+                f"  {department['department'] or 'Unassigned':<25} {department['employees']:>6}  "
+                f"gross ${department['gross']:,.2f}  net ${department['net']:,.2f}"
+            )
+        difference = result['difference']
+        self.stdout.write(self.style.SUCCESS(
+            f"Monthly cost change: gross ${difference['gross']:+,.2f}, net ${difference['net']:+,.2f}"
+        ))
+
+    def _split(self, value, option):
+        try:
+            key, amount = value.split(':', 1)
+            return key, Decimal(amount)
+        except (ValueError, InvalidOperation):
+            raise CommandError(f'Invalid {option} value: {value}')
+
+    def _int(self, value, option):
+        try:
+            return int(value)
+        except ValueError:
+            raise CommandError(f'Invalid {option} value: {value}')
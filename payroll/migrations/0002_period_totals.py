@@ -0,0 +1,104 @@
+# Generated by Django 5.2.1 on 2026-10-17 00:19
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def populate_period_totals(apps, schema_editor):
+    PayrollPeriod = apps.get_model('payroll', 'PayrollPeriod')
+    aggregates = {
+        'total_gross_amount': Sum('payslips__gross_salary', default=Decimal('0')),
+        'total_net_amount': Sum('payslips__net_salary', default=Decimal('0')),
+        'total_deductions': Sum('payslips__total_deductions', default=Decimal('0')),
+        'total_taxes': Sum('payslips__tax_amount', default=Decimal('0')),
+        'total_bonuses': Sum('payslips__total_bonuses', default=Decimal('0')),
+    }
+    for status in ['draft', 'calculated', 'approved', 'paid', 'cancelled']:
+        aggregates[f'{status}_payslips'] = Count('payslips', filter=Q(payslips__status=status))
+
+    for row in PayrollPeriod.objects.order_by().values('pk').annotate(**aggregates):
+        period_id = row.pop('pk')
+        PayrollPeriod.objects.filter(pk=period_id).update(**row)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payroll', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historicalpayrollperiod',
+            name='approved_payslips',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='historicalpayrollperiod',
+            name='calculated_payslips',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='historicalpayrollperiod',
+            name='cancelled_payslips',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='historicalpayrollperiod',
+            name='draft_payslips',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='historicalpayrollperiod',
+            name='paid_payslips',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='historicalpayrollperiod',
+            name='total_bonuses',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Total bonuses for all employees', max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='historicalpayrollperiod',
+            name='total_taxes',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Total taxes for all employees', max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='payrollperiod',
+            name='approved_payslips',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='payrollperiod',
+            name='calculated_payslips',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='payrollperiod',
+            name='cancelled_payslips',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='payrollperiod',
+            name='draft_payslips',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='payrollperiod',
+            name='paid_payslips',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='payrollperiod',
+            name='total_bonuses',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Total bonuses for all employees', max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='payrollperiod',
+            name='total_taxes',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Total taxes for all employees', max_digits=12),
+        ),
+        migrations.RunPython(populate_period_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.1 on 2026-10-17 00:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payroll', '0002_period_totals'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historicalpayslip',
+            name='calculated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='historicalpayslip',
+            name='dirty_flags',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Bit set of calculation inputs changed since the last calculation'),
+        ),
+        migrations.AddField(
+            model_name='payslip',
+            name='calculated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='payslip',
+            name='dirty_flags',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Bit set of calculation inputs changed since the last calculation'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.1 on 2026-10-17 00:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employees', '0003_identifier_sequence'),
+        ('payroll', '0003_payslip_dirty_tracking'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historicalpayrollperiod',
+            name='rollup_stale',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='payrollperiod',
+            name='rollup_stale',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.CreateModel(
+            name='DepartmentPayrollRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('employees', models.PositiveIntegerField(default=0)),
+                ('total_gross', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('total_net', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('total_taxes', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('total_bonuses', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('total_deductions', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('refreshed_at', models.DateTimeField(auto_now=True)),
+                ('department', models.ForeignKey(blank=True, help_text='Empty for employees without a department', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='payroll_rollups', to='employees.department')),
+                ('payroll_period', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='department_rollups', to='payroll.payrollperiod')),
+            ],
+            options={
+                'ordering': ['payroll_period', 'department'],
+                'indexes': [models.Index(fields=['department', 'payroll_period'], name='payroll_dep_departm_8783ea_idx')],
+                'unique_together': {('payroll_period', 'department')},
+            },
+        ),
+    ]
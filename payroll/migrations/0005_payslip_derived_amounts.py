@@ -0,0 +1,68 @@
+# Generated by Django 5.2.1 on 2026-10-17 00:40
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+
+
+def populate_derived_amounts(apps, schema_editor):
+    Payslip = apps.get_model('payroll', 'Payslip')
+    cents = Decimal('0.01')
+    batch = []
+    for payslip in Payslip.objects.only(
+        'base_salary', 'overtime_hours', 'overtime_rate', 'unpaid_leave_days'
+    ).iterator(chunk_size=BATCH_SIZE):
+        daily_salary = (payslip.base_salary or Decimal('0')) / 30
+        overtime_pay = (payslip.overtime_hours or Decimal('0')) * (daily_salary / 8) * payslip.overtime_rate
+        payslip.daily_salary = daily_salary.quantize(cents)
+        payslip.overtime_pay = overtime_pay.quantize(cents)
+        payslip.leave_deduction = (payslip.unpaid_leave_days * daily_salary).quantize(cents)
+        batch.append(payslip)
+        if len(batch) >= BATCH_SIZE:
+            Payslip.objects.bulk_update(batch, ['daily_salary', 'overtime_pay', 'leave_deduction'])
+            batch = []
+    if batch:
+        Payslip.objects.bulk_update(batch, ['daily_salary', 'overtime_pay', 'leave_deduction'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payroll', '0004_department_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historicalpayslip',
+            name='daily_salary',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Base salary per day', max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='historicalpayslip',
+            name='leave_deduction',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Amount deducted for unpaid leave', max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='historicalpayslip',
+            name='overtime_pay',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Pay for overtime hours', max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='payslip',
+            name='daily_salary',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Base salary per day', max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='payslip',
+            name='leave_deduction',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Amount deducted for unpaid leave', max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='payslip',
+            name='overtime_pay',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Pay for overtime hours', max_digits=10),
+        ),
+        migrations.RunPython(populate_derived_amounts, migrations.RunPython.noop),
+    ]
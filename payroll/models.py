@@ -1,11 +1,15 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.conf import settings
+from django.core.cache import cache
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 from decimal import Decimal
 from datetime import date, datetime
-from simple_history.models import HistoricalRecords
+from contextlib import contextmanager
+from contextvars import ContextVar
+import uuid
+from employees.history import BatchedHistoricalRecords
 
 User = get_user_model()
 
@@ -54,6 +58,28 @@ class PayrollPeriod(models.Model):
         default=0, 
         help_text="Total deductions for all employees"
     )
+    total_taxes = models.DecimalField(
+        max_digits=12, 
+        decimal_places=2, 
+        default=0, 
+        help_text="Total taxes for all employees"
+    )
+    total_bonuses = models.DecimalField(
+        max_digits=12, 
+        decimal_places=2, 
+        default=0, 
+        help_text="Total bonuses for all employees"
+    )
+    
+    # Payslip counts per status, kept up to date by payroll.totals
+    draft_payslips = models.PositiveIntegerField(default=0)
+    calculated_payslips = models.PositiveIntegerField(default=0)
+    approved_payslips = models.PositiveIntegerField(default=0)
+    paid_payslips = models.PositiveIntegerField(default=0)
+    cancelled_payslips = models.PositiveIntegerField(default=0)
+    
+    # Set when payslips change; department rollups are refreshed after commit
+    rollup_stale = models.BooleanField(default=True)
     
     # Processing info
     processed_by = models.ForeignKey(
@@ -69,12 +95,37 @@ class PayrollPeriod(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     # History tracking
-    history = HistoricalRecords()
+    history = BatchedHistoricalRecords()
+
+    # Columns maintained by payroll.totals; ordinary saves never overwrite them
+    MAINTAINED_TOTAL_FIELDS = [
+        'total_gross_amount', 'total_net_amount', 'total_deductions',
+        'total_taxes', 'total_bonuses', 'draft_payslips', 'calculated_payslips',
+        'approved_payslips', 'paid_payslips', 'cancelled_payslips', 'rollup_stale',
+    ]
+
+    @property
+    def status_counts(self):
+        """Get the number of payslips in each status"""
+        return {
+            status: getattr(self, f'{status}_payslips')
+            for status, _ in Payslip.STATUS_CHOICES
+        }
 
     @property
     def total_employees(self):
         """Get total number of employees in this payroll period"""
-        return self.payslips.count()
+        return sum(self.status_counts.values())
+
+    def save(self, *args, **kwargs):
+        # Totals are changed with atomic increments, so an instance loaded
+        # earlier must not write its stale copy back
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.MAINTAINED_TOTAL_FIELDS
+            ]
+        super().save(*args, **kwargs)
 
     @property
     def is_editable(self):
@@ -121,7 +172,7 @@ class TaxBracket(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     # History tracking
-    history = HistoricalRecords()
+    history = BatchedHistoricalRecords()
 
     def __str__(self):
         max_str = f" - ${self.max_amount:,.2f}" if self.max_amount else "+"
@@ -164,7 +215,20 @@ class DeductionType(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     # History tracking
-    history = HistoricalRecords()
+    history = BatchedHistoricalRecords()
+
+    def amount_components(self):
+        """Return the (fixed amount, rate on base salary) pair for this deduction"""
+        if self.calculation_method == 'fixed':
+            return self.default_amount, Decimal('0')
+        if self.calculation_method == 'percentage':
+            return Decimal('0'), self.default_amount
+        return Decimal('0'), Decimal('0')  # Tax calculations handled separately
+
+    def calculate_amount(self, base_amount):
+        """Calculate the deduction amount for a given base salary"""
+        fixed_amount, rate = self.amount_components()
+        return (fixed_amount + base_amount * rate).quantize(Decimal('0.01'))
 
     def __str__(self):
         return f"{self.name} ({self.get_calculation_method_display()})"
@@ -202,7 +266,7 @@ class BonusType(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     # History tracking
-    history = HistoricalRecords()
+    history = BatchedHistoricalRecords()
 
     def __str__(self):
         return f"{self.name} ({self.get_calculation_method_display()})"
@@ -222,6 +286,26 @@ class Payslip(models.Model):
         ('cancelled', 'Cancelled'),
     ]
     
+    # Fields summed into PayrollPeriod totals
+    PERIOD_TOTAL_FIELDS = (
+        'payroll_period_id', 'status', 'gross_salary', 'net_salary',
+        'total_deductions', 'tax_amount', 'total_bonuses'
+    )
+    
+    # Calculation inputs that changed since the last calculation (dirty_flags bits)
+    DIRTY_BASE_SALARY = 1
+    DIRTY_BONUSES = 2
+    DIRTY_DEDUCTIONS = 4
+    DIRTY_LEAVE = 8
+    DIRTY_TAX = 16
+    DIRTY_FLAG_CHOICES = [
+        (DIRTY_BASE_SALARY, 'base_salary'),
+        (DIRTY_BONUSES, 'bonuses'),
+        (DIRTY_DEDUCTIONS, 'deductions'),
+        (DIRTY_LEAVE, 'unpaid_leave'),
+        (DIRTY_TAX, 'tax_brackets'),
+    ]
+    
     # Basic info
     employee = models.ForeignKey(
         'employees.Employee', 
@@ -270,6 +354,24 @@ class Payslip(models.Model):
     )
     
     # Calculated amounts
+    daily_salary = models.DecimalField(
+        max_digits=10, 
+        decimal_places=2, 
+        default=0,
+        help_text="Base salary per day"
+    )
+    overtime_pay = models.DecimalField(
+        max_digits=10, 
+        decimal_places=2, 
+        default=0,
+        help_text="Pay for overtime hours"
+    )
+    leave_deduction = models.DecimalField(
+        max_digits=10, 
+        decimal_places=2, 
+        default=0,
+        help_text="Amount deducted for unpaid leave"
+    )
     gross_salary = models.DecimalField(
         max_digits=10, 
         decimal_places=2, 
@@ -335,44 +437,89 @@ class Payslip(models.Model):
         help_text="Notes visible to employee"
     )
     
+    # Recalculation tracking
+    dirty_flags = models.PositiveSmallIntegerField(
+        default=0,
+        help_text="Bit set of calculation inputs changed since the last calculation"
+    )
+    calculated_at = models.DateTimeField(null=True, blank=True)
+    
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     # History tracking
-    history = HistoricalRecords()
+    history = BatchedHistoricalRecords()
 
     @property
-    def daily_salary(self):
-        """Calculate daily salary based on monthly salary"""
-        if self.base_salary:
-            # Assuming 30 days per month for calculation
-            return self.base_salary / 30
-        return Decimal('0')
-
-    @property
-    def overtime_pay(self):
-        """Calculate overtime pay"""
-        if self.overtime_hours and self.base_salary:
-            hourly_rate = self.base_salary / (30 * 8)  # Assuming 8 hours/day
-            return self.overtime_hours * hourly_rate * self.overtime_rate
-        return Decimal('0')
+    def is_stale(self):
+        """Check if the payslip needs to be (re)calculated"""
+        return self.status == 'draft' or (self.status == 'calculated' and self.dirty_flags != 0)
 
     @property
-    def leave_deduction(self):
-        """Calculate deduction for unpaid leave"""
-        return self.unpaid_leave_days * self.daily_salary
+    def dirty_inputs(self):
+        """Get the names of the inputs changed since the last calculation"""
+        return [name for flag, name in self.DIRTY_FLAG_CHOICES if self.dirty_flags & flag]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored amounts so saves can adjust period totals by the difference
+        if set(cls.PERIOD_TOTAL_FIELDS).issubset(field_names):
+            instance._period_totals = instance.period_total_values()
+        if 'base_salary' in field_names:
+            instance._loaded_base_salary = instance.base_salary
+        return instance
+
+    def save(self, *args, **kwargs):
+        loaded_base_salary = getattr(self, '_loaded_base_salary', None)
+        if loaded_base_salary is not None and self.base_salary != loaded_base_salary:
+            if self.status in ['draft', 'calculated']:
+                self.dirty_flags |= self.DIRTY_BASE_SALARY
+            self._loaded_base_salary = self.base_salary
+        super().save(*args, **kwargs)
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        # Refreshed values are what the database holds, so totals already include them
+        stored = getattr(self, '_period_totals', None)
+        current = self.period_total_values()
+        if fields is None or stored is None:
+            self._period_totals = current
+        else:
+            self._period_totals = tuple(
+                current[index] if name in fields else stored[index]
+                for index, name in enumerate(self.PERIOD_TOTAL_FIELDS)
+            )
+
+    def period_total_values(self):
+        """Get the values this payslip contributes to its payroll period totals"""
+        return tuple(getattr(self, field) for field in self.PERIOD_TOTAL_FIELDS)
+
+    def calculate_derived_amounts(self):
+        """Set daily salary, overtime pay and leave deduction from the salary inputs"""
+        cents = Decimal('0.01')
+        daily_salary = Decimal('0')
+        overtime_pay = Decimal('0')
+        if self.base_salary:
+            # Assuming 30 days per month and 8 hours per day
+            daily_salary = self.base_salary / 30
+            if self.overtime_hours:
+                overtime_pay = self.overtime_hours * (daily_salary / 8) * self.overtime_rate
+        self.daily_salary = daily_salary.quantize(cents)
+        self.overtime_pay = overtime_pay.quantize(cents)
+        self.leave_deduction = (self.unpaid_leave_days * daily_salary).quantize(cents)
 
     def calculate_gross_salary(self):
         """Calculate gross salary including overtime and bonuses"""
+        self.calculate_derived_amounts()
         gross = self.base_salary + self.overtime_pay + self.total_bonuses
         gross -= self.leave_deduction
         return gross
 
     def calculate_net_salary(self):
         """Calculate net salary after all deductions"""
-        gross = self.calculate_gross_salary()
-        return gross - self.total_deductions - self.tax_amount
+        return self.gross_salary - self.total_deductions - self.tax_amount
 
     def __str__(self):
         return f"{self.payslip_number} - {self.employee.full_name} ({self.payroll_period.name})"
@@ -416,7 +563,7 @@ class PayslipDeduction(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     # History tracking
-    history = HistoricalRecords()
+    history = BatchedHistoricalRecords()
 
     def __str__(self):
         return f"{self.payslip.payslip_number} - {self.deduction_type.name}: ${self.amount}"
@@ -468,7 +615,7 @@ class PayslipBonus(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     # History tracking
-    history = HistoricalRecords()
+    history = BatchedHistoricalRecords()
 
     def __str__(self):
         return f"{self.payslip.payslip_number} - {self.bonus_type.name}: ${self.amount}"
@@ -540,7 +687,7 @@ class CompensationHistory(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     # History tracking
-    history = HistoricalRecords()
+    history = BatchedHistoricalRecords()
 
     @property
     def salary_change_amount(self):
@@ -568,6 +715,100 @@ class CompensationHistory(models.Model):
         verbose_name_plural = "Compensation histories"
 
 
+class DepartmentPayrollRollup(models.Model):
+    """Payslip totals of one department in one payroll period, maintained by payroll.rollups"""
+    
+    payroll_period = models.ForeignKey(
+        PayrollPeriod,
+        on_delete=models.CASCADE,
+        related_name='department_rollups'
+    )
+    department = models.ForeignKey(
+        'employees.Department',
+        on_delete=models.SET_NULL,
+        null=True, blank=True,
+        related_name='payroll_rollups',
+        help_text="Empty for employees without a department"
+    )
+    
+    employees = models.PositiveIntegerField(default=0)
+    total_gross = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total_net = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total_taxes = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total_bonuses = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total_deductions = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    
+    refreshed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        department = self.department.name if self.department else 'No department'
+        return f"{self.payroll_period.name} - {department}"
+
+    class Meta:
+        ordering = ['payroll_period', 'department']
+        unique_together = ['payroll_period', 'department']
+        indexes = [
+            models.Index(fields=['department', 'payroll_period']),
+        ]
+
+
+CONFIGURATION_VERSION_CACHE_KEY = 'payroll:configuration:version'
+
+# Process-local (version, configuration) pair shared by all requests
+_configuration_cache = {}
+
+# Configuration pinned for the duration of a payroll run
+_configuration_snapshot = ContextVar('payroll_configuration_snapshot', default=None)
+
+
+class PayrollConfigurationManager(models.Manager):
+    """Manager with a cached accessor for the active payroll configuration"""
+
+    def get_current(self):
+        """
+        Return the active configuration (or None if none exists).
+
+        A process-local copy is reused until another worker bumps the shared
+        version stamp in Django's cache. Inside ``snapshot()`` the pinned
+        configuration is returned without any lookups.
+        """
+        snapshot = _configuration_snapshot.get()
+        if snapshot is not None:
+            return snapshot[0]
+
+        version = cache.get(CONFIGURATION_VERSION_CACHE_KEY)
+        if version is None:
+            cache.add(CONFIGURATION_VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+            version = cache.get(CONFIGURATION_VERSION_CACHE_KEY)
+
+        cached = _configuration_cache.get(self.db)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        config = self.first()
+        _configuration_cache[self.db] = (version, config)
+        return config
+
+    def clear_cache(self):
+        """Drop the local copy and tell other workers to reload theirs"""
+        _configuration_cache.clear()
+        cache.set(CONFIGURATION_VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+
+    @contextmanager
+    def snapshot(self):
+        """Pin the active configuration so a whole payroll run sees the same values"""
+        if _configuration_snapshot.get() is not None:
+            yield _configuration_snapshot.get()[0]
+            return
+
+        config = self.get_current()
+        token = _configuration_snapshot.set((config,))
+        try:
+            yield config
+        finally:
+            _configuration_snapshot.reset(token)
+
+
 class PayrollConfiguration(models.Model):
     """Global payroll configuration settings"""
     
@@ -618,7 +859,9 @@ class PayrollConfiguration(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     # History tracking
-    history = HistoricalRecords()
+    history = BatchedHistoricalRecords()
+
+    objects = PayrollConfigurationManager()
 
     def __str__(self):
         return f"Payroll Configuration - {self.default_country} {self.tax_year}"
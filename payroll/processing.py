@@ -0,0 +1,535 @@
+"""
+Set-based payroll processing helpers.
+
+These functions operate on a whole payroll period at once so that the number
+of database round trips stays constant regardless of headcount.
+"""
+from datetime import timedelta
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import (
+    DateField, DecimalField, Exists, F, OuterRef, Q, Subquery, Sum, Value
+)
+from django.db.models.functions import Coalesce, Greatest, Least
+from django.utils import timezone
+from simple_history.utils import bulk_create_with_history
+
+from employees.models import Employee
+from employees.history import update_with_history
+from employees.sequences import allocate, highest_number
+from leaves.models import Holiday, LeaveRequest
+from .models import Payslip, PayslipDeduction, PayrollConfiguration, DeductionType
+from .tax import get_tax_table
+from .totals import PeriodTotals
+
+# Rows per INSERT/UPDATE statement for bulk operations
+BULK_BATCH_SIZE = 500
+
+# Payslips calculated per chunk; larger chunks measured faster with
+# benchmark_payroll up to about this size
+CALCULATION_BATCH_SIZE = 1000
+
+DEFAULT_PAYSLIP_PREFIX = 'PAY'
+DEFAULT_PAYSLIP_FORMAT = '{prefix}{year}{month:02d}{sequence:04d}'
+
+# Leave durations that only take half of their first day
+HALF_DAY_DURATION_TYPES = ['half_day_morning', 'half_day_afternoon']
+
+# Payslip statuses that can still be (re)calculated
+CALCULABLE_STATUSES = ['draft', 'calculated']
+
+# Average payslips sharing the same calculated values for one UPDATE per
+# distinct set of values to be cheaper than a bulk_update of every row
+MIN_PAYSLIPS_PER_UPDATE = 10
+
+# Payroll period statuses whose payslips are no longer recalculated
+CLOSED_PERIOD_STATUSES = ['finalized', 'cancelled']
+
+# Payslip columns written back by a calculation pass
+PAYSLIP_CALCULATED_FIELDS = [
+    'unpaid_leave_days', 'daily_salary', 'overtime_pay', 'leave_deduction',
+    'gross_salary', 'total_deductions', 'tax_amount', 'net_salary', 'status',
+    'dirty_flags', 'calculated_at', 'updated_at'
+]
+
+
+def calculable_payslips(payslips, only_stale=False):
+    """
+    Narrow a payslip queryset to those a calculation pass should touch.
+
+    With ``only_stale`` calculated payslips whose inputs have not changed
+    since their last calculation are left out.
+    """
+    payslips = payslips.filter(status__in=CALCULABLE_STATUSES)
+    if only_stale:
+        payslips = payslips.filter(Q(status='draft') | ~Q(dirty_flags=0))
+    return payslips
+
+
+def mark_payslips_dirty(payslips, flag):
+    """Flag a changed calculation input on the open payslips of a queryset"""
+    return payslips.filter(status__in=CALCULABLE_STATUSES).update(
+        dirty_flags=F('dirty_flags').bitor(flag)
+    )
+
+
+def generate_payslips(payroll_period, user=None, batch_size=BULK_BATCH_SIZE):
+    """
+    Create draft payslips for every active employee without one in the period.
+
+    Existing payslips are diffed in a single query and a block of sequence
+    numbers is reserved for the whole batch, so the query count does not
+    grow with headcount.
+
+    Returns a ``(created_count, skipped_count)`` tuple.
+    """
+    config = PayrollConfiguration.objects.get_current()
+    if config:
+        prefix = config.payslip_number_prefix
+        format_str = config.payslip_number_format
+    else:
+        prefix = DEFAULT_PAYSLIP_PREFIX
+        format_str = DEFAULT_PAYSLIP_FORMAT
+
+    existing_employee_ids = set(
+        Payslip.objects.filter(payroll_period=payroll_period)
+        .values_list('employee_id', flat=True)
+    )
+    active_employees = Employee.objects.filter(
+        employment_status='active'
+    ).values_list('id', 'employee_id', 'salary')
+
+    year = payroll_period.start_date.year
+    month = payroll_period.start_date.month
+    skipped_count = 0
+    new_employees = []
+    for employee in active_employees:
+        if employee[0] in existing_employee_ids:
+            skipped_count += 1
+        else:
+            new_employees.append(employee)
+
+    if not new_employees:
+        return 0, skipped_count
+
+    # Reserve one block of sequence numbers for the whole batch, starting
+    # after the highest number in use so deleted payslips leave gaps unused
+    def seed():
+        return highest_number(
+            Payslip.objects.all(), 'payslip_number', f'{prefix}{year}{month:02d}'
+        )
+
+    sequence = allocate(
+        prefix, f'{year}{month:02d}', count=len(new_employees), seed=seed
+    ) - 1
+    new_payslips = []
+
+    for employee_pk, employee_code, salary in new_employees:
+        sequence += 1
+        new_payslips.append(Payslip(
+            employee_id=employee_pk,
+            payroll_period=payroll_period,
+            payslip_number=format_str.format(
+                prefix=prefix,
+                year=year,
+                month=month,
+                sequence=sequence,
+                employee_id=employee_code
+            ),
+            base_salary=salary or Decimal('0'),
+            status='draft'
+        ))
+
+    bulk_create_with_history(
+        new_payslips, Payslip, batch_size=batch_size, default_user=user
+    )
+    # bulk_create sends no signals, so count the new drafts here
+    totals = PeriodTotals()
+    for payslip in new_payslips:
+        totals.add(payslip)
+    totals.apply()
+
+    return len(new_payslips), skipped_count
+
+
+def business_days(start_date, end_date, holidays=()):
+    """Weekdays from ``start_date`` to ``end_date`` inclusive that are not holidays"""
+    days = 0
+    day = start_date
+    while day <= end_date:
+        if day.weekday() < 5 and day not in holidays:
+            days += 1
+        day += timedelta(days=1)
+    return days
+
+
+def unpaid_leave_days_by_employee(payroll_period, employee_ids=None):
+    """
+    Unpaid leave days falling inside a payroll period, keyed by employee id.
+
+    Every approved unpaid leave request overlapping the period is read in one
+    query with its dates already clipped to the period. Each calendar day of
+    leave counts, matching the daily salary of a thirtieth of the month. Like
+    ``LeaveRequest._calculate_total_days``, a half-day request only counts
+    half of its first day, so half a day is taken off when that day falls in
+    the period. An hourly request takes the same part of each of its days:
+    its ``total_days`` over the business days it spans, which needs one more
+    query for holidays. ``employee_ids`` limits the result to some employees.
+    """
+    period_start = payroll_period.start_date
+    period_end = payroll_period.end_date
+    leave_requests = LeaveRequest.objects.filter(
+        status='approved',
+        leave_type__is_paid=False,
+        start_date__lte=period_end,
+        end_date__gte=period_start
+    )
+    if employee_ids is not None:
+        leave_requests = leave_requests.filter(employee_id__in=employee_ids)
+
+    rows = list(leave_requests.annotate(
+        overlap_start=Greatest('start_date', Value(period_start), output_field=DateField()),
+        overlap_end=Least('end_date', Value(period_end), output_field=DateField())
+    ).values_list(
+        'employee_id', 'overlap_start', 'overlap_end',
+        'start_date', 'end_date', 'duration_type', 'total_days'
+    ))
+
+    hourly = [row for row in rows if row[5] == 'hours']
+    holidays = set(Holiday.objects.filter(
+        affects_leave_calculation=True,
+        date__gte=min(row[3] for row in hourly),
+        date__lte=max(row[4] for row in hourly)
+    ).values_list('date', flat=True)) if hourly else set()
+
+    unpaid_days = {}
+    for employee_id, overlap_start, overlap_end, start_date, end_date, duration_type, total_days in rows:
+        days = Decimal((overlap_end - overlap_start).days + 1)
+        if duration_type in HALF_DAY_DURATION_TYPES:
+            if start_date >= period_start:
+                days -= Decimal('0.5')
+        elif duration_type == 'hours':
+            span = business_days(start_date, end_date, holidays) or (end_date - start_date).days + 1
+            days *= (total_days or Decimal('0')) / span
+        unpaid_days[employee_id] = unpaid_days.get(employee_id, Decimal('0')) + days
+
+    return {
+        employee_id: days.quantize(Decimal('0.01'))
+        for employee_id, days in unpaid_days.items()
+    }
+
+
+def configured_tax_scope(config):
+    """Return the ``(country, year)`` whose tax brackets payslips are taxed with"""
+    if config is None:
+        return 'Mexico', timezone.now().year
+    return config.default_country, config.tax_year
+
+
+class PayslipCalculator:
+    """
+    Calculates payslip amounts for a payroll period.
+
+    Configuration, tax brackets, mandatory deduction types and unpaid leave are
+    loaded once when the calculator is built, so calculating each payslip
+    afterwards happens entirely in memory.
+    """
+
+    def __init__(self, payroll_period):
+        self.payroll_period = payroll_period
+        self.config = PayrollConfiguration.objects.get_current()
+
+        self.tax_table = get_tax_table(*configured_tax_scope(self.config))
+        self.mandatory_deductions = list(
+            DeductionType.objects.filter(is_mandatory=True, is_active=True)
+        )
+
+        self.integrate_leave = bool(
+            self.config and self.config.integrate_with_leave_management
+        )
+        self.unpaid_leave_days = (
+            unpaid_leave_days_by_employee(payroll_period) if self.integrate_leave else {}
+        )
+
+    def calculate(self, payslip, existing_deductions):
+        """
+        Calculate a payslip in memory.
+
+        ``existing_deductions`` maps deduction type ids to the amounts already
+        recorded on the payslip. Returns the unsaved ``PayslipDeduction``
+        objects for mandatory deductions the payslip was still missing.
+        """
+        if self.integrate_leave:
+            payslip.unpaid_leave_days = self.unpaid_leave_days.get(
+                payslip.employee_id, Decimal('0')
+            )
+
+        gross_salary = payslip.calculate_gross_salary()
+
+        new_deductions = []
+        for deduction_type in self.mandatory_deductions:
+            if deduction_type.id not in existing_deductions:
+                new_deductions.append(PayslipDeduction(
+                    payslip=payslip,
+                    deduction_type=deduction_type,
+                    amount=deduction_type.calculate_amount(payslip.base_salary),
+                    calculation_base=payslip.base_salary
+                ))
+
+        payslip.total_deductions = (
+            sum(existing_deductions.values(), Decimal('0'))
+            + sum((deduction.amount for deduction in new_deductions), Decimal('0'))
+        )
+        payslip.gross_salary = gross_salary
+        payslip.tax_amount = self.tax_table.tax_for(gross_salary)
+        payslip.net_salary = payslip.calculate_net_salary()
+        payslip.status = 'calculated'
+        payslip.dirty_flags = 0
+        payslip.calculated_at = timezone.now()
+        return new_deductions
+
+
+def apply_mandatory_deductions(payroll_period, payslip_ids=None, user=None,
+                               batch_size=BULK_BATCH_SIZE):
+    """
+    Add every missing mandatory deduction to the open payslips of a period.
+
+    Missing (payslip, deduction type) pairs are found with one anti-join
+    query, amounts are computed in memory and inserted with ``bulk_create``,
+    and ``total_deductions`` of the affected payslips is recomputed with one
+    grouped ``UPDATE`` per batch. ``payslip_ids`` limits the operation to
+    some payslips.
+
+    Returns ``(created_count, new_totals)`` where ``new_totals`` maps each
+    affected payslip id to its new total deductions.
+    """
+    deduction_types = list(
+        DeductionType.objects.filter(is_mandatory=True, is_active=True)
+    )
+    if not deduction_types:
+        return 0, {}
+
+    payslips = Payslip.objects.filter(
+        payroll_period=payroll_period, status__in=CALCULABLE_STATUSES
+    )
+    if payslip_ids is not None:
+        payslips = payslips.filter(id__in=payslip_ids)
+
+    present = {
+        f'has_deduction_{deduction_type.id}': Exists(
+            PayslipDeduction.objects.filter(
+                payslip_id=OuterRef('pk'), deduction_type_id=deduction_type.id
+            )
+        )
+        for deduction_type in deduction_types
+    }
+    rows = list(
+        payslips.annotate(**present)
+        .filter(reduce(or_, [Q(**{name: False}) for name in present]))
+        .order_by('id')
+        .values_list('id', 'base_salary', 'total_deductions', *present)
+    )
+    if not rows:
+        return 0, {}
+
+    new_deductions = []
+    for payslip_id, base_salary, _, *has_deductions in rows:
+        for deduction_type, has_deduction in zip(deduction_types, has_deductions):
+            if not has_deduction:
+                new_deductions.append(PayslipDeduction(
+                    payslip_id=payslip_id,
+                    deduction_type=deduction_type,
+                    amount=deduction_type.calculate_amount(base_salary),
+                    calculation_base=base_salary
+                ))
+
+    deduction_totals = PayslipDeduction.objects.filter(
+        payslip_id=OuterRef('pk')
+    ).order_by().values('payslip_id').annotate(total=Sum('amount')).values('total')
+
+    affected_ids = [row[0] for row in rows]
+    total_before = sum((row[2] for row in rows), Decimal('0'))
+    new_totals = {}
+
+    with transaction.atomic():
+        bulk_create_with_history(
+            new_deductions, PayslipDeduction, batch_size=batch_size, default_user=user
+        )
+
+        now = timezone.now()
+        for offset in range(0, len(affected_ids), batch_size):
+            chunk_ids = affected_ids[offset:offset + batch_size]
+            update_with_history(
+                Payslip.objects.filter(id__in=chunk_ids),
+                user=user,
+                batch_size=batch_size,
+                total_deductions=Coalesce(
+                    Subquery(deduction_totals),
+                    Value(Decimal('0')),
+                    output_field=DecimalField(max_digits=10, decimal_places=2)
+                ),
+                dirty_flags=F('dirty_flags').bitor(Payslip.DIRTY_DEDUCTIONS),
+                updated_at=now
+            )
+            new_totals.update(
+                Payslip.objects.filter(id__in=chunk_ids).values_list('id', 'total_deductions')
+            )
+
+        totals = PeriodTotals()
+        totals.adjust(
+            payroll_period.pk, 'total_deductions',
+            sum(new_totals.values(), Decimal('0')) - total_before
+        )
+        totals.apply()
+
+    return len(new_deductions), new_totals
+
+
+def calculate_payslips(payroll_period, payslip_ids, user=None,
+                       batch_size=CALCULATION_BATCH_SIZE, calculator=None):
+    """
+    Calculate the given payslips of a payroll period chunk by chunk.
+
+    Each chunk is written back in its own transaction, updating only the
+    columns that changed, so an interrupted run keeps the chunks it finished. Payslips that are no
+    longer draft or calculated are left alone. Returns the number of payslips
+    calculated.
+    """
+    calculator = calculator or PayslipCalculator(payroll_period)
+
+    calculated_count = 0
+    for offset in range(0, len(payslip_ids), batch_size):
+        chunk_ids = payslip_ids[offset:offset + batch_size]
+
+        with transaction.atomic():
+            payslips = list(Payslip.objects.filter(
+                id__in=chunk_ids,
+                payroll_period=payroll_period,
+                status__in=CALCULABLE_STATUSES
+            ))
+
+            existing_deductions = {payslip.id: {} for payslip in payslips}
+            for payslip_id, deduction_type_id, amount in PayslipDeduction.objects.filter(
+                payslip_id__in=chunk_ids
+            ).values_list('payslip_id', 'deduction_type_id', 'amount'):
+                deductions = existing_deductions.get(payslip_id)
+                if deductions is not None:
+                    deductions[deduction_type_id] = deductions.get(deduction_type_id, Decimal('0')) + amount
+
+            now = timezone.now()
+            totals = PeriodTotals()
+            new_deductions = []
+            originals = {}
+            for payslip in payslips:
+                originals[payslip.id] = [getattr(payslip, field) for field in PAYSLIP_CALCULATED_FIELDS]
+                new_deductions.extend(
+                    calculator.calculate(payslip, existing_deductions[payslip.id])
+                )
+                payslip.calculated_at = now
+                payslip.updated_at = now
+                totals.change(payslip)
+
+            if new_deductions:
+                bulk_create_with_history(
+                    new_deductions, PayslipDeduction,
+                    batch_size=batch_size, default_user=user
+                )
+            if payslips:
+                _save_calculated_payslips(payslips, originals, user, batch_size)
+            totals.apply()
+        calculated_count += len(payslips)
+
+    return calculated_count
+
+
+def _save_calculated_payslips(payslips, originals, user, batch_size):
+    """
+    Write back the calculated columns of a chunk of payslips.
+
+    Columns that end up with the same value on every payslip (status,
+    timestamps, cleared flags, often leave and overtime) are set with one
+    ``UPDATE`` that also records history. Only the other columns go through
+    ``bulk_update``, and only for the payslips where they changed, since
+    its per-row ``CASE`` expressions dominate the cost of a calculation
+    pass. ``originals`` maps payslip ids to their values before calculating.
+    """
+    shared = {}
+    varying = []
+    for index, field in enumerate(PAYSLIP_CALCULATED_FIELDS):
+        values = {getattr(payslip, field) for payslip in payslips}
+        if len(values) == 1:
+            shared[field] = values.pop()
+        elif any(getattr(payslip, field) != originals[payslip.id][index] for payslip in payslips):
+            varying.append((index, field))
+
+    # Payslips with the same salary and inputs get the same results, so the
+    # changed rows are grouped by their new values
+    groups = {}
+    for payslip in payslips:
+        if any(getattr(payslip, field) != originals[payslip.id][index] for index, field in varying):
+            values = tuple(getattr(payslip, field) for _, field in varying)
+            groups.setdefault(values, []).append(payslip)
+    changed_count = sum(len(group) for group in groups.values())
+    if len(groups) * MIN_PAYSLIPS_PER_UPDATE <= changed_count:
+        for values, group in groups.items():
+            Payslip.objects.filter(id__in=[payslip.id for payslip in group]).update(
+                **{field: value for (_, field), value in zip(varying, values)}
+            )
+    elif groups:
+        Payslip.objects.bulk_update(
+            [payslip for group in groups.values() for payslip in group],
+            [field for _, field in varying], batch_size=batch_size
+        )
+    # Written last so the history rows hold the final values of every column
+    update_with_history(
+        Payslip.objects.filter(id__in=[payslip.id for payslip in payslips]),
+        user=user, batch_size=batch_size, **shared
+    )
+
+
+def calculate_period_payslips(payroll_period, user=None, batch_size=CALCULATION_BATCH_SIZE,
+                              only_stale=False):
+    """
+    Calculate every draft or calculated payslip in a payroll period.
+
+    Inputs are loaded once through ``PayslipCalculator`` and results are
+    written back chunk by chunk. With ``only_stale``
+    payslips whose inputs are unchanged since their last calculation are
+    skipped. Returns the number of payslips calculated.
+    """
+    payslip_ids = list(
+        calculable_payslips(payroll_period.payslips.all(), only_stale)
+        .order_by('id').values_list('id', flat=True)
+    )
+    return calculate_payslips(payroll_period, payslip_ids, user=user, batch_size=batch_size)
+
+
+def shard_period_payslips(payroll_period, shard_by='department', shard_size=BULK_BATCH_SIZE * 10,
+                          only_stale=False):
+    """
+    Split a period's calculable payslips into lists of ids for parallel workers.
+
+    ``shard_by='department'`` yields one shard per department (large
+    departments are split further by ``shard_size``); ``shard_by='id'``
+    yields consecutive id ranges of ``shard_size`` payslips.
+    """
+    rows = calculable_payslips(
+        payroll_period.payslips.all(), only_stale
+    ).order_by('id').values_list('id', 'employee__department_id')
+
+    if shard_by == 'department':
+        groups = {}
+        for payslip_id, department_id in rows:
+            groups.setdefault(department_id, []).append(payslip_id)
+        groups = list(groups.values())
+    else:
+        groups = [[payslip_id for payslip_id, _ in rows]]
+
+    shards = []
+    for payslip_ids in groups:
+        for offset in range(0, len(payslip_ids), shard_size):
+            shards.append(payslip_ids[offset:offset + shard_size])
+    return shards
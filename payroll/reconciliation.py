@@ -0,0 +1,194 @@
+"""
+Bulk payment reconciliation.
+
+After a bank run the bank returns a CSV file with one row per payment
+(``payslip_number``, ``payment_reference``, ``payment_date``). The file is
+read as a stream; every chunk of rows is matched to payslips with one query
+and a dict keyed on ``payslip_number``, and the approved ones are marked
+paid with a ``bulk_update`` of their references plus one
+``update_with_history`` per payment date, in their own transaction. Rows that cannot be
+applied are collected into a reconciliation report, so the same file can be
+uploaded again safely. If the file turns out to be unreadable partway, the
+rows before the error are still applied and the report of them is attached
+to the ``PaymentFileError``.
+"""
+import csv
+import io
+from datetime import datetime
+
+from django.db import transaction
+from django.utils import timezone
+
+from employees.history import update_with_history
+from .models import Payslip
+from .processing import BULK_BATCH_SIZE
+from .totals import PeriodTotals
+
+# Accepted header names for each column
+PAYMENT_COLUMNS = {
+    'payslip_number': ['payslip_number', 'payslip'],
+    'payment_reference': ['payment_reference', 'reference'],
+    'payment_date': ['payment_date', 'date'],
+}
+
+PAYMENT_DATE_FORMATS = ['%Y-%m-%d', '%Y%m%d', '%d/%m/%Y']
+
+
+class PaymentFileError(ValueError):
+    """The uploaded payment file cannot be read"""
+
+    # Reconciliation report of the rows applied before the error
+    report = None
+
+
+def parse_payment_date(value):
+    """Parse a payment date in one of the accepted formats, or return None"""
+    value = (value or '').strip()
+    for date_format in PAYMENT_DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+    return None
+
+
+def read_payment_rows(uploaded_file):
+    """
+    Yield ``(line_number, payslip_number, payment_reference, payment_date)``
+    for each row of a payment CSV file without reading it into memory.
+    """
+    text = io.TextIOWrapper(uploaded_file, encoding='utf-8-sig', newline='')
+    try:
+        reader = csv.reader(text)
+        header = [name.strip().lower() for name in next(reader, [])]
+        positions = {}
+        for column, names in PAYMENT_COLUMNS.items():
+            position = next((header.index(name) for name in names if name in header), None)
+            if position is None:
+                raise PaymentFileError(f'Missing column: {column}')
+            positions[column] = position
+
+        for row in reader:
+            if not any(value.strip() for value in row):
+                continue
+            values = [
+                row[positions[column]].strip() if positions[column] < len(row) else ''
+                for column in PAYMENT_COLUMNS
+            ]
+            yield (reader.line_num, *values)
+    except UnicodeDecodeError:
+        raise PaymentFileError('Payment files must be UTF-8 encoded CSV')
+    except csv.Error as e:
+        raise PaymentFileError(f'Invalid CSV on line {reader.line_num}: {e}')
+    finally:
+        # Leave the uploaded file open for Django to clean up
+        text.detach()
+
+
+def reconcile_payments(rows, user=None, batch_size=BULK_BATCH_SIZE, dry_run=False):
+    """
+    Mark the approved payslips listed in payment rows as paid.
+
+    ``rows`` yields ``(line_number, payslip_number, payment_reference,
+    payment_date)`` tuples, e.g. from ``read_payment_rows``. Returns a report
+    with the number of rows read and payslips paid, and the rows that were
+    invalid, unmatched, already paid, not approved or duplicated.
+    """
+    report = {
+        'rows': 0,
+        'paid': 0,
+        'invalid': [],
+        'unmatched': [],
+        'already_paid': [],
+        'not_approved': [],
+        'duplicates': [],
+    }
+    seen = set()
+    chunk = []
+
+    def flush():
+        paid = _apply_chunk(chunk, report, user, batch_size, dry_run)
+        report['paid'] += paid
+        chunk.clear()
+
+    try:
+        for line, payslip_number, payment_reference, payment_date_value in rows:
+            report['rows'] += 1
+            payment_date = parse_payment_date(payment_date_value)
+            if not payslip_number or payment_date is None:
+                report['invalid'].append({
+                    'line': line, 'payslip_number': payslip_number,
+                    'error': 'Missing payslip number' if not payslip_number else 'Invalid payment date'
+                })
+                continue
+            if payslip_number in seen:
+                report['duplicates'].append({'line': line, 'payslip_number': payslip_number})
+                continue
+            seen.add(payslip_number)
+
+            chunk.append((line, payslip_number, payment_reference, payment_date))
+            if len(chunk) >= batch_size:
+                flush()
+    except PaymentFileError as e:
+        # Earlier chunks are already committed: apply the rows read before
+        # the error too, so the report covers everything up to it
+        if chunk:
+            flush()
+        e.report = report
+        raise
+    if chunk:
+        flush()
+    return report
+
+
+def _apply_chunk(rows, report, user, batch_size, dry_run):
+    """Match one chunk of payment rows and mark its approved payslips paid"""
+    with transaction.atomic():
+        payslips = {
+            payslip.payslip_number: payslip
+            for payslip in Payslip.objects.select_for_update().filter(
+                payslip_number__in=[row[1] for row in rows]
+            )
+        }
+
+        now = timezone.now()
+        totals = PeriodTotals()
+        paid = []
+        for line, payslip_number, payment_reference, payment_date in rows:
+            payslip = payslips.get(payslip_number)
+            if payslip is None:
+                report['unmatched'].append({'line': line, 'payslip_number': payslip_number})
+            elif payslip.status == 'paid':
+                report['already_paid'].append({
+                    'line': line, 'payslip_number': payslip_number,
+                    'payment_reference': payslip.payment_reference,
+                    'payment_date': payslip.payment_date,
+                })
+            elif payslip.status != 'approved':
+                report['not_approved'].append({
+                    'line': line, 'payslip_number': payslip_number, 'status': payslip.status
+                })
+            else:
+                payslip.status = 'paid'
+                payslip.payment_reference = payment_reference
+                payslip.payment_date = payment_date
+                payslip.updated_at = now
+                totals.change(payslip)
+                paid.append(payslip)
+
+        if paid and not dry_run:
+            # A bank run shares one or a few payment dates, so only the
+            # references need a per-row CASE in bulk_update; they are written
+            # first so the history recorded with the status change includes them
+            Payslip.objects.bulk_update(paid, ['payment_reference'], batch_size=batch_size)
+            by_date = {}
+            for payslip in paid:
+                by_date.setdefault(payslip.payment_date, []).append(payslip.pk)
+            for payment_date, payslip_ids in by_date.items():
+                update_with_history(
+                    Payslip.objects.filter(pk__in=payslip_ids), user=user,
+                    change_reason='Payment reconciliation', batch_size=batch_size,
+                    status='paid', payment_date=payment_date, updated_at=now
+                )
+            totals.apply()
+    return len(paid)
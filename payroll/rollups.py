@@ -0,0 +1,69 @@
+"""
+Department payroll rollups.
+
+``DepartmentPayrollRollup`` holds the payslip totals of each department in
+each payroll period, so trend queries read a few rows per month instead of
+every payslip. Payslip writes flag their period with ``rollup_stale`` (in
+the same UPDATE that maintains the period totals), and once they commit the
+rollups of flagged periods are recomputed with one grouped query, so reads
+never write. Payslips are attributed to the employee's department at the time
+of the refresh, and cancelled payslips are left out.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from .models import DepartmentPayrollRollup, PayrollPeriod, Payslip
+
+# Rollup column -> payslip amount it sums
+ROLLUP_AMOUNT_FIELDS = [
+    ('total_gross', 'gross_salary'),
+    ('total_net', 'net_salary'),
+    ('total_taxes', 'tax_amount'),
+    ('total_bonuses', 'total_bonuses'),
+    ('total_deductions', 'total_deductions'),
+]
+
+
+def refresh_department_rollups(periods=None):
+    """
+    Recompute the department rollups of the given periods.
+
+    ``periods`` is a PayrollPeriod queryset and defaults to every period.
+    Returns the number of periods refreshed.
+    """
+    periods = PayrollPeriod.objects.all() if periods is None else periods
+    period_ids = list(periods.values_list('pk', flat=True))
+    if not period_ids:
+        return 0
+
+    aggregates = {
+        rollup_field: Sum(amount_field, default=Decimal('0'))
+        for rollup_field, amount_field in ROLLUP_AMOUNT_FIELDS
+    }
+    with transaction.atomic():
+        # Clear the flag first so a payslip written during the refresh flags it again
+        PayrollPeriod.objects.filter(pk__in=period_ids).update(rollup_stale=False)
+        rows = Payslip.objects.filter(
+            payroll_period_id__in=period_ids
+        ).exclude(status='cancelled').order_by().values(
+            'payroll_period_id', 'employee__department_id'
+        ).annotate(employees=Count('id'), **aggregates)
+
+        DepartmentPayrollRollup.objects.filter(payroll_period_id__in=period_ids).delete()
+        DepartmentPayrollRollup.objects.bulk_create([
+            DepartmentPayrollRollup(
+                payroll_period_id=row.pop('payroll_period_id'),
+                department_id=row.pop('employee__department_id'),
+                **row
+            )
+            for row in rows
+        ])
+    return len(period_ids)
+
+
+def refresh_stale_rollups(periods=None):
+    """Recompute the rollups of the given periods whose payslips changed since"""
+    periods = PayrollPeriod.objects.all() if periods is None else periods
+    return refresh_department_rollups(periods.filter(rollup_stale=True))
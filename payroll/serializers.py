@@ -17,6 +17,7 @@ class PayrollPeriodSerializer(SelectableFieldsSerializer):
     """Serializer for PayrollPeriod model with dynamic field selection"""
     
     total_employees = serializers.ReadOnlyField()
+    status_counts = serializers.ReadOnlyField()
     is_editable = serializers.ReadOnlyField()
     processed_by_name = serializers.CharField(source='processed_by.get_full_name', read_only=True)
     
@@ -25,10 +26,14 @@ class PayrollPeriodSerializer(SelectableFieldsSerializer):
         fields = [
             'id', 'name', 'start_date', 'end_date', 'pay_date', 'frequency', 'status',
             'total_gross_amount', 'total_net_amount', 'total_deductions',
+            'total_taxes', 'total_bonuses', 'status_counts',
             'processed_by', 'processed_by_name', 'processed_date',
             'total_employees', 'is_editable', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['processed_date', 'total_gross_amount', 'total_net_amount', 'total_deductions']
+        read_only_fields = [
+            'processed_date', 'total_gross_amount', 'total_net_amount', 'total_deductions',
+            'total_taxes', 'total_bonuses'
+        ]
 
     def validate(self, data):
         """Validate payroll period dates"""
@@ -152,9 +157,8 @@ class PayslipSerializer(SelectableFieldsSerializer):
     approved_by_name = serializers.CharField(source='approved_by.get_full_name', read_only=True)
     
     # Properties
-    daily_salary = serializers.ReadOnlyField()
-    overtime_pay = serializers.ReadOnlyField()
-    leave_deduction = serializers.ReadOnlyField()
+    is_stale = serializers.ReadOnlyField()
+    dirty_inputs = serializers.ReadOnlyField()
     
     # Related objects
     deductions = PayslipDeductionSerializer(many=True, read_only=True)
@@ -171,9 +175,13 @@ class PayslipSerializer(SelectableFieldsSerializer):
             'net_salary', 'payment_method', 'payment_reference', 'payment_date',
             'approved_by', 'approved_by_name', 'approved_date', 'notes',
             'employee_notes', 'daily_salary', 'overtime_pay', 'leave_deduction',
+            'is_stale', 'dirty_inputs', 'calculated_at',
             'deductions', 'bonuses', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['payslip_number', 'approved_date']
+        read_only_fields = [
+            'payslip_number', 'approved_date', 'daily_salary', 'overtime_pay',
+            'leave_deduction', 'calculated_at'
+        ]
 
     def validate(self, data):
         """Validate payslip data"""
@@ -353,3 +361,45 @@ class PayslipCalculationSerializer(serializers.Serializer):
         except PayrollPeriod.DoesNotExist:
             raise serializers.ValidationError("Payroll period not found")
         return value
+
+
+class SalaryAdjustmentSerializer(serializers.Serializer):
+    """Hypothetical salary change for a department (or everyone)"""
+    
+    department_id = serializers.IntegerField(required=False, allow_null=True)
+    rate = serializers.DecimalField(
+        max_digits=6, decimal_places=4,
+        help_text="Salary change as decimal (e.g., 0.04 for a 4% raise)"
+    )
+
+
+class SimulatedTaxBracketSerializer(serializers.Serializer):
+    """Hypothetical tax bracket"""
+    
+    min_amount = serializers.DecimalField(max_digits=12, decimal_places=2)
+    max_amount = serializers.DecimalField(
+        max_digits=12, decimal_places=2, required=False, allow_null=True
+    )
+    tax_rate = serializers.DecimalField(max_digits=5, decimal_places=4)
+    fixed_amount = serializers.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    def validate_tax_rate(self, value):
+        """Validate tax rate is a fraction"""
+        if value < 0 or value > 1:
+            raise serializers.ValidationError("Tax rate must be between 0 and 1")
+        return value
+
+
+class SimulatedDeductionSerializer(serializers.Serializer):
+    """Hypothetical amount or rate for a mandatory deduction type"""
+    
+    deduction_type_id = serializers.IntegerField()
+    default_amount = serializers.DecimalField(max_digits=10, decimal_places=4)
+
+
+class PayrollSimulationSerializer(serializers.Serializer):
+    """Serializer for payroll what-if simulation requests"""
+    
+    salary_adjustments = SalaryAdjustmentSerializer(many=True, required=False)
+    tax_brackets = SimulatedTaxBracketSerializer(many=True, required=False)
+    deduction_rates = SimulatedDeductionSerializer(many=True, required=False)
@@ -0,0 +1,204 @@
+"""
+Signal handlers for payroll app.
+"""
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+from employees.models import Employee
+from leaves.models import LeaveRequest
+from .models import (
+    TaxBracket, PayrollConfiguration, PayrollPeriod, CompensationHistory, Payslip, PayslipBonus, PayslipDeduction
+)
+from .analytics import DASHBOARD_SCOPE, invalidate_analytics, invalidate_period_analytics
+from .compensation import forget_salary_timeline, invalidate_salary_timeline
+from .processing import CLOSED_PERIOD_STATUSES, configured_tax_scope, mark_payslips_dirty
+from .snapshots import delete_period_snapshot
+from .tax import clear_tax_table_cache
+from .totals import record_payslip_saved, record_payslip_deleted
+
+
+@receiver(post_save, sender=TaxBracket)
+@receiver(post_delete, sender=TaxBracket)
+def invalidate_tax_tables(sender, instance, **kwargs):
+    """
+    Drop compiled tax tables in this and every other worker when a tax bracket changes.
+    """
+    clear_tax_table_cache()
+    # Bump again once committed so no worker keeps a table compiled before it
+    transaction.on_commit(clear_tax_table_cache)
+
+
+@receiver(post_save, sender=CompensationHistory)
+@receiver(post_delete, sender=CompensationHistory)
+def invalidate_salary_timelines(sender, instance, **kwargs):
+    """
+    Rebuild the employee's cached salary timeline when their compensation history changes.
+    """
+    employee_id = instance.employee_id
+    # Reload it here right away, and everywhere once the change is committed
+    forget_salary_timeline(employee_id)
+    transaction.on_commit(lambda: invalidate_salary_timeline(employee_id))
+
+
+@receiver(post_save, sender=PayrollConfiguration)
+@receiver(post_delete, sender=PayrollConfiguration)
+def invalidate_payroll_configuration(sender, instance, **kwargs):
+    """
+    Refresh cached payroll configuration in this and every other worker.
+    """
+    PayrollConfiguration.objects.clear_cache()
+    # Bump again once committed so no worker keeps a pre-commit copy
+    transaction.on_commit(PayrollConfiguration.objects.clear_cache)
+
+
+@receiver(post_save, sender=Payslip)
+def update_period_totals_on_save(sender, instance, created, raw=False, **kwargs):
+    """
+    Add the payslip's changed amounts and status to its period totals.
+    """
+    if raw:
+        return
+    record_payslip_saved(instance, created)
+
+
+@receiver(post_delete, sender=Payslip)
+def update_period_totals_on_delete(sender, instance, **kwargs):
+    """
+    Remove a deleted payslip from its period totals.
+    """
+    record_payslip_deleted(instance)
+
+
+def _mark_payslip_dirty(instance, flag):
+    """Flag a changed input on the payslip of a bonus or deduction"""
+    mark_payslips_dirty(Payslip.objects.filter(pk=instance.payslip_id), flag)
+    # Keep an already loaded payslip in step so saving it does not drop the flag
+    if type(instance).payslip.is_cached(instance):
+        payslip = instance.payslip
+        if payslip.status in ['draft', 'calculated']:
+            payslip.dirty_flags |= flag
+
+
+@receiver(post_save, sender=PayslipBonus)
+@receiver(post_delete, sender=PayslipBonus)
+def mark_bonuses_dirty(sender, instance, raw=False, **kwargs):
+    """
+    Mark a payslip for recalculation when one of its bonuses changes.
+    """
+    if not raw:
+        _mark_payslip_dirty(instance, Payslip.DIRTY_BONUSES)
+
+
+@receiver(post_save, sender=PayslipDeduction)
+@receiver(post_delete, sender=PayslipDeduction)
+def mark_deductions_dirty(sender, instance, raw=False, **kwargs):
+    """
+    Mark a payslip for recalculation when one of its deductions changes.
+    """
+    if not raw:
+        _mark_payslip_dirty(instance, Payslip.DIRTY_DEDUCTIONS)
+
+
+@receiver(pre_save, sender=LeaveRequest)
+def remember_previous_leave(sender, instance, raw=False, **kwargs):
+    """
+    Remember what a leave request covered before it is changed.
+    """
+    instance._previous_leave = None
+    if not raw and instance.pk:
+        instance._previous_leave = LeaveRequest.objects.filter(pk=instance.pk).values_list(
+            'employee_id', 'start_date', 'end_date', 'leave_type__is_paid'
+        ).first()
+
+
+@receiver(post_save, sender=LeaveRequest)
+@receiver(post_delete, sender=LeaveRequest)
+def mark_leave_dirty(sender, instance, raw=False, **kwargs):
+    """
+    Mark payslips overlapping an unpaid leave request, before and after the change, for recalculation.
+    """
+    if raw:
+        return
+    covered = []
+    if not instance.leave_type.is_paid:
+        covered.append((instance.employee_id, instance.start_date, instance.end_date))
+    previous = getattr(instance, '_previous_leave', None)
+    if previous is not None and not previous[3]:
+        covered.append(previous[:3])
+
+    overlapping = Q()
+    for employee_id, start_date, end_date in covered:
+        overlapping |= Q(
+            employee_id=employee_id,
+            payroll_period__start_date__lte=end_date,
+            payroll_period__end_date__gte=start_date
+        )
+    if covered:
+        mark_payslips_dirty(Payslip.objects.filter(overlapping), Payslip.DIRTY_LEAVE)
+
+
+@receiver(pre_save, sender=TaxBracket)
+def remember_previous_tax_scope(sender, instance, raw=False, **kwargs):
+    """
+    Remember the country and year a tax bracket applied to before it is changed.
+    """
+    instance._previous_tax_scope = None
+    if not raw and instance.pk:
+        instance._previous_tax_scope = TaxBracket.objects.filter(pk=instance.pk).values_list(
+            'country', 'year'
+        ).first()
+
+
+@receiver(post_save, sender=TaxBracket)
+@receiver(post_delete, sender=TaxBracket)
+def mark_tax_dirty(sender, instance, raw=False, **kwargs):
+    """
+    Mark open payslips for recalculation when a bracket of the configured tax year changes.
+    """
+    if raw:
+        return
+    scopes = {(instance.country, int(instance.year))}
+    previous = getattr(instance, '_previous_tax_scope', None)
+    if previous is not None:
+        scopes.add(previous)
+    if configured_tax_scope(PayrollConfiguration.objects.get_current()) in scopes:
+        mark_payslips_dirty(
+            Payslip.objects.exclude(payroll_period__status__in=CLOSED_PERIOD_STATUSES),
+            Payslip.DIRTY_TAX
+        )
+
+
+@receiver(post_save, sender=PayrollPeriod)
+@receiver(post_delete, sender=PayrollPeriod)
+def invalidate_period_analytics_on_change(sender, instance, **kwargs):
+    """
+    Make cached analytics of a changed period stale.
+    """
+    invalidate_period_analytics([instance.pk])
+
+
+@receiver(post_save, sender=Employee)
+@receiver(post_delete, sender=Employee)
+def invalidate_dashboard_on_employee_change(sender, instance, **kwargs):
+    """
+    Make the cached dashboard stale when headcount or salaries may have changed.
+    """
+    invalidate_analytics(DASHBOARD_SCOPE)
+
+
+@receiver(post_save, sender=PayrollPeriod)
+def discard_reopened_period_snapshot(sender, instance, raw=False, **kwargs):
+    """
+    Drop the snapshot of a period that is no longer finalized.
+    """
+    if not raw and instance.status != 'finalized':
+        delete_period_snapshot(instance.pk)
+
+
+@receiver(post_delete, sender=PayrollPeriod)
+def delete_removed_period_snapshot(sender, instance, **kwargs):
+    """
+    Drop the snapshot of a deleted period.
+    """
+    delete_period_snapshot(instance.pk)
@@ -0,0 +1,169 @@
+"""
+Vectorized payroll what-if simulation.
+
+Loads active employee salaries, the compiled tax table and the mandatory
+deductions into NumPy arrays, applies hypothetical adjustments and returns
+gross, tax, deduction and net totals by department. Nothing is written to
+the database.
+"""
+from copy import copy
+from decimal import Decimal
+
+import numpy as np
+from django.utils import timezone
+
+from employees.models import Employee
+from .models import PayrollConfiguration, TaxBracket, DeductionType
+from .tax import TaxTable, get_tax_table
+
+UNASSIGNED_DEPARTMENT = -1
+
+
+def tax_for_array(tax_table, gross):
+    """Evaluate a compiled tax table for every amount in a float array"""
+    if not tax_table.breakpoints:
+        return np.zeros_like(gross)
+
+    breakpoints = np.array(tax_table.breakpoints, dtype=np.float64)
+    base_taxes = np.array(tax_table.base_taxes, dtype=np.float64)
+    marginal_rates = np.array(tax_table.marginal_rates, dtype=np.float64)
+
+    # Same lookup as TaxTable.tax_for: the last breakpoint strictly below the amount
+    index = np.searchsorted(breakpoints, gross, side='left') - 1
+    safe_index = np.clip(index, 0, None)
+    taxes = base_taxes[safe_index] + marginal_rates[safe_index] * (gross - breakpoints[safe_index])
+    return np.where(index >= 0, taxes, 0.0)
+
+
+def deductions_for_array(deduction_types, salaries):
+    """Total mandatory deductions for every salary in a float array"""
+    total = np.zeros_like(salaries)
+    for deduction_type in deduction_types:
+        fixed_amount, rate = deduction_type.amount_components()
+        total += np.round(float(fixed_amount) + salaries * float(rate), 2)
+    return total
+
+
+class PayrollSimulation:
+    """What-if payroll model for the whole active workforce"""
+
+    def __init__(self):
+        config = PayrollConfiguration.objects.get_current()
+        country = config.default_country if config else 'Mexico'
+        year = config.tax_year if config else timezone.now().year
+
+        self.country = country
+        self.tax_table = get_tax_table(country, year)
+        self.mandatory_deductions = list(
+            DeductionType.objects.filter(is_mandatory=True, is_active=True)
+        )
+
+        rows = list(
+            Employee.objects.filter(employment_status='active')
+            .values_list('department_id', 'department__name', 'salary')
+        )
+        self.department_ids = np.fromiter(
+            (row[0] if row[0] is not None else UNASSIGNED_DEPARTMENT for row in rows),
+            dtype=np.int64, count=len(rows)
+        )
+        self.salaries = np.fromiter(
+            (float(row[2] or 0) for row in rows), dtype=np.float64, count=len(rows)
+        )
+        self.department_names = {row[0]: row[1] for row in rows}
+
+        self.departments, self.department_index = np.unique(
+            self.department_ids, return_inverse=True
+        )
+
+    def run(self, salary_adjustments=None, tax_brackets=None, deduction_rates=None):
+        """
+        Compare current payroll costs with a hypothetical scenario.
+
+        ``salary_adjustments`` is a list of ``{'department_id', 'rate'}``
+        dicts (0.04 is a 4% raise, no department means everyone).
+        ``tax_brackets`` replaces the bracket table with a list of
+        ``{'min_amount', 'max_amount', 'tax_rate', 'fixed_amount'}`` dicts.
+        ``deduction_rates`` is a list of ``{'deduction_type_id',
+        'default_amount'}`` overrides for mandatory deductions.
+        """
+        baseline = self._calculate(
+            self.salaries, self.tax_table, self.mandatory_deductions
+        )
+
+        salaries = self.salaries.copy()
+        for adjustment in salary_adjustments or []:
+            factor = 1 + float(adjustment['rate'])
+            department_id = adjustment.get('department_id')
+            if department_id is None:
+                salaries *= factor
+            else:
+                salaries[self.department_ids == department_id] *= factor
+
+        tax_table = self.tax_table
+        if tax_brackets is not None:
+            tax_table = TaxTable([
+                TaxBracket(
+                    country=self.country,
+                    min_amount=Decimal(str(bracket['min_amount'])),
+                    max_amount=(
+                        Decimal(str(bracket['max_amount']))
+                        if bracket.get('max_amount') is not None else None
+                    ),
+                    tax_rate=Decimal(str(bracket['tax_rate'])),
+                    fixed_amount=Decimal(str(bracket.get('fixed_amount') or 0))
+                )
+                for bracket in tax_brackets
+            ])
+
+        overrides = {
+            override['deduction_type_id']: Decimal(str(override['default_amount']))
+            for override in deduction_rates or []
+        }
+        deduction_types = []
+        for deduction_type in self.mandatory_deductions:
+            if deduction_type.id in overrides:
+                deduction_type = copy(deduction_type)
+                deduction_type.default_amount = overrides[deduction_type.id]
+            deduction_types.append(deduction_type)
+
+        scenario = self._calculate(salaries, tax_table, deduction_types)
+
+        return {
+            'employee_count': int(self.salaries.size),
+            'baseline': baseline,
+            'scenario': scenario,
+            'difference': {
+                key: round(scenario['totals'][key] - baseline['totals'][key], 2)
+                for key in baseline['totals']
+            }
+        }
+
+    def _calculate(self, gross, tax_table, deduction_types):
+        """Calculate totals overall and by department for a set of salaries"""
+        tax = tax_for_array(tax_table, gross)
+        deductions = deductions_for_array(deduction_types, gross)
+        net = gross - deductions - tax
+
+        columns = {'gross': gross, 'tax': tax, 'deductions': deductions, 'net': net}
+        size = self.departments.size
+        headcount = np.bincount(self.department_index, minlength=size)
+        sums = {
+            key: np.bincount(self.department_index, weights=values, minlength=size)
+            for key, values in columns.items()
+        }
+
+        departments = []
+        for position, department_id in enumerate(self.departments.tolist()):
+            department_id = None if department_id == UNASSIGNED_DEPARTMENT else department_id
+            row = {
+                'department_id': department_id,
+                'department': self.department_names.get(department_id),
+                'employees': int(headcount[position]),
+            }
+            row.update({key: round(float(values[position]), 2) for key, values in sums.items()})
+            departments.append(row)
+
+        return {
+            'totals': {key: round(float(values.sum()), 2) for key, values in columns.items()},
+            'departments': departments
+        }
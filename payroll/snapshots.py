@@ -0,0 +1,117 @@
+"""
+Columnar snapshots of finalized payroll periods.
+
+Payslip amounts of a finalized period never change, so finalization writes
+them once to a NumPy ``.npy`` file under ``MEDIA_ROOT/payroll_snapshots``.
+Analytics read the file with ``mmap_mode='r'``, which maps it into memory
+without copying or touching the database.
+"""
+import os
+import tempfile
+
+import numpy as np
+from django.conf import settings
+
+from .export import EXPORT_CHUNK_SIZE
+
+SNAPSHOT_DIR = 'payroll_snapshots'
+
+UNASSIGNED_DEPARTMENT = -1
+
+SNAPSHOT_DTYPE = np.dtype([
+    ('payslip_id', np.int64),
+    ('employee_id', np.int64),
+    ('department_id', np.int64),
+    ('gross', np.float64),
+    ('tax', np.float64),
+    ('deductions', np.float64),
+    ('bonuses', np.float64),
+    ('net', np.float64),
+])
+
+AMOUNT_COLUMNS = ['gross', 'tax', 'deductions', 'bonuses', 'net']
+
+
+def snapshot_path(period_id):
+    """Path of the snapshot file for a payroll period"""
+    return os.path.join(settings.MEDIA_ROOT, SNAPSHOT_DIR, f'period_{period_id}.npy')
+
+
+def write_period_snapshot(payroll_period):
+    """Write the payslips of a payroll period to its snapshot file and return the path"""
+    rows = payroll_period.payslips.order_by('id').values_list(
+        'id', 'employee_id', 'employee__department_id', 'gross_salary',
+        'tax_amount', 'total_deductions', 'total_bonuses', 'net_salary'
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    snapshot = np.fromiter(
+        (
+            (
+                payslip_id, employee_id,
+                UNASSIGNED_DEPARTMENT if department_id is None else department_id,
+                float(gross), float(tax), float(deductions), float(bonuses), float(net)
+            )
+            for payslip_id, employee_id, department_id, gross, tax, deductions, bonuses, net in rows
+        ),
+        dtype=SNAPSHOT_DTYPE
+    )
+
+    path = snapshot_path(payroll_period.pk)
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    # Write to a temporary file first so readers never see a partial snapshot
+    with tempfile.NamedTemporaryFile(dir=directory, suffix='.npy', delete=False) as temporary:
+        np.save(temporary, snapshot)
+    os.replace(temporary.name, path)
+    return path
+
+
+def load_period_snapshot(payroll_period):
+    """
+    Memory-map the snapshot of a finalized payroll period.
+
+    A missing snapshot is written first. Returns None for periods that are
+    not finalized, since their payslips can still change.
+    """
+    if payroll_period.status != 'finalized':
+        return None
+    path = snapshot_path(payroll_period.pk)
+    if not os.path.exists(path):
+        write_period_snapshot(payroll_period)
+    return np.load(path, mmap_mode='r')
+
+
+def delete_period_snapshot(period_id):
+    """Remove the snapshot file of a payroll period if it exists"""
+    try:
+        os.remove(snapshot_path(period_id))
+    except FileNotFoundError:
+        pass
+
+
+def snapshot_totals(snapshot):
+    """Headcount and amount totals of a snapshot"""
+    totals = {'employees': int(snapshot.size)}
+    totals.update({
+        column: round(float(snapshot[column].sum()), 2) for column in AMOUNT_COLUMNS
+    })
+    return totals
+
+
+def snapshot_department_totals(snapshot):
+    """Headcount and amount totals per department id (None for unassigned)"""
+    departments, index = np.unique(snapshot['department_id'], return_inverse=True)
+    headcount = np.bincount(index, minlength=departments.size)
+    sums = {
+        column: np.bincount(index, weights=snapshot[column], minlength=departments.size)
+        for column in AMOUNT_COLUMNS
+    }
+
+    rows = []
+    for position, department_id in enumerate(departments.tolist()):
+        row = {
+            'department_id': None if department_id == UNASSIGNED_DEPARTMENT else department_id,
+            'employees': int(headcount[position]),
+        }
+        row.update({column: round(float(values[position]), 2) for column, values in sums.items()})
+        rows.append(row)
+    return rows
@@ -0,0 +1,123 @@
+"""
+Compiled progressive tax tables.
+
+A ``TaxTable`` turns the active ``TaxBracket`` rows for a country/year into a
+sorted list of breakpoints with the cumulative tax owed at each one, so the
+tax for any income is a bisect plus one multiply. Tables are cached per
+process under a version stamp shared through Django's cache; saving or
+deleting a tax bracket bumps the stamp, so every worker recompiles its
+tables on the next lookup.
+"""
+import uuid
+from bisect import bisect_left
+from decimal import Decimal
+
+from django.core.cache import cache
+
+from .models import TaxBracket
+
+TAX_TABLE_VERSION_CACHE_KEY = 'payroll:tax-tables:version'
+
+# Process-local (version, table) pairs keyed by (country, year)
+_tax_tables = {}
+
+
+class TaxTable:
+    """Progressive tax table compiled from a set of tax brackets"""
+
+    def __init__(self, brackets):
+        self.brackets = []
+        for bracket in sorted(brackets, key=lambda bracket: bracket.min_amount):
+            # A zero max amount behaves like an open-ended bracket
+            max_amount = bracket.max_amount or None
+            if max_amount is not None and max_amount <= bracket.min_amount:
+                continue  # Never taxes anything
+            self.brackets.append(
+                (bracket, bracket.min_amount, max_amount, bracket.tax_rate, bracket.fixed_amount)
+            )
+
+        self.breakpoints = sorted(
+            {min_amount for _, min_amount, _, _, _ in self.brackets}
+            | {max_amount for _, _, max_amount, _, _ in self.brackets if max_amount is not None}
+        )
+
+        # Tax owed just above each breakpoint and the marginal rate up to the next one
+        self.base_taxes = []
+        self.marginal_rates = []
+        for index, point in enumerate(self.breakpoints):
+            next_point = (
+                self.breakpoints[index + 1] if index + 1 < len(self.breakpoints) else None
+            )
+            base_tax = Decimal('0')
+            marginal_rate = Decimal('0')
+            for _, min_amount, max_amount, tax_rate, fixed_amount in self.brackets:
+                if min_amount > point:
+                    continue
+                covered_max = point if max_amount is None else min(point, max_amount)
+                base_tax += (covered_max - min_amount) * tax_rate + fixed_amount
+                if max_amount is None or (next_point is not None and max_amount >= next_point):
+                    marginal_rate += tax_rate
+            self.base_taxes.append(base_tax)
+            self.marginal_rates.append(marginal_rate)
+
+    def tax_for(self, amount):
+        """Return the total tax owed for an amount"""
+        index = bisect_left(self.breakpoints, amount)
+        if index == 0:
+            return Decimal('0')
+        index -= 1
+        return self.base_taxes[index] + self.marginal_rates[index] * (amount - self.breakpoints[index])
+
+    def tax_for_many(self, amounts):
+        """Return the tax owed for each amount in a sequence"""
+        breakpoints = self.breakpoints
+        base_taxes = self.base_taxes
+        marginal_rates = self.marginal_rates
+        taxes = []
+        for amount in amounts:
+            index = bisect_left(breakpoints, amount) - 1
+            if index < 0:
+                taxes.append(Decimal('0'))
+            else:
+                taxes.append(base_taxes[index] + marginal_rates[index] * (amount - breakpoints[index]))
+        return taxes
+
+    def breakdown(self, amount):
+        """Return the per-bracket taxable amount and tax for an amount"""
+        rows = []
+        for bracket, min_amount, max_amount, tax_rate, fixed_amount in self.brackets:
+            if amount <= min_amount:
+                continue
+            taxable_in_bracket = (amount if max_amount is None else min(amount, max_amount)) - min_amount
+            rows.append({
+                'bracket': str(bracket),
+                'taxable_amount': taxable_in_bracket,
+                'tax_rate': tax_rate,
+                'tax_amount': taxable_in_bracket * tax_rate + fixed_amount
+            })
+        return rows
+
+
+def get_tax_table(country, year):
+    """Return the cached tax table for a country and year, compiling it if needed"""
+    version = cache.get(TAX_TABLE_VERSION_CACHE_KEY)
+    if version is None:
+        cache.add(TAX_TABLE_VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+        version = cache.get(TAX_TABLE_VERSION_CACHE_KEY)
+
+    key = (country, int(year))
+    cached = _tax_tables.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    table = TaxTable(
+        TaxBracket.objects.filter(country=country, year=year, is_active=True)
+    )
+    _tax_tables[key] = (version, table)
+    return table
+
+
+def clear_tax_table_cache():
+    """Drop the compiled tax tables and tell other workers to recompile theirs"""
+    _tax_tables.clear()
+    cache.set(TAX_TABLE_VERSION_CACHE_KEY, uuid.uuid4().hex, None)
@@ -1,3 +1,1424 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import shutil
+import tempfile
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Count, Sum
+from django.http import HttpResponse
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+from rest_framework import status
+from decimal import Decimal
+from datetime import date
+from io import StringIO
+
+from employees.models import Department, Employee
+from leaves.models import Holiday, LeaveType, LeaveRequest
+from .models import (
+    PayrollPeriod, Payslip, PayslipDeduction, PayrollConfiguration, TaxBracket,
+    DeductionType, BonusType, CompensationHistory, DepartmentPayrollRollup
+)
+from .tax import (
+    TAX_TABLE_VERSION_CACHE_KEY, TaxTable, get_tax_table, clear_tax_table_cache
+)
+from .simulation import PayrollSimulation
+from .benchmarks import BenchmarkError, check_response, compare_results, run_benchmarks
+from .compensation import (
+    salary_as_of, salaries_as_of, clear_salary_timeline_cache, get_salary_timelines,
+    invalidate_salary_timeline
+)
+from .processing import generate_payslips, unpaid_leave_days_by_employee
+from .snapshots import load_period_snapshot, snapshot_path
+
+User = get_user_model()
+
+# Stands in for a shared cache such as Redis, whose lookups do not go through
+# the database, so query counts only cover payroll's own queries
+LOCAL_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+class PayrollTestDataMixin:
+    """Shared fixtures for payroll tests"""
+
+    def setUp(self):
+        super().setUp()
+        # Process-level caches outlive the per-test transaction rollback
+        cache.clear()
+        clear_tax_table_cache()
+        PayrollConfiguration.objects.clear_cache()
+        clear_salary_timeline_cache()
+
+    def create_employees(self, count, salary=Decimal('20000.00'), department=None):
+        """Create users (and their auto-created employee profiles)"""
+        department = department or Department.objects.get_or_create(name='Finance')[0]
+        employees = []
+        offset = User.objects.count()
+        for index in range(offset, offset + count):
+            user = User.objects.create_user(
+                username=f'employee{index}',
+                email=f'employee{index}@example.com',
+                first_name='Test',
+                last_name=f'Employee{index}'
+            )
+            employee = user.employee_profile
+            employee.salary = salary
+            employee.department = department
+            employee.save()
+            employees.append(employee)
+        return employees
+
+    def create_payroll_rules(self):
+        """Create configuration, tax brackets and mandatory deductions"""
+        PayrollConfiguration.objects.create(tax_year=2025)
+        TaxBracket.objects.create(
+            name='Bracket 1', year=2025, min_amount=Decimal('0'),
+            max_amount=Decimal('10000'), tax_rate=Decimal('0.10')
+        )
+        TaxBracket.objects.create(
+            name='Bracket 2', year=2025, min_amount=Decimal('10000'),
+            tax_rate=Decimal('0.20'), fixed_amount=Decimal('100')
+        )
+        DeductionType.objects.create(
+            name='Social Security', calculation_method='percentage',
+            default_amount=Decimal('0.0625'), is_mandatory=True
+        )
+        DeductionType.objects.create(
+            name='Union Fee', calculation_method='fixed',
+            default_amount=Decimal('150'), is_mandatory=True
+        )
+
+    def create_unpaid_leave(self, employee, start_date, end_date,
+                            duration_type='full_day', total_days=Decimal('1')):
+        leave_type = LeaveType.objects.get_or_create(
+            name='Unpaid Leave', defaults={'is_paid': False}
+        )[0]
+        return LeaveRequest.objects.create(
+            employee=employee, leave_type=leave_type,
+            start_date=start_date, end_date=end_date, duration_type=duration_type,
+            total_days=total_days, reason='Personal', status='approved'
+        )
+
+    def create_period(self, **kwargs):
+        defaults = {
+            'name': 'January 2025',
+            'start_date': date(2025, 1, 1),
+            'end_date': date(2025, 1, 31),
+            'pay_date': date(2025, 2, 1),
+        }
+        defaults.update(kwargs)
+        return PayrollPeriod.objects.create(**defaults)
+
+
+class ProcessPayrollTest(PayrollTestDataMixin, APITestCase):
+    """Test bulk payslip generation through the process_payroll action"""
+
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user(
+            username='payroll_admin', email='admin@example.com', password='testpass123'
+        )
+        self.client.force_authenticate(user=self.admin)
+
+    def process(self, period):
+        return self.client.post(f'/api/payroll/payroll-periods/{period.id}/process_payroll/')
+
+    def test_process_payroll_creates_payslips(self):
+        """Test a payslip is created for every active employee"""
+        self.create_employees(3)
+        period = self.create_period()
+
+        response = self.process(period)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        active_count = Employee.objects.filter(employment_status='active').count()
+        self.assertEqual(response.data['payslips_created'], active_count)
+        self.assertEqual(response.data['payslips_skipped'], 0)
+        self.assertEqual(period.payslips.count(), active_count)
+        numbers = set(period.payslips.values_list('payslip_number', flat=True))
+        self.assertEqual(len(numbers), active_count)
+
+    def test_process_payroll_records_history(self):
+        """Test the period and every new payslip get history rows"""
+        self.create_employees(3)
+        period = self.create_period()
+
+        self.process(period)
+
+        self.assertEqual(
+            list(period.history.order_by('history_id').values_list('status', flat=True)),
+            ['draft', 'processing', 'processed']
+        )
+        self.assertEqual(
+            Payslip.history.filter(payroll_period_id=period.id).count(), period.payslips.count()
+        )
+
+    def test_process_payroll_skips_existing_payslips(self):
+        """Test employees that already have a payslip are skipped"""
+        employee = self.create_employees(2)[0]
+        period = self.create_period()
+        Payslip.objects.create(
+            employee=employee, payroll_period=period,
+            payslip_number='EXISTING-1', base_salary=Decimal('1000')
+        )
+
+        response = self.process(period)
+
+        self.assertEqual(response.data['payslips_skipped'], 1)
+        self.assertEqual(
+            period.payslips.count(),
+            Employee.objects.filter(employment_status='active').count()
+        )
+
+    def test_process_payroll_skips_numbers_after_deleted_payslip(self):
+        """Test a deleted payslip's gap does not make new numbers collide"""
+        employees = self.create_employees(3)
+        period = self.create_period()
+        payslips = [
+            Payslip.objects.create(
+                employee=employee, payroll_period=period,
+                payslip_number=f'PAY202501{index:04d}', base_salary=Decimal('1000')
+            )
+            for index, employee in enumerate(employees, start=1)
+        ]
+        payslips[1].delete()
+
+        response = self.process(period)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        new_numbers = period.payslips.exclude(
+            pk__in=[payslips[0].pk, payslips[2].pk]
+        ).values_list('payslip_number', flat=True)
+        self.assertTrue(new_numbers)
+        self.assertTrue(all(number > 'PAY2025010003' for number in new_numbers))
+
+    def test_process_payroll_query_count_is_constant(self):
+        """Test the number of queries does not grow with headcount"""
+        self.create_employees(2)
+        small_period = self.create_period()
+        PayrollConfiguration.objects.get_current()  # Warm the configuration cache
+        with CaptureQueriesContext(connection) as small_run:
+            self.process(small_period)
+
+        self.create_employees(20)
+        large_period = self.create_period(
+            name='February 2025',
+            start_date=date(2025, 2, 1),
+            end_date=date(2025, 2, 28),
+            pay_date=date(2025, 3, 1)
+        )
+        with CaptureQueriesContext(connection) as large_run:
+            self.process(large_period)
+
+        self.assertEqual(len(small_run), len(large_run))
+
+
+class CalculateAllTest(PayrollTestDataMixin, APITestCase):
+    """Test period-wide batch calculation"""
+
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user(
+            username='payroll_admin', email='admin@example.com', password='testpass123'
+        )
+        self.client.force_authenticate(user=self.admin)
+        self.create_payroll_rules()
+        self.employees = self.create_employees(3)
+        self.period = self.create_period()
+        self.client.post(f'/api/payroll/payroll-periods/{self.period.id}/process_payroll/')
+
+    def test_batch_matches_single_payslip_calculation(self):
+        """Test calculate_all produces the same amounts as calculate"""
+        first, second, third = [
+            Payslip.objects.get(employee=employee, payroll_period=self.period)
+            for employee in self.employees
+        ]
+        for employee in (first.employee, second.employee):
+            self.create_unpaid_leave(employee, date(2025, 1, 10), date(2025, 1, 12))
+
+        self.client.post(f'/api/payroll/payslips/{first.id}/calculate/')
+        first.refresh_from_db()
+
+        response = self.client.post(
+            f'/api/payroll/payroll-periods/{self.period.id}/calculate_all/'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['payslips_calculated'], self.period.payslips.count())
+        second.refresh_from_db()
+        third.refresh_from_db()
+        recalculated_first = Payslip.objects.get(pk=first.pk)
+        for field in ('gross_salary', 'total_deductions', 'tax_amount', 'net_salary',
+                      'unpaid_leave_days', 'daily_salary', 'leave_deduction'):
+            self.assertEqual(getattr(second, field), getattr(first, field))
+            self.assertEqual(getattr(recalculated_first, field), getattr(first, field))
+        self.assertEqual(second.status, 'calculated')
+        self.assertEqual(third.unpaid_leave_days, Decimal('0'))
+        self.assertGreater(second.tax_amount, 0)
+        self.assertEqual(first.deductions.count(), 2)
+        self.assertEqual(second.deductions.count(), 2)
+
+    def test_payslips_with_equal_results_are_written_together(self):
+        """Test grouped updates store each payslip's own amounts"""
+        self.create_employees(40, salary=Decimal('18000.00'))
+        senior = self.create_employees(1, salary=Decimal('35000.00'))[0]
+        generate_payslips(self.period)
+
+        self.client.post(f'/api/payroll/payroll-periods/{self.period.id}/calculate_all/')
+
+        payslips = list(self.period.payslips.filter(base_salary__in=[18000, 35000]))
+        self.assertEqual(len(payslips), 41)
+        for payslip in payslips:
+            self.client.post(f'/api/payroll/payslips/{payslip.id}/calculate/')
+            recalculated = Payslip.objects.get(pk=payslip.pk)
+            self.assertEqual(payslip.status, 'calculated')
+            for field in ('gross_salary', 'total_deductions', 'tax_amount', 'net_salary'):
+                self.assertEqual(getattr(payslip, field), getattr(recalculated, field))
+        net_salaries = {payslip.employee_id == senior.id: payslip.net_salary for payslip in payslips}
+        self.assertGreater(net_salaries[True], net_salaries[False])
+
+    def test_derived_amounts_are_stored(self):
+        """Test daily salary, overtime pay and leave deduction are stored and queryable"""
+        payslip = Payslip.objects.get(employee=self.employees[0], payroll_period=self.period)
+        payslip.overtime_hours = Decimal('10')
+        payslip.save()
+        self.create_unpaid_leave(payslip.employee, date(2025, 1, 10), date(2025, 1, 11))
+
+        self.client.post(f'/api/payroll/payroll-periods/{self.period.id}/calculate_all/')
+
+        payslip.refresh_from_db()
+        self.assertEqual(payslip.daily_salary, Decimal('666.67'))
+        self.assertEqual(payslip.overtime_pay, Decimal('1250.00'))
+        self.assertEqual(payslip.leave_deduction, Decimal('1333.33'))
+        self.assertEqual(
+            payslip.gross_salary,
+            payslip.base_salary + payslip.overtime_pay - payslip.leave_deduction
+        )
+        self.assertEqual(
+            list(self.period.payslips.filter(leave_deduction__gt=0).values_list('pk', flat=True)),
+            [payslip.pk]
+        )
+
+
+class UnpaidLeaveDaysTest(PayrollTestDataMixin, TestCase):
+    """Test batch unpaid leave computation for a period"""
+
+    def setUp(self):
+        super().setUp()
+        self.employees = self.create_employees(4)
+        self.period = self.create_period()
+
+    def test_overlap_and_half_days(self):
+        """Test leave is clipped to the period and half days count half"""
+        first, second, third, fourth = self.employees
+        self.create_unpaid_leave(first, date(2024, 12, 30), date(2025, 1, 2))
+        self.create_unpaid_leave(first, date(2025, 1, 20), date(2025, 1, 20))
+        self.create_unpaid_leave(second, date(2025, 1, 6), date(2025, 1, 9), 'half_day_morning')
+        self.create_unpaid_leave(
+            third, date(2025, 1, 31), date(2025, 2, 1), 'hours', Decimal('0.5')
+        )
+        self.create_unpaid_leave(fourth, date(2025, 2, 3), date(2025, 2, 4))
+
+        # The hourly request needs the holidays it spans
+        with self.assertNumQueries(2):
+            unpaid_days = unpaid_leave_days_by_employee(self.period)
+
+        self.assertEqual(unpaid_days[first.id], Decimal('3'))
+        self.assertEqual(unpaid_days[second.id], Decimal('3.5'))
+        # Half of its one business day, which falls inside the period
+        self.assertEqual(unpaid_days[third.id], Decimal('0.5'))
+        self.assertNotIn(fourth.id, unpaid_days)
+
+    def test_multi_day_half_day_leave(self):
+        """Test only the first day of a half-day request counts half"""
+        first, second, third = self.employees[:3]
+        self.create_unpaid_leave(first, date(2025, 1, 13), date(2025, 1, 15), 'half_day_afternoon')
+        self.create_unpaid_leave(second, date(2025, 1, 14), date(2025, 1, 14), 'half_day_morning')
+        # Starts before the period, so its half day belongs to December
+        self.create_unpaid_leave(third, date(2024, 12, 31), date(2025, 1, 2), 'half_day_morning')
+
+        unpaid_days = unpaid_leave_days_by_employee(self.period)
+
+        self.assertEqual(unpaid_days[first.id], Decimal('2.5'))
+        self.assertEqual(unpaid_days[second.id], Decimal('0.5'))
+        self.assertEqual(unpaid_days[third.id], Decimal('2'))
+
+    def test_hourly_leave_takes_part_of_each_day(self):
+        """Test hourly leave counts the same part of each calendar day as full-day leave"""
+        first, second = self.employees[:2]
+        Holiday.objects.create(name='Founders Day', date=date(2025, 1, 29))
+        # Monday to Sunday, two hours on each of its four business days
+        self.create_unpaid_leave(first, date(2025, 1, 27), date(2025, 2, 2), 'hours', Decimal('1'))
+        self.create_unpaid_leave(second, date(2025, 1, 27), date(2025, 2, 2))
+
+        unpaid_days = unpaid_leave_days_by_employee(self.period)
+
+        self.assertEqual(unpaid_days[second.id], Decimal('5'))
+        self.assertEqual(unpaid_days[first.id], unpaid_days[second.id] / 4)
+
+    def test_limit_to_employees(self):
+        """Test the result can be limited to some employees"""
+        first, second = self.employees[:2]
+        self.create_unpaid_leave(first, date(2025, 1, 6), date(2025, 1, 6))
+        self.create_unpaid_leave(second, date(2025, 1, 6), date(2025, 1, 6))
+
+        # Without hourly requests no holidays are read
+        with self.assertNumQueries(1):
+            unpaid_days = unpaid_leave_days_by_employee(self.period, employee_ids=[second.id])
+
+        self.assertEqual(unpaid_days, {second.id: Decimal('1')})
+
+
+class RunPayrollCommandTest(PayrollTestDataMixin, TestCase):
+    """Test the sharded run_payroll management command"""
+
+    def setUp(self):
+        super().setUp()
+        self.create_payroll_rules()
+        self.create_employees(3)
+        self.create_employees(2, department=Department.objects.create(name='Sales'))
+        self.period = self.create_period()
+
+    def run_payroll(self, **options):
+        call_command('run_payroll', self.period.id, workers=1, stdout=StringIO(), **options)
+        self.period.refresh_from_db()
+
+    def test_run_payroll_calculates_every_payslip(self):
+        """Test payslips are generated, calculated and the period is processed"""
+        self.run_payroll(shard_by='department', batch_size=2)
+
+        active_count = Employee.objects.filter(employment_status='active').count()
+        self.assertEqual(self.period.status, 'processed')
+        self.assertEqual(
+            self.period.payslips.filter(status='calculated').count(), active_count
+        )
+        self.assertEqual(PayslipDeduction.objects.filter(
+            payslip__payroll_period=self.period
+        ).count(), active_count * 2)
+
+    def test_run_payroll_rerun_is_idempotent(self):
+        """Test rerunning a processed period does not duplicate anything"""
+        self.run_payroll(shard_by='id', shard_size=2)
+        net_salaries = dict(self.period.payslips.values_list('id', 'net_salary'))
+
+        self.run_payroll(shard_by='id', shard_size=2)
+
+        self.assertEqual(self.period.status, 'processed')
+        self.assertEqual(
+            dict(self.period.payslips.values_list('id', 'net_salary')), net_salaries
+        )
+        self.assertEqual(PayslipDeduction.objects.filter(
+            payslip__payroll_period=self.period
+        ).count(), len(net_salaries) * 2)
+
+    def test_run_payroll_rejects_finalized_period(self):
+        """Test finalized periods cannot be rerun"""
+        self.period.status = 'finalized'
+        self.period.save()
+
+        with self.assertRaises(CommandError):
+            self.run_payroll()
+
+
+class ApplyDeductionsTest(PayrollTestDataMixin, APITestCase):
+    """Test period-wide mandatory deduction application"""
+
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user(
+            username='payroll_admin', email='admin@example.com', password='testpass123'
+        )
+        self.client.force_authenticate(user=self.admin)
+        self.create_payroll_rules()
+
+    def process(self, period):
+        self.client.post(f'/api/payroll/payroll-periods/{period.id}/process_payroll/')
+
+    def apply(self, period):
+        return self.client.post(f'/api/payroll/payroll-periods/{period.id}/apply_deductions/')
+
+    def test_missing_deductions_are_added_once(self):
+        """Test every payslip gets each mandatory deduction exactly once"""
+        self.create_employees(3)
+        period = self.create_period()
+        self.process(period)
+        payslip = period.payslips.first()
+        self.client.post(f'/api/payroll/payslips/{payslip.id}/add_deduction/', {
+            'deduction_type': DeductionType.objects.get(name='Union Fee').id,
+            'amount': '150.00'
+        })
+
+        response = self.apply(period)
+
+        payslip_count = period.payslips.count()
+        self.assertEqual(response.data['deductions_created'], payslip_count * 2 - 1)
+        self.assertEqual(response.data['payslips_updated'], payslip_count)
+        for payslip in period.payslips.all():
+            self.assertEqual(payslip.deductions.count(), 2)
+            self.assertEqual(
+                payslip.total_deductions,
+                payslip.deductions.aggregate(total=Sum('amount'))['total']
+            )
+            self.assertIn('deductions', payslip.dirty_inputs)
+        period.refresh_from_db()
+        self.assertEqual(
+            period.total_deductions,
+            period.payslips.aggregate(total=Sum('total_deductions'))['total']
+        )
+
+        self.assertEqual(self.apply(period).data['deductions_created'], 0)
+
+    def test_query_count_is_constant(self):
+        """Test the number of queries does not grow with headcount"""
+        self.create_employees(2)
+        small_period = self.create_period()
+        self.process(small_period)
+        with CaptureQueriesContext(connection) as small_run:
+            self.apply(small_period)
+
+        self.create_employees(20)
+        large_period = self.create_period(
+            name='February 2025',
+            start_date=date(2025, 2, 1),
+            end_date=date(2025, 2, 28),
+            pay_date=date(2025, 3, 1)
+        )
+        self.process(large_period)
+        with CaptureQueriesContext(connection) as large_run:
+            self.apply(large_period)
+
+        self.assertEqual(len(small_run), len(large_run))
+
+
+class DirtyTrackingTest(PayrollTestDataMixin, APITestCase):
+    """Test incremental recalculation of changed payslips"""
+
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user(
+            username='payroll_admin', email='admin@example.com', password='testpass123'
+        )
+        self.client.force_authenticate(user=self.admin)
+        self.create_payroll_rules()
+        self.employees = self.create_employees(3)
+        self.period = self.create_period()
+        self.client.post(f'/api/payroll/payroll-periods/{self.period.id}/process_payroll/')
+        self.client.post(f'/api/payroll/payroll-periods/{self.period.id}/calculate_all/')
+        self.bonus_type = BonusType.objects.create(
+            name='Spot Bonus', calculation_method='fixed', default_amount=Decimal('500')
+        )
+
+    def stale(self):
+        return self.client.get(f'/api/payroll/payroll-periods/{self.period.id}/stale/').data
+
+    def test_calculated_payslips_are_clean(self):
+        """Test a full calculation leaves nothing stale"""
+        self.assertEqual(self.stale()['stale_payslips'], 0)
+        self.assertFalse(self.period.payslips.exclude(calculated_at__isnull=False).exists())
+
+    def test_bonus_marks_payslip_stale_and_only_it_is_recalculated(self):
+        """Test only payslips with changed inputs are recalculated"""
+        payslip = Payslip.objects.get(employee=self.employees[0], payroll_period=self.period)
+        self.client.post(f'/api/payroll/payslips/{payslip.id}/add_bonus/', {
+            'bonus_type': self.bonus_type.id, 'amount': '500.00'
+        })
+
+        stale = self.stale()
+        self.assertEqual(stale['stale_payslips'], 1)
+        self.assertEqual(stale['changed_inputs']['bonuses'], 1)
+        payslip.refresh_from_db()
+        self.assertEqual(payslip.dirty_inputs, ['bonuses'])
+
+        response = self.client.post(
+            f'/api/payroll/payroll-periods/{self.period.id}/calculate_all/',
+            {'only_stale': True}
+        )
+
+        self.assertEqual(response.data['payslips_calculated'], 1)
+        payslip.refresh_from_db()
+        self.assertFalse(payslip.is_stale)
+        self.assertEqual(payslip.gross_salary, payslip.base_salary + Decimal('500'))
+
+    def test_unpaid_leave_and_tax_changes_mark_payslips_stale(self):
+        """Test leave and tax bracket changes flag the affected payslips"""
+        self.create_unpaid_leave(self.employees[1], date(2025, 1, 6), date(2025, 1, 7))
+        self.assertEqual(self.stale()['changed_inputs']['unpaid_leave'], 1)
+
+        TaxBracket.objects.filter(name='Bracket 2').first().save()
+        self.assertEqual(self.stale()['stale_payslips'], self.period.payslips.count())
+
+    def test_leave_moved_out_of_period_marks_payslip_stale(self):
+        """Test the payslip of the period a leave request leaves is flagged"""
+        leave = self.create_unpaid_leave(self.employees[1], date(2025, 1, 6), date(2025, 1, 7))
+        self.client.post(
+            f'/api/payroll/payroll-periods/{self.period.id}/calculate_all/', {'only_stale': True}
+        )
+        self.assertEqual(self.stale()['stale_payslips'], 0)
+
+        leave.start_date = date(2025, 3, 3)
+        leave.end_date = date(2025, 3, 4)
+        leave.save()
+
+        self.assertEqual(self.stale()['changed_inputs']['unpaid_leave'], 1)
+
+    def test_tax_changes_only_mark_payslips_taxed_by_the_bracket(self):
+        """Test other tax years and closed periods are not flagged"""
+        TaxBracket.objects.create(
+            name='Old Bracket', year=2024, min_amount=Decimal('0'), tax_rate=Decimal('0.05')
+        )
+        self.assertEqual(self.stale()['stale_payslips'], 0)
+
+        closed = self.create_period(
+            name='December 2024', start_date=date(2024, 12, 1),
+            end_date=date(2024, 12, 31), pay_date=date(2025, 1, 1), status='finalized'
+        )
+        Payslip.objects.create(
+            employee=self.employees[0], payroll_period=closed,
+            payslip_number='CLOSED-1', base_salary=Decimal('1000')
+        )
+        TaxBracket.objects.filter(name='Bracket 2').first().save()
+
+        self.assertEqual(self.stale()['stale_payslips'], self.period.payslips.count())
+        self.assertFalse(closed.payslips.filter(dirty_flags__gt=0).exists())
+
+    def test_base_salary_change_marks_payslip_stale(self):
+        """Test editing the base salary flags the payslip"""
+        payslip = Payslip.objects.get(employee=self.employees[2], payroll_period=self.period)
+        payslip.base_salary = Decimal('25000')
+        payslip.save()
+
+        payslip.refresh_from_db()
+        self.assertEqual(payslip.dirty_inputs, ['base_salary'])
+
+
+class PeriodTotalsTest(PayrollTestDataMixin, APITestCase):
+    """Test incrementally maintained payroll period totals"""
+
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user(
+            username='payroll_admin', email='admin@example.com', password='testpass123'
+        )
+        self.client.force_authenticate(user=self.admin)
+        self.create_payroll_rules()
+        self.create_employees(3)
+        self.period = self.create_period()
+        self.client.post(f'/api/payroll/payroll-periods/{self.period.id}/process_payroll/')
+        self.client.post(f'/api/payroll/payroll-periods/{self.period.id}/calculate_all/')
+
+    def assertTotalsMatchPayslips(self):
+        self.period.refresh_from_db()
+        payslips = self.period.payslips.all()
+        expected = payslips.aggregate(
+            gross=Sum('gross_salary'), net=Sum('net_salary'),
+            deductions=Sum('total_deductions'), taxes=Sum('tax_amount'),
+            bonuses=Sum('total_bonuses')
+        )
+        self.assertEqual(self.period.total_gross_amount, expected['gross'] or 0)
+        self.assertEqual(self.period.total_net_amount, expected['net'] or 0)
+        self.assertEqual(self.period.total_deductions, expected['deductions'] or 0)
+        self.assertEqual(self.period.total_taxes, expected['taxes'] or 0)
+        self.assertEqual(self.period.total_bonuses, expected['bonuses'] or 0)
+        for payslip_status, count in self.period.status_counts.items():
+            self.assertEqual(count, payslips.filter(status=payslip_status).count())
+
+    def test_totals_follow_bulk_calculation(self):
+        """Test generation and calculate_all keep totals up to date"""
+        self.assertTotalsMatchPayslips()
+        self.assertEqual(self.period.calculated_payslips, self.period.payslips.count())
+        self.assertGreater(self.period.total_net_amount, 0)
+
+    def test_totals_follow_approval_and_deletion(self):
+        """Test single payslip saves and deletes adjust totals"""
+        first, second = self.period.payslips.all()[:2]
+        self.client.post(f'/api/payroll/payslips/{first.id}/approve/')
+        second.delete()
+
+        self.assertTotalsMatchPayslips()
+        self.assertEqual(self.period.approved_payslips, 1)
+
+    def test_period_save_keeps_totals(self):
+        """Test saving a stale period instance does not overwrite totals"""
+        stale_period = PayrollPeriod.objects.get(pk=self.period.pk)
+        self.period.payslips.first().delete()
+
+        stale_period.name = 'Renamed'
+        stale_period.save()
+
+        self.assertTotalsMatchPayslips()
+
+    def test_rebuild_command_repairs_totals(self):
+        """Test rebuild_payroll_totals recomputes drifted totals"""
+        PayrollPeriod.objects.filter(pk=self.period.pk).update(
+            total_net_amount=Decimal('1'), calculated_payslips=0
+        )
+
+        call_command('rebuild_payroll_totals', stdout=StringIO())
+
+        self.assertTotalsMatchPayslips()
+
+    def test_summary_reads_precomputed_totals(self):
+        """Test the summary action reports the stored totals"""
+        self.period.refresh_from_db()
+
+        response = self.client.get(f'/api/payroll/payroll-periods/{self.period.id}/summary/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total_employees'], self.period.payslips.count())
+        self.assertEqual(
+            Decimal(response.data['total_net_amount']), self.period.total_net_amount
+        )
+        self.assertEqual(
+            response.data['status_breakdown'],
+            [{'status': 'calculated', 'count': self.period.payslips.count()}]
+        )
+
+    def test_summary_department_breakdown_reads_rollups(self):
+        """Test department totals come from rollups refreshed on commit, not the payslips"""
+        url = f'/api/payroll/payroll-periods/{self.period.id}/summary/'
+        payslip = self.period.payslips.filter(employee__department__name='Finance').first()
+        payslip.net_salary += Decimal('100')
+        with self.captureOnCommitCallbacks(execute=True):
+            payslip.save()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+
+        self.assertFalse([
+            query for query in queries.captured_queries
+            if query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))
+        ])
+
+        expected = {
+            row['employee__department__name']: (row['count'], row['total_net'])
+            for row in self.period.payslips.values('employee__department__name').annotate(
+                count=Count('id'), total_net=Sum('net_salary')
+            )
+        }
+        self.assertEqual(
+            {
+                row['employee__department__name']: (row['count'], Decimal(str(row['total_net'])))
+                for row in response.data['department_breakdown']
+            },
+            expected
+        )
+        self.assertEqual(
+            DepartmentPayrollRollup.objects.filter(payroll_period=self.period).count(),
+            len(expected)
+        )
+
+
+class PayrollExportTest(PayrollTestDataMixin, APITestCase):
+    """Test streaming period exports"""
+
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user(
+            username='payroll_admin', email='admin@example.com', password='testpass123'
+        )
+        self.client.force_authenticate(user=self.admin)
+        self.create_payroll_rules()
+        self.create_employees(3)
+        self.period = self.create_period()
+        self.client.post(f'/api/payroll/payroll-periods/{self.period.id}/process_payroll/')
+        self.client.post(f'/api/payroll/payroll-periods/{self.period.id}/calculate_all/')
+
+    def export(self, **params):
+        return self.client.get(
+            f'/api/payroll/payroll-periods/{self.period.id}/export/', params
+        )
+
+    def test_csv_export_streams_every_payslip(self):
+        """Test the CSV export has a header and one row per payslip"""
+        response = self.export()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        rows = list(csv.reader(lines))
+        self.assertEqual(rows[0][:3], ['payslip_number', 'status', 'employee_id'])
+        self.assertIn('department', rows[0])
+        self.assertIn('payment_method', rows[0])
+        self.assertEqual(len(rows) - 1, self.period.payslips.count())
+        department_column = rows[0].index('department')
+        self.assertIn('Finance', {row[department_column] for row in rows[1:]})
+
+    def test_bank_file_export(self):
+        """Test the bank file has fixed-width records of approved payslips and a matching trailer"""
+        approved = list(
+            self.period.payslips.filter(employee__department__name='Finance').order_by('id')[:2]
+        )
+        for payslip in approved:
+            payslip.status = 'approved'
+            payslip.save()
+
+        response = self.export(file_format='bank')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        lines = b''.join(response.streaming_content).decode().split('\r\n')[:-1]
+        details = [line for line in lines if line.startswith('D')]
+        self.assertEqual(lines[0][0], 'H')
+        self.assertEqual(len(details), len(approved))
+        self.assertEqual(len({len(line) for line in details}), 1)
+        self.assertIn('FINANCE', details[0])
+        total = sum(payslip.net_salary for payslip in approved)
+        self.assertEqual(lines[-1], 'T' + str(len(details)).rjust(10, '0')
+                         + str(int(total * 100)).rjust(18, '0'))
+
+    def test_bank_file_rejects_unapproved_status_and_bad_amounts(self):
+        """Test unpayable payslips and amounts that do not fit are refused"""
+        response = self.export(file_format='bank', status='calculated')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        payslip = self.period.payslips.filter(employee__department__name='Finance').first()
+        payslip.status = 'approved'
+        payslip.save()
+        Payslip.objects.filter(pk=payslip.pk).update(net_salary=Decimal('-123.45'))
+        response = self.export(file_format='bank')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('Negative', response.data['error'])
+
+        Payslip.objects.filter(pk=payslip.pk).update(net_salary=Decimal('99999999999999.00'))
+        response = self.export(file_format='bank')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_invalid_file_format(self):
+        """Test unknown export formats are rejected"""
+        response = self.export(file_format='xlsx')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class PeriodSnapshotTest(PayrollTestDataMixin, APITestCase):
+    """Test columnar snapshots of finalized periods"""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.admin = User.objects.create_user(
+            username='payroll_admin', email='admin@example.com', password='testpass123'
+        )
+        self.client.force_authenticate(user=self.admin)
+        self.create_payroll_rules()
+        self.create_employees(3)
+        self.period = self.create_period()
+        self.client.post(f'/api/payroll/payroll-periods/{self.period.id}/process_payroll/')
+        self.client.post(f'/api/payroll/payroll-periods/{self.period.id}/calculate_all/')
+        for payslip in self.period.payslips.all():
+            payslip.status = 'approved'
+            payslip.save()
+
+    def finalize(self):
+        return self.client.post(
+            f'/api/payroll/payroll-periods/{self.period.id}/finalize_payroll/'
+        )
+
+    def test_finalize_writes_snapshot(self):
+        """Test finalizing a period writes one snapshot row per payslip"""
+        response = self.finalize()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(os.path.exists(snapshot_path(self.period.id)))
+        self.period.refresh_from_db()
+        snapshot = load_period_snapshot(self.period)
+        self.assertEqual(snapshot.size, self.period.payslips.count())
+        totals = self.period.payslips.aggregate(total=Sum('net_salary'))['total']
+        self.assertAlmostEqual(float(snapshot['net'].sum()), float(totals), places=2)
+
+    def test_summary_and_trends_read_snapshot(self):
+        """Test analytics of a finalized period match the payslips without reading them"""
+        self.finalize()
+        expected = self.period.payslips.aggregate(
+            gross=Sum('gross_salary'), net=Sum('net_salary')
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            summary = self.client.get(
+                '/api/payroll/analytics/payroll_summary/', {'period_id': self.period.id}
+            )
+            trends = self.client.get('/api/payroll/analytics/trends/')
+
+        self.assertEqual(summary.status_code, status.HTTP_200_OK)
+        self.assertEqual(trends.status_code, status.HTTP_200_OK)
+        self.assertFalse([
+            query for query in queries.captured_queries
+            if 'payroll_payslip' in query['sql']
+        ])
+        count = self.period.payslips.count()
+        self.assertEqual(summary.data['total_employees'], count)
+        self.assertAlmostEqual(summary.data['total_gross'], float(expected['gross']), places=2)
+        self.assertIn('Finance', {
+            row['employee__department__name'] for row in summary.data['department_breakdown']
+        })
+        self.assertEqual(summary.data['status_breakdown'], [{'status': 'approved', 'count': count}])
+        self.assertEqual(len(trends.data['periods']), 1)
+        self.assertAlmostEqual(trends.data['periods'][0]['net'], float(expected['net']), places=2)
+
+    def test_reopened_period_drops_snapshot(self):
+        """Test a period that leaves the finalized status loses its snapshot"""
+        self.finalize()
+        self.period.refresh_from_db()
+        self.period.status = 'processed'
+        self.period.save()
+
+        self.assertFalse(os.path.exists(snapshot_path(self.period.id)))
+        self.assertIsNone(load_period_snapshot(self.period))
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class SalaryTimelineTest(PayrollTestDataMixin, APITestCase):
+    """Test salary-as-of-date lookups over compensation history"""
+
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user(
+            username='payroll_admin', email='admin@example.com', password='testpass123'
+        )
+        self.client.force_authenticate(user=self.admin)
+        self.first, self.second = self.create_employees(2)
+        self.add_change(self.first, 'hire', date(2024, 1, 1), None, '10000')
+        self.add_change(self.first, 'promotion', date(2024, 7, 1), '10000', '12000')
+        self.add_change(self.first, 'bonus', date(2024, 8, 1), '12000', '15000')
+        self.add_change(self.second, 'adjustment', date(2024, 3, 1), '8000', '9000')
+
+    def add_change(self, employee, change_type, effective_date, previous_salary, new_salary):
+        return CompensationHistory.objects.create(
+            employee=employee, change_type=change_type, effective_date=effective_date,
+            previous_salary=Decimal(previous_salary) if previous_salary else None,
+            new_salary=Decimal(new_salary), reason='Test'
+        )
+
+    def test_point_lookups(self):
+        """Test the salary in effect before, on and after each change"""
+        self.assertIsNone(salary_as_of(self.first.id, date(2023, 12, 31)))
+        self.assertEqual(salary_as_of(self.first.id, date(2024, 1, 1)), Decimal('10000'))
+        self.assertEqual(salary_as_of(self.first.id, date(2024, 6, 30)), Decimal('10000'))
+        # One-time bonuses do not change the salary
+        self.assertEqual(salary_as_of(self.first.id, date(2024, 9, 1)), Decimal('12000'))
+        self.assertEqual(salary_as_of(self.second.id, date(2024, 1, 1)), Decimal('8000'))
+        self.assertIsNone(salary_as_of(self.admin.employee_profile.id, date(2024, 1, 1)))
+
+    def test_batch_lookup_uses_cached_timelines(self):
+        """Test every employee's salary on a date is answered from the cache"""
+        salaries_as_of(date(2024, 1, 1))
+
+        # Only the salaries of employees without history are read
+        with self.assertNumQueries(1):
+            salaries = salaries_as_of(date(2024, 4, 1))
+
+        self.assertEqual(salaries, {
+            self.first.id: Decimal('10000'), self.second.id: Decimal('9000')
+        })
+
+    def test_falls_back_to_current_salary_without_history(self):
+        """Test an employee without compensation history is paid their current salary"""
+        third, = self.create_employees(1, salary=Decimal('7000'))
+
+        self.assertEqual(salary_as_of(third.id, date(2024, 4, 1)), Decimal('7000'))
+        self.assertEqual(salaries_as_of(date(2024, 4, 1), [self.second.id, third.id]), {
+            self.second.id: Decimal('9000'), third.id: Decimal('7000')
+        })
+
+    def test_new_record_invalidates_cache(self):
+        """Test creating compensation history is visible to later lookups"""
+        self.assertEqual(salary_as_of(self.second.id, date(2025, 1, 1)), Decimal('9000'))
+
+        self.add_change(self.second, 'promotion', date(2025, 1, 1), '9000', '11000')
+
+        self.assertEqual(salary_as_of(self.second.id, date(2025, 1, 1)), Decimal('11000'))
+
+    def test_change_rebuilds_only_that_employee(self):
+        """Test a change recorded by any worker rebuilds one timeline with one query"""
+        timelines = get_salary_timelines()
+        # Changed by another worker: only its shared change record reaches this one
+        CompensationHistory.objects.filter(employee=self.second).update(new_salary=Decimal('9500'))
+        invalidate_salary_timeline(self.second.id)
+
+        with self.assertNumQueries(1):
+            refreshed = get_salary_timelines()
+
+        self.assertIs(refreshed[self.first.id], timelines[self.first.id])
+        self.assertEqual(salary_as_of(self.second.id, date(2024, 4, 1)), Decimal('9500'))
+
+    def test_as_of_endpoint(self):
+        """Test the as_of action for one employee and for everyone"""
+        url = '/api/payroll/compensation-history/as_of/'
+
+        response = self.client.get(url, {'date': '2024-07-01', 'employee_id': self.first.id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['salary'], Decimal('12000'))
+
+        response = self.client.get(url, {'date': '2024-07-01'})
+        self.assertEqual(len(response.data['salaries']), 2)
+
+        response = self.client.get(url, {'date': 'July'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class AnalyticsCacheTest(PayrollTestDataMixin, APITestCase):
+    """Test cached analytics responses and their invalidation"""
+
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user(
+            username='payroll_admin', email='admin@example.com', password='testpass123'
+        )
+        self.client.force_authenticate(user=self.admin)
+        self.create_payroll_rules()
+        self.create_employees(2)
+        self.period = self.create_period()
+        self.client.post(f'/api/payroll/payroll-periods/{self.period.id}/process_payroll/')
+        self.client.post(f'/api/payroll/payroll-periods/{self.period.id}/calculate_all/')
+
+    def summary(self, **headers):
+        return self.client.get(
+            '/api/payroll/analytics/payroll_summary/', {'period_id': self.period.id},
+            headers=headers
+        )
+
+    def test_dashboard_is_cached(self):
+        """Test a repeated dashboard request is served without aggregating again"""
+        first = self.client.get('/api/payroll/analytics/dashboard/')
+
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get('/api/payroll/analytics/dashboard/')
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(first['ETag'], second['ETag'])
+        self.assertEqual(len(queries), 0)
+
+    def test_matching_etag_returns_not_modified(self):
+        """Test clients holding the current ETag get a 304"""
+        etag = self.summary()['ETag']
+
+        response = self.summary(if_none_match=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_payslip_save_invalidates_summary(self):
+        """Test changing a payslip rebuilds the period summary and its ETag"""
+        first = self.summary()
+        payslip = self.period.payslips.first()
+        payslip.gross_salary += Decimal('1000')
+        payslip.save()
+
+        response = self.summary(if_none_match=first['ETag'])
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+        self.assertAlmostEqual(
+            float(response.data['total_gross']), float(first.data['total_gross']) + 1000, places=2
+        )
+
+
+class DepartmentRollupTest(PayrollTestDataMixin, APITestCase):
+    """Test department payroll rollups and the department trends endpoint"""
+
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user(
+            username='payroll_admin', email='admin@example.com', password='testpass123'
+        )
+        self.client.force_authenticate(user=self.admin)
+        self.create_payroll_rules()
+        self.finance = Department.objects.create(name='Finance')
+        self.sales = Department.objects.create(name='Sales')
+        self.create_employees(2, department=self.finance)
+        self.create_employees(1, department=self.sales)
+        today = date.today()
+        self.period = self.create_period(
+            name='Current', start_date=today.replace(day=1), end_date=today.replace(day=28),
+            pay_date=today.replace(day=28)
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/payroll/payroll-periods/{self.period.id}/process_payroll/')
+            self.client.post(f'/api/payroll/payroll-periods/{self.period.id}/calculate_all/')
+
+    def trends(self, **params):
+        return self.client.get('/api/payroll/analytics/department_trends/', params)
+
+    def test_trends_match_payslips(self):
+        """Test the monthly series of a department equals its payslip sums"""
+        response = self.trends(department_id=self.finance.id)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        series = response.data['departments']
+        self.assertEqual(len(series), 1)
+        month = series[0]['months'][0]
+        expected = self.period.payslips.filter(employee__department=self.finance).aggregate(
+            gross=Sum('gross_salary'), net=Sum('net_salary')
+        )
+        self.assertEqual(month['employees'], 2)
+        self.assertEqual(month['gross'], expected['gross'])
+        self.assertEqual(month['net'], expected['net'])
+
+    def test_payslip_change_refreshes_rollup(self):
+        """Test a changed payslip flags its period until the change commits"""
+        self.period.refresh_from_db()
+        self.assertFalse(self.period.rollup_stale)
+
+        payslip = self.period.payslips.filter(employee__department=self.sales).first()
+        payslip.gross_salary += Decimal('500')
+        with self.captureOnCommitCallbacks(execute=True):
+            payslip.save()
+            self.period.refresh_from_db()
+            self.assertTrue(self.period.rollup_stale)
+            # Reads do not refresh it
+            self.trends()
+            self.period.refresh_from_db()
+            self.assertTrue(self.period.rollup_stale)
+        self.period.refresh_from_db()
+        self.assertFalse(self.period.rollup_stale)
+
+        response = self.trends(department_id=self.sales.id)
+        self.assertEqual(response.data['departments'][0]['months'][0]['gross'], payslip.gross_salary)
+
+    def test_fresh_rollups_are_read_in_one_query(self):
+        """Test trends over fresh rollups do not touch payslips"""
+        self.trends()
+
+        with CaptureQueriesContext(connection) as queries:
+            self.trends(months=6)
+
+        self.assertEqual(len(queries), 1)
+        self.assertFalse([
+            query for query in queries.captured_queries if 'payroll_payslip' in query['sql']
+        ])
+
+    def test_rebuild_command(self):
+        """Test the rebuild command recomputes rollups from payslips"""
+        DepartmentPayrollRollup.objects.all().delete()
+        out = StringIO()
+
+        call_command('rebuild_department_rollups', stdout=out)
+
+        self.assertIn('1 payroll periods', out.getvalue())
+        self.assertEqual(
+            sum(DepartmentPayrollRollup.objects.values_list('employees', flat=True)),
+            self.period.payslips.count()
+        )
+
+
+class PayrollBenchmarkTest(TestCase):
+    """Test the payroll benchmark suite at a tiny scale"""
+
+    def test_run_records_every_scenario(self):
+        """Test each scenario reports time, queries and memory"""
+        run = run_benchmarks(5, sample=2)
+
+        self.assertEqual(run['meta']['employees'], 5)
+        self.assertEqual(
+            set(run['results']),
+            {'seed', 'process_payroll', 'calculate_payslip', 'calculate_all', 'summary', 'payslip_list'}
+        )
+        self.assertEqual(run['results']['calculate_payslip']['calls'], 2)
+        for metrics in run['results'].values():
+            self.assertGreater(metrics['queries'], 0)
+            self.assertGreaterEqual(metrics['seconds'], 0)
+        self.assertEqual(Payslip.objects.filter(status='calculated').count(), Payslip.objects.count())
+
+    def test_failed_scenario_stops_the_run(self):
+        """Test a scenario answered with an error is not measured as if it worked"""
+        check_response('summary', HttpResponse(status=200))
+
+        with self.assertRaisesMessage(BenchmarkError, 'summary returned 400'):
+            check_response('summary', HttpResponse(status=400))
+
+    def test_compare_results_flags_regressions(self):
+        """Test metrics beyond the threshold are reported as regressions"""
+        baseline = {
+            'summary': {'seconds': 1.0, 'queries': 10, 'peak_memory_kb': 100},
+            'payslip_list': {'seconds': 0.01, 'queries': 5, 'peak_memory_kb': 100},
+        }
+        results = {
+            'summary': {'seconds': 1.1, 'queries': 13, 'peak_memory_kb': 100},
+            'payslip_list': {'seconds': 0.03, 'queries': 5, 'peak_memory_kb': 90},
+            'calculate_all': {'seconds': 5.0, 'queries': 1, 'peak_memory_kb': 1},
+        }
+
+        self.assertEqual(
+            compare_results(results, baseline, threshold=0.2),
+            [('summary', 'queries', 10, 13)]
+        )
+
+
+class PaymentReconciliationTest(PayrollTestDataMixin, APITestCase):
+    """Test marking payslips paid from a bank payment file"""
+
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user(
+            username='payroll_admin', email='admin@example.com', password='testpass123'
+        )
+        self.client.force_authenticate(user=self.admin)
+        self.create_payroll_rules()
+        self.create_employees(3)
+        self.period = self.create_period()
+        self.client.post(f'/api/payroll/payroll-periods/{self.period.id}/process_payroll/')
+        self.client.post(f'/api/payroll/payroll-periods/{self.period.id}/calculate_all/')
+        self.payslips = list(self.period.payslips.order_by('id'))
+        for payslip in self.payslips[:-1]:
+            payslip.status = 'approved'
+            payslip.save()
+
+    def upload(self, content, **data):
+        data['file'] = SimpleUploadedFile('payments.csv', content.encode(), content_type='text/csv')
+        return self.client.post(
+            '/api/payroll/payslips/reconcile_payments/', data, format='multipart'
+        )
+
+    def test_reconciliation_report(self):
+        """Test approved payslips are paid and every other row is reported"""
+        first, second, third, calculated = self.payslips
+        third.status = 'paid'
+        third.save()
+        content = (
+            'payslip_number,reference,date\n'
+            f'{first.payslip_number},TRX-1,2025-02-01\n'
+            f'{second.payslip_number},TRX-2,20250201\n'
+            f'{second.payslip_number},TRX-2,20250201\n'
+            f'{third.payslip_number},TRX-3,2025-02-01\n'
+            f'{calculated.payslip_number},TRX-4,2025-02-01\n'
+            'UNKNOWN-1,TRX-5,2025-02-01\n'
+            f'{first.payslip_number},TRX-6,someday\n'
+        )
+
+        response = self.upload(content)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['rows'], 7)
+        self.assertEqual(response.data['paid'], 2)
+        self.assertEqual([row['payslip_number'] for row in response.data['unmatched']], ['UNKNOWN-1'])
+        self.assertEqual(response.data['already_paid'][0]['line'], 5)
+        self.assertEqual(response.data['not_approved'][0]['status'], 'calculated')
+        self.assertEqual(len(response.data['duplicates']), 1)
+        self.assertEqual(response.data['invalid'][0]['error'], 'Invalid payment date')
+        first.refresh_from_db()
+        self.assertEqual(first.status, 'paid')
+        self.assertEqual(first.payment_reference, 'TRX-1')
+        self.assertEqual(first.payment_date, date(2025, 2, 1))
+        latest = first.history.first()
+        self.assertEqual(latest.history_change_reason, 'Payment reconciliation')
+        self.assertEqual((latest.status, latest.payment_reference), ('paid', 'TRX-1'))
+        self.period.refresh_from_db()
+        self.assertEqual(self.period.paid_payslips, 3)
+        self.assertEqual(self.period.approved_payslips, 0)
+
+    def test_dry_run_changes_nothing(self):
+        """Test a dry run reports matches without paying anything"""
+        content = 'payslip_number,payment_reference,payment_date\n' + ''.join(
+            f'{payslip.payslip_number},TRX,2025-02-01\n' for payslip in self.payslips[:-1]
+        )
+
+        response = self.upload(content, dry_run='true')
+
+        self.assertEqual(response.data['paid'], len(self.payslips) - 1)
+        self.assertFalse(self.period.payslips.filter(status='paid').exists())
+
+    def test_unreadable_row_reports_rows_already_paid(self):
+        """Test a file that breaks partway reports the payslips paid before the error"""
+        first = self.payslips[0]
+        content = (
+            'payslip_number,reference,date\n'
+            f'{first.payslip_number},TRX-1,2025-02-01\n'
+            f'{"x" * 200000},TRX-2,2025-02-01\n'
+        )
+
+        response = self.upload(content)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('line 3', response.data['error'])
+        self.assertEqual(response.data['report']['paid'], 1)
+        first.refresh_from_db()
+        self.assertEqual(first.status, 'paid')
+
+    def test_missing_column(self):
+        """Test files without the required columns are rejected"""
+        response = self.upload('payslip_number,date\nPAY-1,2025-02-01\n')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('payment_reference', response.data['error'])
+
+
+class TaxTableTest(PayrollTestDataMixin, TestCase):
+    """Test compiled progressive tax tables"""
+
+    def setUp(self):
+        super().setUp()
+        self.brackets = [
+            TaxBracket.objects.create(
+                name='Bracket 1', year=2025, min_amount=Decimal('0'),
+                max_amount=Decimal('5000'), tax_rate=Decimal('0.05')
+            ),
+            TaxBracket.objects.create(
+                name='Bracket 2', year=2025, min_amount=Decimal('5000.01'),
+                max_amount=Decimal('15000'), tax_rate=Decimal('0.10'),
+                fixed_amount=Decimal('250')
+            ),
+            TaxBracket.objects.create(
+                name='Bracket 3', year=2025, min_amount=Decimal('15000.01'),
+                tax_rate=Decimal('0.15'), fixed_amount=Decimal('1250')
+            ),
+        ]
+
+    def walk_brackets(self, amount):
+        """Reference implementation: walk every bracket for the amount"""
+        total_tax = Decimal('0')
+        for bracket in sorted(self.brackets, key=lambda bracket: bracket.min_amount):
+            if amount <= bracket.min_amount:
+                break
+            bracket_max = bracket.max_amount or amount
+            taxable_in_bracket = min(amount, bracket_max) - bracket.min_amount
+            if taxable_in_bracket > 0:
+                total_tax += taxable_in_bracket * bracket.tax_rate + bracket.fixed_amount
+        return total_tax
+
+    def test_matches_bracket_walk(self):
+        """Test compiled evaluation equals walking the brackets"""
+        table = TaxTable(self.brackets)
+        amounts = [
+            Decimal('0'), Decimal('0.01'), Decimal('4999.99'), Decimal('5000'),
+            Decimal('5000.005'), Decimal('5000.01'), Decimal('5000.02'),
+            Decimal('15000'), Decimal('15000.01'), Decimal('15000.02'),
+            Decimal('87654.32'), Decimal('-10'),
+        ]
+        for amount in amounts:
+            self.assertEqual(table.tax_for(amount), self.walk_brackets(amount), amount)
+        self.assertEqual(
+            table.tax_for_many(amounts),
+            [self.walk_brackets(amount) for amount in amounts]
+        )
+
+    def test_table_is_cached_and_invalidated(self):
+        """Test tables are reused until a bracket changes"""
+        table = get_tax_table('Mexico', 2025)
+        self.assertIs(get_tax_table('Mexico', '2025'), table)
+
+        self.brackets[2].tax_rate = Decimal('0.30')
+        self.brackets[2].save()
+
+        refreshed = get_tax_table('Mexico', 2025)
+        self.assertIsNot(refreshed, table)
+        self.assertEqual(refreshed.tax_for(Decimal('20000')), self.walk_brackets(Decimal('20000')))
+
+        self.brackets[2].delete()
+        self.assertEqual(get_tax_table('Mexico', 2025).tax_for(Decimal('20000')), self.walk_brackets(Decimal('15000')))
+
+    def test_table_is_recompiled_after_another_worker_changes_brackets(self):
+        """Test a version bump from another worker invalidates the local table"""
+        table = get_tax_table('Mexico', 2025)
+        # Another worker updates a bracket; only the shared stamp reaches this one
+        TaxBracket.objects.filter(pk=self.brackets[2].pk).update(tax_rate=Decimal('0.30'))
+        cache.set(TAX_TABLE_VERSION_CACHE_KEY, 'bumped-elsewhere', None)
+
+        refreshed = get_tax_table('Mexico', 2025)
+
+        self.assertIsNot(refreshed, table)
+        self.brackets[2].refresh_from_db()
+        self.assertEqual(refreshed.tax_for(Decimal('20000')), self.walk_brackets(Decimal('20000')))
+
+
+class PayrollSimulationTest(PayrollTestDataMixin, APITestCase):
+    """Test the vectorized payroll what-if simulator"""
+
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user(
+            username='payroll_admin', email='admin@example.com', password='testpass123'
+        )
+        self.client.force_authenticate(user=self.admin)
+        self.create_payroll_rules()
+        self.engineering = Department.objects.create(name='Engineering')
+        self.create_employees(2, salary=Decimal('8000.00'))
+        self.create_employees(3, salary=Decimal('30000.00'), department=self.engineering)
+
+    def test_baseline_matches_payslip_rules(self):
+        """Test simulated amounts follow the tax table and deduction rules"""
+        result = PayrollSimulation().run()
+
+        engineering = next(
+            row for row in result['baseline']['departments']
+            if row['department_id'] == self.engineering.id
+        )
+        gross = Decimal('30000.00')
+        tax = get_tax_table('Mexico', 2025).tax_for(gross)
+        deductions = sum(
+            deduction_type.calculate_amount(gross)
+            for deduction_type in DeductionType.objects.filter(is_mandatory=True)
+        )
+        self.assertEqual(engineering['employees'], 3)
+        self.assertAlmostEqual(engineering['tax'], float(tax * 3), places=2)
+        self.assertAlmostEqual(engineering['deductions'], float(deductions * 3), places=2)
+        self.assertAlmostEqual(engineering['net'], float((gross - tax - deductions) * 3), places=2)
+        self.assertEqual(result['difference']['gross'], 0)
+
+    def test_simulate_endpoint_applies_adjustments(self):
+        """Test department raises and deduction overrides change only the scenario"""
+        deduction = DeductionType.objects.get(name='Union Fee')
+        response = self.client.post('/api/payroll/analytics/simulate/', {
+            'salary_adjustments': [{'department_id': self.engineering.id, 'rate': '0.04'}],
+            'deduction_rates': [{'deduction_type_id': deduction.id, 'default_amount': '200'}],
+        }, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertAlmostEqual(response.data['difference']['gross'], 30000 * 0.04 * 3, places=2)
+        self.assertAlmostEqual(
+            response.data['difference']['deductions'],
+            30000 * 0.04 * 3 * 0.0625 + 50 * response.data['employee_count'],
+            places=2
+        )
+        self.assertEqual(Payslip.objects.count(), 0)
+
+    def test_command_rejects_invalid_brackets(self):
+        """Test a brackets file with missing or non-numeric values is a command error"""
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as brackets_file:
+            json.dump([{'min_amount': 'lots', 'max_amount': None}], brackets_file)
+        self.addCleanup(os.remove, brackets_file.name)
+
+        with self.assertRaisesMessage(CommandError, 'Invalid tax brackets'):
+            call_command('simulate_payroll', brackets=brackets_file.name, stdout=StringIO())
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class PayrollConfigurationCacheTest(PayrollTestDataMixin, TestCase):
+    """Test the cached payroll configuration accessor"""
+
+    def test_get_current_is_cached_until_saved(self):
+        """Test repeated lookups hit the local copy and saves refresh it"""
+        config = PayrollConfiguration.objects.create(payslip_number_prefix='NOM')
+
+        self.assertEqual(PayrollConfiguration.objects.get_current(), config)
+        with self.assertNumQueries(0):
+            PayrollConfiguration.objects.get_current()
+
+        config.payslip_number_prefix = 'PAY'
+        config.save()
+        self.assertEqual(PayrollConfiguration.objects.get_current().payslip_number_prefix, 'PAY')
+
+    def test_snapshot_pins_configuration(self):
+        """Test a payroll run keeps seeing the configuration it started with"""
+        config = PayrollConfiguration.objects.create(tax_year=2025)
+
+        with PayrollConfiguration.objects.snapshot() as pinned:
+            PayrollConfiguration.objects.filter(pk=config.pk).update(tax_year=2026)
+            PayrollConfiguration.objects.clear_cache()
+            with self.assertNumQueries(0):
+                self.assertIs(PayrollConfiguration.objects.get_current(), pinned)
+            self.assertEqual(PayrollConfiguration.objects.get_current().tax_year, 2025)
+
+        self.assertEqual(PayrollConfiguration.objects.get_current().tax_year, 2026)
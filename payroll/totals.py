@@ -0,0 +1,135 @@
+"""
+Incrementally maintained payroll period totals.
+
+``PayrollPeriod`` stores the sums of its payslips' amounts and the number of
+payslips in each status. Instead of re-aggregating, every write to a payslip
+adds the difference between its old and new values with a single
+``UPDATE ... SET total = total + delta`` per period, which stays correct under
+concurrent writers and also flags the period's department rollups as stale;
+they are refreshed once the write commits. ``rebuild_period_totals``
+recomputes the totals from scratch.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+
+from .analytics import invalidate_period_analytics
+from .models import PayrollPeriod, Payslip
+from .rollups import refresh_stale_rollups
+
+# Payslip amount -> PayrollPeriod total column
+AMOUNT_TOTAL_FIELDS = [
+    ('gross_salary', 'total_gross_amount'),
+    ('net_salary', 'total_net_amount'),
+    ('total_deductions', 'total_deductions'),
+    ('tax_amount', 'total_taxes'),
+    ('total_bonuses', 'total_bonuses'),
+]
+
+# Payslip status -> PayrollPeriod count column
+STATUS_COUNT_FIELDS = {
+    status: f'{status}_payslips' for status, _ in Payslip.STATUS_CHOICES
+}
+
+
+class PeriodTotals:
+    """Accumulates payslip changes and applies them to period totals"""
+
+    def __init__(self):
+        self.deltas = {}
+
+    def _period_deltas(self, period_id):
+        return self.deltas.setdefault(period_id, {})
+
+    def _add_values(self, values, sign):
+        period_id, status, *amounts = values
+        if period_id is None:
+            return
+        deltas = self._period_deltas(period_id)
+        for (_, total_field), amount in zip(AMOUNT_TOTAL_FIELDS, amounts):
+            deltas[total_field] = deltas.get(total_field, Decimal('0')) + sign * Decimal(amount or 0)
+        count_field = STATUS_COUNT_FIELDS.get(status)
+        if count_field:
+            deltas[count_field] = deltas.get(count_field, 0) + sign
+
+    def add(self, payslip):
+        """Count a payslip that has been created"""
+        self._add_values(payslip.period_total_values(), 1)
+
+    def remove(self, payslip):
+        """Uncount a payslip that has been deleted"""
+        self._add_values(self.stored_values(payslip), -1)
+
+    def change(self, payslip):
+        """Count the difference between a payslip's stored and current values"""
+        self._add_values(self.stored_values(payslip), -1)
+        self._add_values(payslip.period_total_values(), 1)
+
+    def adjust(self, period_id, total_field, delta):
+        """Add a difference computed elsewhere to one period total"""
+        deltas = self._period_deltas(period_id)
+        deltas[total_field] = deltas.get(total_field, 0) + delta
+
+    @staticmethod
+    def stored_values(payslip):
+        """Values the payslip was loaded with, falling back to its current values"""
+        return getattr(payslip, '_period_totals', None) or payslip.period_total_values()
+
+    def apply(self):
+        """Write the accumulated differences with one UPDATE per period"""
+        for period_id, deltas in self.deltas.items():
+            changes = {
+                field: F(field) + delta for field, delta in deltas.items() if delta
+            }
+            if changes:
+                PayrollPeriod.objects.filter(pk=period_id).update(rollup_stale=True, **changes)
+        if self.deltas:
+            # Every payslip write passes through here, bulk or not
+            invalidate_period_analytics(self.deltas)
+            periods = PayrollPeriod.objects.filter(pk__in=list(self.deltas))
+            transaction.on_commit(lambda: refresh_stale_rollups(periods))
+        self.deltas = {}
+
+
+def record_payslip_saved(payslip, created):
+    """Adjust period totals after a payslip has been saved"""
+    totals = PeriodTotals()
+    if created:
+        totals.add(payslip)
+    else:
+        totals.change(payslip)
+    totals.apply()
+    payslip._period_totals = payslip.period_total_values()
+
+
+def record_payslip_deleted(payslip):
+    """Adjust period totals after a payslip has been deleted"""
+    totals = PeriodTotals()
+    totals.remove(payslip)
+    totals.apply()
+
+
+def rebuild_period_totals(periods=None):
+    """
+    Recompute stored totals from the payslips of the given periods.
+
+    ``periods`` is a PayrollPeriod queryset and defaults to every period.
+    Returns the number of periods rebuilt.
+    """
+    periods = PayrollPeriod.objects.all() if periods is None else periods
+    aggregates = {
+        total_field: Sum(f'payslips__{amount_field}', default=Decimal('0'))
+        for amount_field, total_field in AMOUNT_TOTAL_FIELDS
+    }
+    aggregates.update({
+        count_field: Count('payslips', filter=Q(payslips__status=status))
+        for status, count_field in STATUS_COUNT_FIELDS.items()
+    })
+
+    rebuilt = 0
+    for row in periods.order_by().values('pk').annotate(**aggregates):
+        period_id = row.pop('pk')
+        PayrollPeriod.objects.filter(pk=period_id).update(**row)
+        rebuilt += 1
+    return rebuilt
@@ -1,10 +1,12 @@
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
-from django.db.models import Sum, Avg, Count, Q
-from django.db import transaction
+from django.db.models import Sum, Avg, Count, Min, Max, Q, F
+from django.db.models.functions import TruncMonth
+from django.http import StreamingHttpResponse
 from django.utils import timezone
 from decimal import Decimal
 from datetime import date, datetime
@@ -13,17 +15,34 @@ import logging
 from .models import (
     PayrollPeriod, TaxBracket, DeductionType, BonusType,
     Payslip, PayslipDeduction, PayslipBonus, CompensationHistory,
-    PayrollConfiguration
+    PayrollConfiguration, DepartmentPayrollRollup
 )
 from .serializers import (
     PayrollPeriodSerializer, TaxBracketSerializer, DeductionTypeSerializer,
     BonusTypeSerializer, PayslipSerializer, PayslipSummarySerializer,
     PayslipDeductionSerializer, PayslipBonusSerializer, CompensationHistorySerializer,
     PayrollConfigurationSerializer, EmployeePayrollSerializer, PayrollReportSerializer,
-    PayslipCalculationSerializer
+    PayslipCalculationSerializer, PayrollSimulationSerializer
 )
-from employees.models import Employee, PerformanceReview
-from leaves.models import LeaveRequest
+from .processing import (
+    generate_payslips, calculate_period_payslips, calculable_payslips,
+    unpaid_leave_days_by_employee, apply_mandatory_deductions
+)
+from .tax import get_tax_table
+from .analytics import (
+    ANALYTICS_CACHE_TIMEOUT, DASHBOARD_SCOPE, cached_analytics, period_scope, period_cache_timeout
+)
+from .compensation import salary_as_of, salaries_as_of
+from .export import (
+    BANK_FILE_STATUSES, BankFileError, check_bank_file, stream_csv, stream_bank_file
+)
+from .reconciliation import PaymentFileError, read_payment_rows, reconcile_payments
+from .snapshots import (
+    write_period_snapshot, load_period_snapshot, snapshot_totals, snapshot_department_totals
+)
+from .simulation import PayrollSimulation
+from employees.history import batched_history
+from employees.models import Department, Employee, PerformanceReview
 
 logger = logging.getLogger(__name__)
 
@@ -35,7 +54,7 @@ class PayrollPeriodViewSet(viewsets.ModelViewSet):
     serializer_class = PayrollPeriodSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
-    filterset_fields = ['status', 'frequency', 'year']
+    filterset_fields = ['status', 'frequency']
     search_fields = ['name']
     ordering_fields = ['start_date', 'end_date', 'pay_date', 'created_at']
     ordering = ['-start_date']
@@ -68,36 +87,17 @@ class PayrollPeriodViewSet(viewsets.ModelViewSet):
             )
         
         try:
-            with transaction.atomic():
+            with batched_history(), PayrollConfiguration.objects.snapshot():
                 # Update status
                 payroll_period.status = 'processing'
                 payroll_period.processed_by = request.user
                 payroll_period.processed_date = timezone.now()
                 payroll_period.save()
                 
-                # Generate payslips for all active employees
-                active_employees = Employee.objects.filter(employment_status='active')
-                created_count = 0
-                
-                for employee in active_employees:
-                    # Check if payslip already exists
-                    if not Payslip.objects.filter(
-                        employee=employee, 
-                        payroll_period=payroll_period
-                    ).exists():
-                        # Create payslip
-                        payslip_number = self._generate_payslip_number(
-                            payroll_period, employee
-                        )
-                        
-                        Payslip.objects.create(
-                            employee=employee,
-                            payroll_period=payroll_period,
-                            payslip_number=payslip_number,
-                            base_salary=employee.salary or Decimal('0'),
-                            status='draft'
-                        )
-                        created_count += 1
+                # Generate payslips for all active employees in bulk
+                created_count, skipped_count = generate_payslips(
+                    payroll_period, user=request.user
+                )
                 
                 # Update status to processed
                 payroll_period.status = 'processed'
@@ -105,7 +105,8 @@ class PayrollPeriodViewSet(viewsets.ModelViewSet):
                 
                 return Response({
                     'message': f'Payroll processed successfully. Created {created_count} payslips.',
-                    'payslips_created': created_count
+                    'payslips_created': created_count,
+                    'payslips_skipped': skipped_count
                 })
                 
         except Exception as e:
@@ -115,6 +116,83 @@ class PayrollPeriodViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    @action(detail=True, methods=['post'])
+    def calculate_all(self, request, pk=None):
+        """Calculate every draft or calculated payslip in this period"""
+        payroll_period = self.get_object()
+        
+        if payroll_period.status not in ['processing', 'processed']:
+            return Response(
+                {'error': 'Only processing or processed payroll periods can be calculated'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        only_stale = str(request.data.get('only_stale', '')).lower() in ['1', 'true']
+        
+        try:
+            with batched_history(), PayrollConfiguration.objects.snapshot():
+                calculated_count = calculate_period_payslips(
+                    payroll_period, user=request.user, only_stale=only_stale
+                )
+                
+                return Response({
+                    'message': f'Calculated {calculated_count} payslips successfully.',
+                    'payslips_calculated': calculated_count
+                })
+                
+        except Exception as e:
+            logger.error(f"Error calculating payroll period: {str(e)}")
+            return Response(
+                {'error': f'Error calculating payroll period: {str(e)}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+    @action(detail=True, methods=['post'])
+    def apply_deductions(self, request, pk=None):
+        """Add missing mandatory deductions to every open payslip in this period"""
+        payroll_period = self.get_object()
+        
+        if payroll_period.status not in ['processing', 'processed']:
+            return Response(
+                {'error': 'Only processing or processed payroll periods can be updated'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        created_count, new_totals = apply_mandatory_deductions(
+            payroll_period, user=request.user
+        )
+        
+        return Response({
+            'message': f'Added {created_count} mandatory deductions to {len(new_totals)} payslips.',
+            'deductions_created': created_count,
+            'payslips_updated': len(new_totals)
+        })
+
+    @action(detail=True, methods=['get'])
+    def stale(self, request, pk=None):
+        """Count payslips that need to be recalculated and why"""
+        payroll_period = self.get_object()
+        
+        payslips = calculable_payslips(payroll_period.payslips.all(), only_stale=True)
+        counts = payslips.alias(**{
+            f'{name}_flag': F('dirty_flags').bitand(flag)
+            for flag, name in Payslip.DIRTY_FLAG_CHOICES
+        }).aggregate(
+            stale_payslips=Count('id'),
+            never_calculated=Count('id', filter=Q(status='draft')),
+            **{
+                name: Count('id', filter=Q(**{f'{name}_flag__gt': 0}))
+                for _, name in Payslip.DIRTY_FLAG_CHOICES
+            }
+        )
+        
+        return Response({
+            'period_name': payroll_period.name,
+            'stale_payslips': counts.pop('stale_payslips'),
+            'never_calculated': counts.pop('never_calculated'),
+            'changed_inputs': counts
+        })
+
     @action(detail=True, methods=['post'])
     def finalize_payroll(self, request, pk=None):
         """Finalize payroll period (lock from further changes)"""
@@ -137,6 +215,13 @@ class PayrollPeriodViewSet(viewsets.ModelViewSet):
         payroll_period.status = 'finalized'
         payroll_period.save()
         
+        # Amounts are now immutable; analytics read them from a columnar snapshot
+        try:
+            write_period_snapshot(payroll_period)
+        except OSError as e:
+            # The snapshot is written on first read instead
+            logger.error(f"Error writing payroll snapshot: {str(e)}")
+        
         return Response({'message': 'Payroll period finalized successfully'})
 
     @action(detail=True, methods=['get'])
@@ -144,67 +229,88 @@ class PayrollPeriodViewSet(viewsets.ModelViewSet):
         """Get payroll period summary"""
         payroll_period = self.get_object()
         
-        payslips = payroll_period.payslips.all()
+        total_employees = payroll_period.total_employees
+        
+        # Department totals come from the rollups, refreshed as payslips change
+        rollups = DepartmentPayrollRollup.objects.filter(
+            payroll_period=payroll_period
+        ).order_by('department__name').values_list(
+            'department__name', 'employees', 'total_gross', 'total_net'
+        )
         
+        # Totals and status counts are maintained on the period as payslips change
         summary = {
             'period_name': payroll_period.name,
-            'total_employees': payslips.count(),
-            'total_gross_amount': payslips.aggregate(
-                total=Sum('gross_salary')
-            )['total'] or Decimal('0'),
-            'total_net_amount': payslips.aggregate(
-                total=Sum('net_salary')
-            )['total'] or Decimal('0'),
-            'total_deductions': payslips.aggregate(
-                total=Sum('total_deductions')
-            )['total'] or Decimal('0'),
-            'total_taxes': payslips.aggregate(
-                total=Sum('tax_amount')
-            )['total'] or Decimal('0'),
-            'total_bonuses': payslips.aggregate(
-                total=Sum('total_bonuses')
-            )['total'] or Decimal('0'),
-            'average_salary': payslips.aggregate(
-                avg=Avg('gross_salary')
-            )['avg'] or Decimal('0'),
-            'status_breakdown': list(
-                payslips.values('status').annotate(count=Count('status'))
+            'total_employees': total_employees,
+            'total_gross_amount': payroll_period.total_gross_amount,
+            'total_net_amount': payroll_period.total_net_amount,
+            'total_deductions': payroll_period.total_deductions,
+            'total_taxes': payroll_period.total_taxes,
+            'total_bonuses': payroll_period.total_bonuses,
+            'average_salary': (
+                payroll_period.total_gross_amount / total_employees
+                if total_employees else Decimal('0')
             ),
-            'department_breakdown': list(
-                payslips.values('employee__department__name')
-                .annotate(
-                    count=Count('employee'),
-                    total_gross=Sum('gross_salary'),
-                    total_net=Sum('net_salary')
-                )
-            )
+            'status_breakdown': [
+                {'status': payslip_status, 'count': count}
+                for payslip_status, count in payroll_period.status_counts.items()
+                if count
+            ],
+            'department_breakdown': [
+                {
+                    'employee__department__name': department_name,
+                    'count': employees,
+                    'total_gross': total_gross,
+                    'total_net': total_net
+                }
+                for department_name, employees, total_gross, total_net in rollups
+            ]
         }
         
         serializer = PayrollReportSerializer(summary)
         return Response(serializer.data)
 
-    def _generate_payslip_number(self, payroll_period, employee):
-        """Generate unique payslip number"""
-        config = PayrollConfiguration.objects.first()
-        if not config:
-            prefix = 'PAY'
-            format_str = '{prefix}{year}{month:02d}{sequence:04d}'
+    @action(detail=True, methods=['get'])
+    def export(self, request, pk=None):
+        """Stream this period's payslips as CSV or a fixed-width bank file"""
+        payroll_period = self.get_object()
+        file_format = request.query_params.get('file_format', 'csv')
+        
+        if file_format not in ['csv', 'bank']:
+            return Response(
+                {'error': 'file_format must be csv or bank'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        payslips = payroll_period.payslips.all()
+        payslip_status = request.query_params.get('status')
+        if file_format == 'bank':
+            # Only payslips that were approved for payment go to the bank
+            payslip_status = payslip_status or BANK_FILE_STATUSES[0]
+            if payslip_status not in BANK_FILE_STATUSES:
+                return Response(
+                    {'error': f"Bank files can only contain {' or '.join(BANK_FILE_STATUSES)} payslips"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        if payslip_status:
+            payslips = payslips.filter(status=payslip_status)
+        
+        if file_format == 'bank':
+            try:
+                check_bank_file(payslips)
+            except BankFileError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            content = stream_bank_file(payroll_period, payslips)
+            content_type = 'text/plain'
+            filename = f'payroll_{payroll_period.pk}_bank.txt'
         else:
-            prefix = config.payslip_number_prefix
-            format_str = config.payslip_number_format
+            content = stream_csv(payslips)
+            content_type = 'text/csv'
+            filename = f'payroll_{payroll_period.pk}.csv'
         
-        # Get sequence number
-        existing_count = Payslip.objects.filter(
-            payroll_period=payroll_period
-        ).count()
-        
-        return format_str.format(
-            prefix=prefix,
-            year=payroll_period.start_date.year,
-            month=payroll_period.start_date.month,
-            sequence=existing_count + 1,
-            employee_id=employee.employee_id
-        )
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
 
 
 class TaxBracketViewSet(viewsets.ModelViewSet):
@@ -240,34 +346,18 @@ class TaxBracketViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Get applicable tax brackets
-        brackets = TaxBracket.objects.filter(
-            country=country,
-            year=year,
-            is_active=True
-        ).order_by('min_amount')
-        
-        total_tax = Decimal('0')
-        tax_breakdown = []
+        try:
+            year = int(year)
+        except (TypeError, ValueError):
+            return Response(
+                {'error': 'Invalid year format'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        for bracket in brackets:
-            if amount <= bracket.min_amount:
-                break
-            
-            # Calculate taxable amount in this bracket
-            bracket_max = bracket.max_amount or amount
-            taxable_in_bracket = min(amount, bracket_max) - bracket.min_amount
-            
-            if taxable_in_bracket > 0:
-                bracket_tax = (taxable_in_bracket * bracket.tax_rate) + bracket.fixed_amount
-                total_tax += bracket_tax
-                
-                tax_breakdown.append({
-                    'bracket': str(bracket),
-                    'taxable_amount': taxable_in_bracket,
-                    'tax_rate': bracket.tax_rate,
-                    'tax_amount': bracket_tax
-                })
+        # Evaluate the compiled tax table for the country and year
+        tax_table = get_tax_table(country, year)
+        total_tax = tax_table.tax_for(amount)
+        tax_breakdown = tax_table.breakdown(amount)
         
         return Response({
             'gross_amount': amount,
@@ -365,16 +455,16 @@ class PayslipViewSet(viewsets.ModelViewSet):
             )
         
         try:
-            with transaction.atomic():
-                # Calculate gross salary
-                gross_salary = payslip.calculate_gross_salary()
-                
+            with batched_history(), PayrollConfiguration.objects.snapshot():
                 # Calculate leave deductions if integration is enabled
-                config = PayrollConfiguration.objects.first()
+                config = PayrollConfiguration.objects.get_current()
                 if config and config.integrate_with_leave_management:
                     unpaid_leave = self._calculate_unpaid_leave(payslip)
                     payslip.unpaid_leave_days = unpaid_leave
                 
+                # Calculate gross salary (after unpaid leave is known)
+                gross_salary = payslip.calculate_gross_salary()
+                
                 # Apply mandatory deductions
                 self._apply_mandatory_deductions(payslip)
                 
@@ -386,6 +476,8 @@ class PayslipViewSet(viewsets.ModelViewSet):
                 payslip.tax_amount = tax_amount
                 payslip.net_salary = payslip.calculate_net_salary()
                 payslip.status = 'calculated'
+                payslip.dirty_flags = 0
+                payslip.calculated_at = timezone.now()
                 payslip.save()
                 
                 return Response({
@@ -439,6 +531,32 @@ class PayslipViewSet(viewsets.ModelViewSet):
         
         return Response({'message': 'Payslip marked as paid successfully'})
 
+    @action(detail=False, methods=['post'], parser_classes=[MultiPartParser])
+    def reconcile_payments(self, request):
+        """Mark approved payslips as paid from a bank payment file"""
+        uploaded_file = request.FILES.get('file')
+        if not uploaded_file:
+            return Response(
+                {'error': 'A payment file is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        dry_run = str(request.data.get('dry_run', '')).lower() in ['1', 'true', 'yes']
+        try:
+            report = reconcile_payments(
+                read_payment_rows(uploaded_file.file), user=request.user, dry_run=dry_run
+            )
+        except PaymentFileError as e:
+            # Rows before the error may already be paid; report them
+            e.report['dry_run'] = dry_run
+            return Response(
+                {'error': str(e), 'report': e.report},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        report['dry_run'] = dry_run
+        return Response(report)
+
     @action(detail=True, methods=['post'])
     def add_bonus(self, request, pk=None):
         """Add bonus to payslip"""
@@ -491,87 +609,25 @@ class PayslipViewSet(viewsets.ModelViewSet):
 
     def _calculate_unpaid_leave(self, payslip):
         """Calculate unpaid leave days for the payroll period"""
-        # Get approved leave requests for the period that are unpaid
-        leave_requests = LeaveRequest.objects.filter(
-            employee=payslip.employee,
-            status='approved',
-            leave_type__is_paid=False,
-            start_date__lte=payslip.payroll_period.end_date,
-            end_date__gte=payslip.payroll_period.start_date
-        )
-        
-        total_unpaid_days = Decimal('0')
-        for leave in leave_requests:
-            # Calculate overlap with payroll period
-            overlap_start = max(leave.start_date, payslip.payroll_period.start_date)
-            overlap_end = min(leave.end_date, payslip.payroll_period.end_date)
-            
-            if overlap_start <= overlap_end:
-                overlap_days = (overlap_end - overlap_start).days + 1
-                total_unpaid_days += Decimal(str(overlap_days))
-        
-        return total_unpaid_days
+        return unpaid_leave_days_by_employee(
+            payslip.payroll_period, employee_ids=[payslip.employee_id]
+        ).get(payslip.employee_id, Decimal('0'))
 
     def _apply_mandatory_deductions(self, payslip):
         """Apply mandatory deductions to payslip"""
-        mandatory_deductions = DeductionType.objects.filter(
-            is_mandatory=True, is_active=True
+        _, new_totals = apply_mandatory_deductions(
+            payslip.payroll_period, payslip_ids=[payslip.id], user=self.request.user
         )
-        
-        for deduction_type in mandatory_deductions:
-            # Check if deduction already exists
-            if not PayslipDeduction.objects.filter(
-                payslip=payslip, deduction_type=deduction_type
-            ).exists():
-                
-                # Calculate amount based on method
-                if deduction_type.calculation_method == 'fixed':
-                    amount = deduction_type.default_amount
-                elif deduction_type.calculation_method == 'percentage':
-                    amount = payslip.base_salary * deduction_type.default_amount
-                else:
-                    amount = Decimal('0')  # Tax calculations handled separately
-                
-                PayslipDeduction.objects.create(
-                    payslip=payslip,
-                    deduction_type=deduction_type,
-                    amount=amount,
-                    calculation_base=payslip.base_salary
-                )
-        
-        # Update total deductions
-        payslip.total_deductions = payslip.deductions.aggregate(
-            total=Sum('amount')
-        )['total'] or Decimal('0')
+        if payslip.id in new_totals:
+            payslip.refresh_from_db(fields=['total_deductions'])
 
     def _calculate_taxes(self, payslip, gross_salary):
         """Calculate tax amount for payslip"""
-        config = PayrollConfiguration.objects.first()
+        config = PayrollConfiguration.objects.get_current()
         country = config.default_country if config else 'Mexico'
         year = config.tax_year if config else timezone.now().year
         
-        # Get applicable tax brackets
-        brackets = TaxBracket.objects.filter(
-            country=country,
-            year=year,
-            is_active=True
-        ).order_by('min_amount')
-        
-        total_tax = Decimal('0')
-        
-        for bracket in brackets:
-            if gross_salary <= bracket.min_amount:
-                break
-            
-            # Calculate taxable amount in this bracket
-            bracket_max = bracket.max_amount or gross_salary
-            taxable_in_bracket = min(gross_salary, bracket_max) - bracket.min_amount
-            
-            if taxable_in_bracket > 0:
-                bracket_tax = (taxable_in_bracket * bracket.tax_rate) + bracket.fixed_amount
-                total_tax += bracket_tax
-        
-        return total_tax
+        return get_tax_table(country, year).tax_for(gross_salary)
 
 
 class CompensationHistoryViewSet(viewsets.ModelViewSet):
@@ -614,6 +670,36 @@ class CompensationHistoryViewSet(viewsets.ModelViewSet):
         employee.salary = compensation.new_salary
         employee.save()
 
+    @action(detail=False, methods=['get'])
+    def as_of(self, request):
+        """Get salaries in effect on a date, for one employee or everyone"""
+        day = request.query_params.get('date')
+        employee_id = request.query_params.get('employee_id')
+        try:
+            day = date.fromisoformat(day) if day else timezone.now().date()
+            employee_id = int(employee_id) if employee_id else None
+        except ValueError:
+            return Response(
+                {'error': 'Invalid date or employee_id'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if employee_id is not None:
+            return Response({
+                'date': day,
+                'employee_id': employee_id,
+                'salary': salary_as_of(employee_id, day)
+            })
+        
+        salaries = salaries_as_of(day)
+        return Response({
+            'date': day,
+            'salaries': [
+                {'employee_id': employee_id, 'salary': salary}
+                for employee_id, salary in sorted(salaries.items())
+            ]
+        })
+
     @action(detail=False, methods=['get'])
     def salary_trends(self, request):
         """Get salary trends analysis"""
@@ -637,7 +723,7 @@ class PayrollConfigurationViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def current(self, request):
         """Get current configuration (create default if none exists)"""
-        config = PayrollConfiguration.objects.first()
+        config = PayrollConfiguration.objects.get_current()
         if not config:
             config = PayrollConfiguration.objects.create()
         
@@ -650,12 +736,29 @@ class PayrollAnalyticsViewSet(viewsets.ViewSet):
     
     permission_classes = [permissions.IsAuthenticated]
 
+    def _cached_response(self, request, scope, name, build, timeout=ANALYTICS_CACHE_TIMEOUT):
+        """Serve a cached analytics payload with an ETag, or 304 if the client has it"""
+        data, etag = cached_analytics(scope, name, build, timeout)
+        
+        if_none_match = request.headers.get('If-None-Match', '')
+        client_etags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+        if etag in client_etags or '*' in client_etags:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        return Response(data, headers={'ETag': etag})
+
     @action(detail=False, methods=['get'])
     def dashboard(self, request):
         """Get payroll dashboard data"""
         current_year = timezone.now().year
         current_month = timezone.now().month
         
+        return self._cached_response(
+            request, DASHBOARD_SCOPE, f'dashboard:{current_year}-{current_month:02d}',
+            lambda: self._dashboard_data(current_year, current_month)
+        )
+
+    def _dashboard_data(self, current_year, current_month):
+        """Build the payroll dashboard payload"""
         # Current month stats
         current_period = PayrollPeriod.objects.filter(
             start_date__year=current_year,
@@ -681,13 +784,13 @@ class PayrollAnalyticsViewSet(viewsets.ViewSet):
             total_payroll=Sum('salary')
         )
         
-        return Response({
+        return {
             'current_period': PayrollPeriodSerializer(current_period).data if current_period else None,
             'total_employees': total_employees,
             'total_payslips': total_payslips,
             'recent_payslips': PayslipSummarySerializer(recent_payslips, many=True).data,
             'salary_stats': salary_stats
-        })
+        }
 
     @action(detail=False, methods=['get'])
     def payroll_summary(self, request):
@@ -707,19 +810,34 @@ class PayrollAnalyticsViewSet(viewsets.ViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
         
+        return self._cached_response(
+            request, period_scope(period.id), 'summary',
+            lambda: self._period_summary(period),
+            timeout=period_cache_timeout(period)
+        )
+
+    def _period_summary(self, period):
+        """Build the payroll summary payload of a period"""
+        snapshot = load_period_snapshot(period)
+        if snapshot is not None:
+            return self._snapshot_summary(period, snapshot)
+        
         # Get summary data
         payslips = period.payslips.all()
         
+        # Totals and status counts are maintained on the period itself
         summary = {
             'period': PayrollPeriodSerializer(period).data,
-            'total_employees': payslips.count(),
-            'total_gross': payslips.aggregate(Sum('gross_salary'))['gross_salary__sum'] or 0,
-            'total_net': payslips.aggregate(Sum('net_salary'))['net_salary__sum'] or 0,
-            'total_deductions': payslips.aggregate(Sum('total_deductions'))['total_deductions__sum'] or 0,
-            'total_taxes': payslips.aggregate(Sum('tax_amount'))['tax_amount__sum'] or 0,
-            'status_breakdown': list(
-                payslips.values('status').annotate(count=Count('status'))
-            ),
+            'total_employees': period.total_employees,
+            'total_gross': period.total_gross_amount,
+            'total_net': period.total_net_amount,
+            'total_deductions': period.total_deductions,
+            'total_taxes': period.total_taxes,
+            'status_breakdown': [
+                {'status': payslip_status, 'count': count}
+                for payslip_status, count in period.status_counts.items()
+                if count
+            ],
             'department_breakdown': list(
                 payslips.values('employee__department__name')
                 .annotate(
@@ -730,4 +848,146 @@ class PayrollAnalyticsViewSet(viewsets.ViewSet):
             )
         }
         
-        return Response(summary)
+        return summary
+
+    @action(detail=False, methods=['get'])
+    def trends(self, request):
+        """Get payroll totals per finalized period, read from period snapshots"""
+        periods = PayrollPeriod.objects.filter(status='finalized').order_by('start_date')
+        
+        start_date = request.query_params.get('start_date')
+        end_date = request.query_params.get('end_date')
+        department_id = request.query_params.get('department_id')
+        try:
+            if start_date:
+                periods = periods.filter(start_date__gte=date.fromisoformat(start_date))
+            if end_date:
+                periods = periods.filter(end_date__lte=date.fromisoformat(end_date))
+            department_id = int(department_id) if department_id else None
+        except ValueError:
+            return Response(
+                {'error': 'Invalid start_date, end_date or department_id'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        trend = []
+        for period in periods:
+            snapshot = load_period_snapshot(period)
+            if department_id is not None:
+                snapshot = snapshot[snapshot['department_id'] == department_id]
+            row = {
+                'period_id': period.id,
+                'period_name': period.name,
+                'start_date': period.start_date,
+                'end_date': period.end_date,
+            }
+            row.update(snapshot_totals(snapshot))
+            trend.append(row)
+        
+        return Response({'department_id': department_id, 'periods': trend})
+
+    @action(detail=False, methods=['get'])
+    def department_trends(self, request):
+        """Get monthly payroll cost per department over the last N months"""
+        department_id = request.query_params.get('department_id')
+        try:
+            months = int(request.query_params.get('months', 12))
+            department_id = int(department_id) if department_id else None
+        except ValueError:
+            return Response(
+                {'error': 'Invalid months or department_id'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not 1 <= months <= 120:
+            return Response(
+                {'error': 'months must be between 1 and 120'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        today = timezone.now().date()
+        month_index = today.year * 12 + today.month - months
+        since = date(month_index // 12, month_index % 12 + 1, 1)
+        
+        rollups = DepartmentPayrollRollup.objects.filter(payroll_period__start_date__gte=since)
+        if department_id is not None:
+            rollups = rollups.filter(department_id=department_id)
+        rows = rollups.annotate(
+            month=TruncMonth('payroll_period__start_date')
+        ).values('department_id', 'department__name', 'month').annotate(
+            employees=Max('employees'),
+            gross=Sum('total_gross'),
+            net=Sum('total_net'),
+            taxes=Sum('total_taxes'),
+            bonuses=Sum('total_bonuses'),
+            deductions=Sum('total_deductions')
+        ).order_by('department__name', 'department_id', 'month')
+        
+        departments = {}
+        for row in rows:
+            series = departments.setdefault(row['department_id'], {
+                'department_id': row['department_id'],
+                'department_name': row['department__name'],
+                'months': []
+            })
+            series['months'].append({
+                'month': row['month'].strftime('%Y-%m'),
+                'employees': row['employees'],
+                'gross': row['gross'],
+                'net': row['net'],
+                'taxes': row['taxes'],
+                'bonuses': row['bonuses'],
+                'deductions': row['deductions'],
+            })
+        
+        return Response({
+            'since': since,
+            'months': months,
+            'departments': list(departments.values())
+        })
+
+    def _snapshot_summary(self, period, snapshot):
+        """Build the payroll summary of a finalized period from its snapshot"""
+        totals = snapshot_totals(snapshot)
+        departments = snapshot_department_totals(snapshot)
+        names = dict(
+            Department.objects.filter(
+                id__in=[row['department_id'] for row in departments]
+            ).values_list('id', 'name')
+        )
+        
+        return {
+            'period': PayrollPeriodSerializer(period).data,
+            'total_employees': totals['employees'],
+            'total_gross': totals['gross'],
+            'total_net': totals['net'],
+            'total_deductions': totals['deductions'],
+            'total_taxes': totals['tax'],
+            'status_breakdown': [
+                {'status': payslip_status, 'count': count}
+                for payslip_status, count in period.status_counts.items()
+                if count
+            ],
+            'department_breakdown': [
+                {
+                    'employee__department__name': names.get(row['department_id']),
+                    'count': row['employees'],
+                    'gross_total': row['gross'],
+                    'net_total': row['net'],
+                }
+                for row in departments
+            ]
+        }
+
+    @action(detail=False, methods=['post'])
+    def simulate(self, request):
+        """Simulate payroll costs under hypothetical salary, tax and deduction changes"""
+        serializer = PayrollSimulationSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        result = PayrollSimulation().run(
+            salary_adjustments=serializer.validated_data.get('salary_adjustments'),
+            tax_brackets=serializer.validated_data.get('tax_brackets'),
+            deduction_rates=serializer.validated_data.get('deduction_rates')
+        )
+        return Response(result)
@@ -4,9 +4,11 @@ from django.core.validators import MinValueValidator, MaxValueValidator, URLVali
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 from decimal import Decimal
-from simple_history.models import HistoricalRecords
+from employees.history import BatchedHistoricalRecords
 import uuid
 
+from employees.sequences import next_identifier
+
 User = get_user_model()
 
 
@@ -97,7 +99,7 @@ class JobPosting(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     # History tracking
-    history = HistoricalRecords()
+    history = BatchedHistoricalRecords()
 
     def save(self, *args, **kwargs):
         if not self.job_id:
@@ -106,11 +108,11 @@ class JobPosting(models.Model):
 
     def _generate_job_id(self):
         """Generate unique job ID"""
-        import random
-        import string
         year = timezone.now().year
-        random_part = ''.join(random.choices(string.digits, k=4))
-        return f"JOB{year}{random_part}"
+        return next_identifier(
+            'JOB', str(year),
+            queryset=JobPosting.objects.all(), field='job_id'
+        )
 
     def clean(self):
         super().clean()
@@ -211,7 +213,7 @@ class Candidate(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     # History tracking
-    history = HistoricalRecords()
+    history = BatchedHistoricalRecords()
 
     def save(self, *args, **kwargs):
         if not self.candidate_id:
@@ -220,11 +222,11 @@ class Candidate(models.Model):
 
     def _generate_candidate_id(self):
         """Generate unique candidate ID"""
-        import random
-        import string
         year = timezone.now().year
-        random_part = ''.join(random.choices(string.digits, k=4))
-        return f"CAN{year}{random_part}"
+        return next_identifier(
+            'CAN', str(year),
+            queryset=Candidate.objects.all(), field='candidate_id'
+        )
 
     @property
     def full_name(self):
@@ -309,7 +311,7 @@ class Application(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     # History tracking
-    history = HistoricalRecords()
+    history = BatchedHistoricalRecords()
 
     def save(self, *args, **kwargs):
         if not self.application_id:
@@ -318,11 +320,11 @@ class Application(models.Model):
 
     def _generate_application_id(self):
         """Generate unique application ID"""
-        import random
-        import string
         year = timezone.now().year
-        random_part = ''.join(random.choices(string.digits, k=4))
-        return f"APP{year}{random_part}"
+        return next_identifier(
+            'APP', str(year),
+            queryset=Application.objects.all(), field='application_id'
+        )
 
     @property
     def days_since_applied(self):
@@ -387,7 +389,7 @@ class CandidateDocument(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     # History tracking
-    history = HistoricalRecords()
+    history = BatchedHistoricalRecords()
 
     def save(self, *args, **kwargs):
         if self.file:
@@ -462,7 +464,7 @@ class InterviewRound(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     # History tracking
-    history = HistoricalRecords()
+    history = BatchedHistoricalRecords()
 
     def __str__(self):
         return f"{self.job_posting.title} - Round {self.sequence_order}: {self.name}"
@@ -535,7 +537,7 @@ class Interview(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     # History tracking
-    history = HistoricalRecords()
+    history = BatchedHistoricalRecords()
 
     def save(self, *args, **kwargs):
         if not self.interview_id:
@@ -544,11 +546,11 @@ class Interview(models.Model):
 
     def _generate_interview_id(self):
         """Generate unique interview ID"""
-        import random
-        import string
         year = timezone.now().year
-        random_part = ''.join(random.choices(string.digits, k=4))
-        return f"INT{year}{random_part}"
+        return next_identifier(
+            'INT', str(year),
+            queryset=Interview.objects.all(), field='interview_id'
+        )
 
     def clean(self):
         super().clean()
@@ -659,7 +661,7 @@ class InterviewEvaluation(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     # History tracking
-    history = HistoricalRecords()
+    history = BatchedHistoricalRecords()
 
     @property
     def average_rating(self):
@@ -782,7 +784,7 @@ class OfferLetter(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     # History tracking
-    history = HistoricalRecords()
+    history = BatchedHistoricalRecords()
 
     def save(self, *args, **kwargs):
         if not self.offer_id:
@@ -791,11 +793,11 @@ class OfferLetter(models.Model):
 
     def _generate_offer_id(self):
         """Generate unique offer ID"""
-        import random
-        import string
         year = timezone.now().year
-        random_part = ''.join(random.choices(string.digits, k=4))
-        return f"OFF{year}{random_part}"
+        return next_identifier(
+            'OFF', str(year),
+            queryset=OfferLetter.objects.all(), field='offer_id'
+        )
 
     @property
     def is_expired(self):
@@ -861,7 +863,7 @@ class RecruitmentPipeline(models.Model):
     last_updated = models.DateTimeField(auto_now=True)
     
     # History tracking
-    history = HistoricalRecords()
+    history = BatchedHistoricalRecords()
 
     def update_metrics(self):
         """Recalculate all pipeline metrics"""